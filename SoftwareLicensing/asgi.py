@@ -0,0 +1,22 @@
+"""
+ASGI config for SoftwareLicensing project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+License validity checks are answered asynchronously, every other request by
+the WSGI application in a thread. Run it with uvicorn workers:
+
+    gunicorn SoftwareLicensing.asgi:application -k uvicorn.workers.UvicornWorker -w 4
+"""
+
+import os
+
+from asgiref.wsgi import WsgiToAsgi
+from django.core.wsgi import get_wsgi_application
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "SoftwareLicensing.settings")
+
+wsgi_application = get_wsgi_application()
+
+from license_agreement.rest_api.asgi import ValidityApplication  # noqa: E402, needs the apps loaded
+
+application = ValidityApplication(WsgiToAsgi(wsgi_application))
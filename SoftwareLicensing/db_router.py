@@ -0,0 +1,86 @@
+"""
+Read replica routing.
+
+Views opt in with ``read_from_replica = True``. ReplicaRoutingMiddleware
+sends the reads of their GET, HEAD and OPTIONS requests to one of the
+REPLICA_DATABASES, picked per request, everything else reads and writes the
+primary. Once a request writes, its later reads and the requests of the same
+client for REPLICA_STICKY_SECONDS read the primary, so a client sees its own
+writes despite replication lag. Clients without cookies are not held to the
+primary.
+"""
+import random
+import threading
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+STICKY_COOKIE = 'read_primary'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+state = threading.local()
+
+
+def get_read_database():
+    """
+    Replica the reads of the current request go to, None for the primary.
+    """
+    if getattr(state, 'wrote', False):
+        return None
+    return getattr(state, 'replica', None)
+
+
+def pick_replica():
+    """
+    Replica for the reads of a new request, None without replicas.
+    """
+    if settings.REPLICA_DATABASES:
+        return random.choice(settings.REPLICA_DATABASES)
+    return None
+
+
+class ReplicaRouter(object):
+    """
+    Routes the reads of requests selected by ReplicaRoutingMiddleware to their replica.
+    """
+    def db_for_read(self, model, **hints):
+        return get_read_database() or DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # replicas hold the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in settings.REPLICA_DATABASES
+
+
+class ReplicaRoutingMiddleware(object):
+    """
+    Picks the database the reads of a request go to and holds clients which wrote to the primary.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        state.replica = None
+        state.wrote = False
+        try:
+            response = self.get_response(request)
+            wrote = state.wrote
+        finally:
+            state.replica = None
+            state.wrote = False
+        if wrote and settings.REPLICA_DATABASES:
+            response.set_cookie(STICKY_COOKIE, '1', max_age=settings.REPLICA_STICKY_SECONDS, httponly=True)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        # DRF viewsets keep their class in cls, other class based views in view_class
+        view_class = getattr(view_func, 'cls', None) or getattr(view_func, 'view_class', None)
+        if request.method in SAFE_METHODS and getattr(view_class, 'read_from_replica', False) and\
+                STICKY_COOKIE not in request.COOKIES:
+            state.replica = pick_replica()
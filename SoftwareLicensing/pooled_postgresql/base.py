@@ -0,0 +1,94 @@
+"""
+PostgreSQL backend taking its connections from an in process pool.
+
+Use it as the ENGINE of a database and configure the pool with the POOL
+setting of that database:
+
+    'POOL': {
+        'MAX_SIZE': 10,        # connections per worker process
+        'MAX_AGE': 30*60,      # seconds before a connection is replaced
+        'CHECK_AFTER': 30,     # idle seconds after which a connection is checked before use
+        'TIMEOUT': 10,         # seconds to wait for a free connection
+    }
+
+Closing the connection of a thread, which Django does at the end of each
+request unless CONN_MAX_AGE keeps it, hands it back to the pool.
+"""
+from django.db.backends.postgresql import base, creation
+from psycopg2 import extensions
+
+from SoftwareLicensing.pooled_postgresql.pool import close_pools, get_pool
+
+POOL_DEFAULTS = {
+    'MAX_SIZE': 10,
+    'MAX_AGE': 30*60,
+    'CHECK_AFTER': 30,
+    'TIMEOUT': 10,
+}
+
+
+def check_connection(connection):
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT 1')
+
+
+def reset_connection(connection):
+    """
+    Rolls back what the last user left open, connections in an unknown state are not reused.
+    """
+    if connection.closed:
+        return False
+    status = connection.get_transaction_status()
+    if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+        return False
+    if status != extensions.TRANSACTION_STATUS_IDLE:
+        connection.rollback()
+    return True
+
+
+def pool_key(conn_params):
+    return repr(sorted(conn_params.items()))
+
+
+class DatabaseCreation(creation.DatabaseCreation):
+
+    def _destroy_test_db(self, test_database_name, verbosity):
+        # idle pooled connections to the test database would block DROP DATABASE
+        close_pools(lambda key: "('database', '{}')".format(test_database_name) in key)
+        super()._destroy_test_db(test_database_name, verbosity)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    creation_class = DatabaseCreation
+    pool = None
+
+    def get_pool(self, conn_params):
+        options = dict(POOL_DEFAULTS, **self.settings_dict.get('POOL', {}))
+        return get_pool(
+            pool_key(conn_params),
+            check=check_connection,
+            reset=reset_connection,
+            max_size=options['MAX_SIZE'],
+            max_age=options['MAX_AGE'],
+            check_after=options['CHECK_AFTER'],
+            timeout=options['TIMEOUT'],
+        )
+
+    def get_new_connection(self, conn_params):
+        # looked up per connection, a forked worker gets a pool of its own
+        self.pool = self.get_pool(conn_params)
+        created = []
+
+        def connect():
+            created.append(True)
+            return super(DatabaseWrapper, self).get_new_connection(conn_params)
+        connection = self.pool.acquire(connect)
+        if not created:
+            # the connection was set up when it was made, the wrapper only needs its isolation level
+            self.isolation_level = self.settings_dict['OPTIONS'].get('isolation_level', connection.isolation_level)
+        return connection
+
+    def _close(self):
+        if self.connection is not None:
+            with self.wrap_database_errors:
+                self.pool.release(self.connection)
@@ -0,0 +1,193 @@
+"""
+In process database connection pool.
+
+Connections handed back are kept idle for the next request instead of being
+closed, so a request does not pay for a new connection and its
+authentication. A connection is replaced once it is older than ``max_age``,
+checked with a round trip when it was idle longer than ``check_after`` and
+dropped when the check fails. At most ``max_size`` connections are open per
+pool, a caller waits up to ``timeout`` seconds for one to be handed back.
+Waiting callers are served in the order they came, a connection handed back
+goes to the one waiting longest rather than to whichever thread asks next.
+"""
+import os
+import threading
+import time
+from collections import deque
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class PooledConnection(object):
+    __slots__ = ('connection', 'created_at', 'released_at')
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.created_at = self.released_at = time.monotonic()
+
+
+class ConnectionPool(object):
+    """
+    Thread safe pool of connections made by ``connect``, or by the ``connect`` given to acquire().
+
+    ``check(connection)`` runs a query and raises when the connection is
+    broken, ``reset(connection)`` brings a handed back connection to a clean
+    state and returns False when it can not be reused.
+    """
+    def __init__(self, connect=None, check=None, reset=None, max_size=10, max_age=30*60, check_after=30, timeout=10):
+        self.connect = connect
+        self.check = check
+        self.reset = reset
+        self.max_size = max_size
+        self.max_age = max_age
+        self.check_after = check_after
+        self.timeout = timeout
+        self.idle = deque()
+        self.in_use = {}
+        self.size = 0
+        # callers waiting for a connection, served in turn
+        self.waiters = deque()
+        self.condition = threading.Condition()
+
+    def acquire(self, connect=None):
+        connect = connect or self.connect
+        with self.condition:
+            if self.idle and not self.waiters:
+                # the most recently used connection is the least likely to have been dropped by the server
+                pooled = self.idle.pop()
+            elif self.size < self.max_size:
+                pooled = None
+                self.size += 1
+            else:
+                pooled = self.wait()
+
+        if pooled is not None and not self.is_reusable(pooled):
+            # replaced in its place, the pool keeps its size
+            close(pooled.connection)
+            pooled = None
+        if pooled is None:
+            try:
+                pooled = PooledConnection(connect())
+            except Exception:
+                self.discard(None)
+                raise
+        with self.condition:
+            self.in_use[id(pooled.connection)] = pooled
+        return pooled.connection
+
+    def wait(self):
+        """
+        Waits in line for a connection handed back, or for room to open one (None). Called with the condition held.
+        """
+        slot = []
+        self.waiters.append(slot)
+        deadline = time.monotonic() + self.timeout
+        while not slot:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self.waiters.remove(slot)
+                raise PoolTimeout('No database connection was handed back within {} seconds, {} are in use.'
+                                  .format(self.timeout, self.size))
+            self.condition.wait(remaining)
+        return slot[0]
+
+    def hand_over(self, pooled):
+        """
+        Hands a connection, or the room for one (None), to the caller waiting longest, returns whether one waited.
+        Called with the condition held.
+        """
+        if not self.waiters:
+            return False
+        self.waiters.popleft().append(pooled)
+        self.condition.notify_all()
+        return True
+
+    def is_reusable(self, pooled):
+        now = time.monotonic()
+        if self.max_age is not None and now - pooled.created_at > self.max_age:
+            return False
+        if self.check_after is not None and now - pooled.released_at > self.check_after:
+            try:
+                self.check(pooled.connection)
+            except Exception:
+                return False
+        return True
+
+    def release(self, connection):
+        """
+        Hands a connection back, it is closed instead when it can not be reused.
+        """
+        with self.condition:
+            pooled = self.in_use.pop(id(connection), None)
+        if pooled is None:
+            close(connection)
+            return
+        try:
+            reusable = self.reset(connection)
+        except Exception:
+            reusable = False
+        if not reusable or (self.max_age is not None and time.monotonic() - pooled.created_at > self.max_age):
+            self.discard(connection)
+            return
+        pooled.released_at = time.monotonic()
+        with self.condition:
+            if not self.hand_over(pooled):
+                self.idle.append(pooled)
+
+    def discard(self, connection):
+        if connection is not None:
+            close(connection)
+        with self.condition:
+            if not self.hand_over(None):
+                self.size -= 1
+
+    def close(self):
+        """
+        Closes the idle connections, the ones in use are closed when they are handed back.
+        """
+        with self.condition:
+            idle, self.idle = self.idle, deque()
+            self.size -= len(idle)
+            for pooled in idle:
+                close(pooled.connection)
+            in_use = list(self.in_use.values())
+            self.in_use.clear()
+            self.size -= len(in_use)
+            while self.size < self.max_size and self.hand_over(None):
+                self.size += 1
+
+
+def close(connection):
+    try:
+        connection.close()
+    except Exception:
+        pass
+
+
+pools = {}
+pools_lock = threading.Lock()
+
+
+def get_pool(key, **kwargs):
+    """
+    Pool of the given key in this process. A forked worker gets pools of its
+    own, the connections of the parent are left alone.
+    """
+    key = (os.getpid(), key)
+    with pools_lock:
+        if key not in pools:
+            pools[key] = ConnectionPool(**kwargs)
+        return pools[key]
+
+
+def close_pools(match=lambda key: True):
+    """
+    Closes the idle connections of the pools of this process whose key matches.
+    """
+    pid = os.getpid()
+    with pools_lock:
+        matching = [pool for (pool_pid, key), pool in pools.items() if pool_pid == pid and match(key)]
+    for pool in matching:
+        pool.close()
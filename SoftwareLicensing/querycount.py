@@ -0,0 +1,114 @@
+"""
+Per request database query instrumentation.
+
+QueryCountMiddleware records every query of a request with an execute
+wrapper, which unlike connection.queries also works with DEBUG off, and
+reports the number of queries, the total SQL time and repeated query shapes
+(the same SQL run again with other parameters, the mark of an N+1) in
+response headers and the licensing_log. assert_max_queries gives tests the
+same recording to bound the queries of a view.
+"""
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger('licensing_log')
+
+PLACEHOLDERS = re.compile(r'%s(, %s)+')
+
+
+def query_shape(sql):
+    """
+    SQL of a query with lists of parameters collapsed, so IN lists of any length have the same shape.
+    """
+    return PLACEHOLDERS.sub('%s, ...', sql)
+
+
+class QueryRecorder(object):
+    """
+    Context manager recording the queries run on the given database aliases, all by default.
+    """
+    def __init__(self, using=None):
+        self.using = using
+        self.count = 0
+        self.duration = 0.0
+        self.shapes = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+            self.shapes[query_shape(sql)] += 1
+
+    def __enter__(self):
+        aliases = [self.using] if isinstance(self.using, str) else self.using or connections
+        self.stack = ExitStack()
+        for alias in aliases:
+            self.stack.enter_context(connections[alias].execute_wrapper(self))
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stack.close()
+
+    @property
+    def duplicates(self):
+        """
+        Query shapes run more than once, most repeated first.
+        """
+        return [(shape, count) for shape, count in self.shapes.most_common() if count > 1]
+
+    @property
+    def duplicate_count(self):
+        return sum(count - 1 for shape, count in self.duplicates)
+
+    def summary(self, limit=3):
+        lines = ['{} queries in {:.1f} ms'.format(self.count, self.duration * 1000)]
+        lines += ['{}x {}'.format(count, shape) for shape, count in self.duplicates[:limit]]
+        return '\n'.join(lines)
+
+
+class QueryCountMiddleware(object):
+    """
+    Records the queries of each request. Put it first in MIDDLEWARE so that the
+    session and authentication queries are counted. Queries run while a
+    streaming response is consumed are not.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with QueryRecorder() as recorder:
+            response = self.get_response(request)
+
+        if settings.QUERY_COUNT_HEADERS:
+            response['X-Query-Count'] = recorder.count
+            response['X-Query-Time-Ms'] = '{:.1f}'.format(recorder.duration * 1000)
+            response['X-Duplicate-Queries'] = recorder.duplicate_count
+        if recorder.duplicate_count >= settings.QUERY_COUNT_DUPLICATE_WARNING:
+            logger.warning('{} {}: {}'.format(request.method, request.path, recorder.summary()))
+        else:
+            logger.debug('{} {}: {} queries in {:.1f} ms'.format(request.method, request.path, recorder.count,
+                                                                 recorder.duration * 1000))
+        return response
+
+
+@contextmanager
+def assert_max_queries(testcase, maximum, using=None):
+    """
+    Fails the test when more than ``maximum`` queries run in the block.
+
+        with assert_max_queries(self, 5):
+            self.client.get(url)
+    """
+    with QueryRecorder(using) as recorder:
+        yield recorder
+    if recorder.count > maximum:
+        testcase.fail('{} queries executed, {} allowed.\n{}'.format(recorder.count, maximum, recorder.summary()))
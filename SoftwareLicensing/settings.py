@@ -23,7 +23,8 @@ BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 SECRET_KEY = 'lo#-9u)+#o$ay20(vpp5@^@85vft(c8pwtf1%f6i$9g)+e&q1i'
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+# Set DEBUG=False in the environment of production processes
+DEBUG = os.environ.get('DEBUG', 'True').lower() in ('true', '1', 'yes')
 
 ALLOWED_HOSTS = ['*']
 
@@ -39,13 +40,17 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     'django_filters',
     'rest_framework',
+    'rest_framework.authtoken',
     'rest_framework_swagger',
     'license_agreement',
     'communication'
 ]
 
 MIDDLEWARE = [
+    'SoftwareLicensing.querycount.QueryCountMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'SoftwareLicensing.staticfiles.StaticFilesMiddleware',
+    'SoftwareLicensing.db_router.ReplicaRoutingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -56,12 +61,18 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = 'SoftwareLicensing.urls'
 
+TEMPLATE_LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': ['templates'],
-        'APP_DIRS': True,
         'OPTIONS': {
+            # templates are parsed once per process unless DEBUG is on
+            'loaders': TEMPLATE_LOADERS if DEBUG else [('django.template.loaders.cached.Loader', TEMPLATE_LOADERS)],
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
@@ -73,21 +84,70 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'SoftwareLicensing.wsgi.application'
+ASGI_APPLICATION = 'SoftwareLicensing.asgi.application'
 
 
 # Database
 # https://docs.djangoproject.com/en/2.0/ref/settings/#databases
 
+# With DB_POOL set to True connections are taken from a pool in each worker
+# process, which caps the connections of threaded workers at POOL MAX_SIZE.
+# CONN_MAX_AGE is the number of seconds a thread keeps its connection between
+# requests, with the pool 0 hands it back at the end of each request.
+DB_POOL = os.environ.get('DB_POOL', 'False').lower() in ('true', '1', 'yes')
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': 'SoftwareLicensing.pooled_postgresql' if DB_POOL else 'django.db.backends.postgresql',
         'NAME': 'SoftwareLicensing',
         'USER': 'postgres',
         'PASSWORD': 'postgres',
         'HOST': 'localhost',
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 0 if DB_POOL else 60)),
+        'POOL': {
+            'MAX_SIZE': int(os.environ.get('DB_POOL_MAX_SIZE', 10)),
+            'MAX_AGE': int(os.environ.get('DB_POOL_MAX_AGE', 30*60)),
+            'CHECK_AFTER': 30,
+            'TIMEOUT': 10,
+        },
     }
 }
 
+# Read replicas of the primary, DATABASE_REPLICAS lists their hosts comma
+# separated. Views with read_from_replica = True read a replica in GET
+# requests, a client which wrote reads the primary for REPLICA_STICKY_SECONDS.
+# In tests the replicas mirror the test database of the primary.
+REPLICA_DATABASES = []
+for number, host in enumerate(filter(None, os.environ.get('DATABASE_REPLICAS', '').split(',')), 1):
+    alias = 'replica{}'.format(number)
+    DATABASES[alias] = dict(DATABASES['default'], HOST=host.strip(), TEST={'MIRROR': 'default'})
+    REPLICA_DATABASES.append(alias)
+DATABASE_ROUTERS = ['SoftwareLicensing.db_router.ReplicaRouter']
+REPLICA_STICKY_SECONDS = 10
+
+# Threads of an ASGI worker which run the database work of the async validity
+# endpoints, more than the pool has connections would only wait for one.
+ASGI_THREADS = int(os.environ.get('ASGI_THREADS', DATABASES['default']['POOL']['MAX_SIZE']))
+
+
+# Cache
+# https://docs.djangoproject.com/en/2.0/topics/cache/
+# Use a shared backend (memcached) in production so that all workers see
+# the same cached license validity.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # Rendered template fragments, the page layout per user and table rows
+    # keyed by id and updated_at. Kept per process so that a deployment with
+    # changed templates starts with an empty cache.
+    'template_fragments': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'template_fragments',
+        'OPTIONS': {'MAX_ENTRIES': 20000},
+    },
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.0/ref/settings/#auth-password-validators
@@ -132,6 +192,11 @@ USE_TZ = True
 
 STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 STATIC_URL = '/static/'
+# `manage.py collectstatic` fingerprints, minifies and precompresses the static
+# files, StaticFilesMiddleware serves them. Files without a content hash in
+# their name may be cached by browsers for STATIC_MAX_AGE seconds.
+STATICFILES_STORAGE = 'SoftwareLicensing.staticfiles.CompressedManifestStaticFilesStorage'
+STATIC_MAX_AGE = 60*60
 
 
 # MEDIA files
@@ -140,16 +205,19 @@ MEDIA_URL = '/media/'
 
 
 # Required choices variables
-STATUS_CHOICES = (('Active', 'Active'), ('Inactive', 'Inactive'), ('Delete', 'Delete'))
-MESSAGE_STATUS_CHOICES = (('Pending', 'Pending'), ('Sent', 'Sent'), ('Delete', 'Delete'))
+STATUS_CHOICES = (('Active', 'Active'), ('Inactive', 'Inactive'), ('Expired', 'Expired'), ('Delete', 'Delete'))
+MESSAGE_STATUS_CHOICES = (('Pending', 'Pending'), ('Sending', 'Sending'), ('Sent', 'Sent'), ('Failed', 'Failed'),\
+                          ('Delete', 'Delete'))
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework.authentication.TokenAuthentication',
-        'rest_framework.authentication.BasicAuthentication',
+        'license_agreement.rest_api.authentication.CachedTokenAuthentication',
+        'license_agreement.rest_api.authentication.CachedBasicAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ),
-    'DEFAULT_FILTER_BACKENDS': ('django_filters.rest_framework.DjangoFilterBackend',)
+    'DEFAULT_FILTER_BACKENDS': ('django_filters.rest_framework.DjangoFilterBackend',),
+    'DEFAULT_PAGINATION_CLASS': 'license_agreement.rest_api.pagination.KeysetPagination',
+    'PAGE_SIZE': 100
 }
 CORS_ORIGIN_ALLOW_ALL = True
 CORS_ALLOW_CREDENTIALS = True
@@ -210,6 +278,79 @@ TWILIO_SID = ""
 TWILIO_AUTH_TOKEN = ""
 TWILIO_PHONE_NUMBER = ""
 
+# SMS outbox, drained by `manage.py process_sms_outbox`
+# SMS_PROVIDER is the class sending the messages, use
+# 'communication.providers.LocalSMSProvider' to keep them in memory instead.
+SMS_PROVIDER = 'communication.providers.TwilioSMSProvider'
+SMS_MAX_ATTEMPTS = 5
+SMS_RETRY_BACKOFF = 30
+SMS_RETRY_BACKOFF_MAX = 60*60
+SMS_SEND_TIMEOUT = 5*60
+SMS_RATE_LIMIT = 10
+
+# License validity cache
+VALIDITY_CACHE_ALIAS = 'default'
+VALIDITY_CACHE_TIMEOUT = 60*60
+VALIDITY_LOCAL_CACHE_SIZE = 10000
+VALIDITY_LOCAL_CACHE_TIMEOUT = 5
+BULK_VALIDITY_MAX_ITEMS = 1000
+
+# Compiled ip allowlists of agreements kept per process
+IP_ALLOWLIST_CACHE_SIZE = 10000
+IP_ALLOWLIST_CACHE_TIMEOUT = 60*60
+# Number of reverse proxies in front of the application whose X-Forwarded-For
+# header is trusted to carry the client address, 0 to use REMOTE_ADDR
+LICENSE_TRUSTED_PROXIES = 0
+
+# Resolved api tokens and basic credentials are cached for this many seconds,
+# saving the user or deleting the token drops them earlier
+AUTH_CACHE_ALIAS = 'default'
+AUTH_CACHE_TIMEOUT = 60
+
+# Signed license tokens
+# Each key has an id (kid) and a PEM encoded RSA private key given inline with
+# 'private_key' or as a path with 'private_key_file'. The first key signs new
+# tokens, keep the previous keys listed after a rotation until the tokens they
+# signed have expired. Create keys with `manage.py generate_license_token_key`.
+LICENSE_TOKEN_SIGNING_KEYS = [
+    # {'kid': '2018-07', 'private_key_file': os.path.join(BASE_DIR, 'docs/keys/2018-07.pem')},
+]
+LICENSE_TOKEN_ISSUER = 'SoftwareLicensing'
+LICENSE_TOKEN_LIFETIME = 24*60*60
+
+# List pages render tables up to this many rows, bigger tables are paged,
+# sorted and searched by the server
+DATATABLES_CLIENT_SIDE_LIMIT = 1000
+
+# Active agreements flipped to Expired per transaction by `manage.py expire_agreements`
+EXPIRY_SWEEP_CHUNK_SIZE = 1000
+
+# Seconds an activated seat is held, installations renew it by activating
+# again. Lapsed seats are reclaimed by the next activation of their agreement
+# and by `manage.py reclaim_seats`.
+SEAT_LEASE_SECONDS = 24*60*60
+SEAT_RECLAIM_CHUNK_SIZE = 1000
+
+# Licenses expiring within this many days are shown as expiring on the dashboard
+DASHBOARD_EXPIRING_DAYS = 30
+
+# Bulk import of licensors and licensees: rows validated and written per
+# transaction and the number of row errors reported back
+IMPORT_CHUNK_SIZE = 500
+IMPORT_MAX_REPORTED_ERRORS = 100
+
+# Rows fetched from the database per round trip by the streaming export
+EXPORT_CHUNK_SIZE = 2000
+
+# PostgreSQL text search configuration of the agreement search
+SEARCH_CONFIG = 'english'
+
+# Query instrumentation of QueryCountMiddleware: X-Query-Count, X-Query-Time-Ms
+# and X-Duplicate-Queries response headers, and a warning in the licensing_log
+# for requests repeating a query shape this many times
+QUERY_COUNT_HEADERS = DEBUG
+QUERY_COUNT_DUPLICATE_WARNING = 5
+
 # SESSION AGE 30 Minutes
 SESSION_COOKIE_AGE = 30*60
 
@@ -0,0 +1,226 @@
+"""
+Fingerprinted, minified and precompressed static files.
+
+`manage.py collectstatic` is the build step: CompressedManifestStaticFilesStorage
+minifies the stylesheets and scripts which are not minified yet, writes
+copies with the content hash in their name and a staticfiles.json manifest,
+and next to every compressible file a gzip and, with the brotli package, a
+brotli variant. rjsmin and rcssmin do the minifying when installed.
+
+StaticFilesMiddleware serves STATIC_ROOT from the application, so gunicorn
+without a front proxy serves them too. It picks the variant the client
+accepts, answers conditional requests with 304 and marks fingerprinted names
+immutable for a year, their content never changes under the same name.
+"""
+import gzip
+import io
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage, staticfiles_storage
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.base import ContentFile
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.http import http_date, parse_etags, parse_http_date_safe, quote_etag
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import rcssmin
+except ImportError:
+    rcssmin = None
+
+try:
+    import rjsmin
+except ImportError:
+    rjsmin = None
+
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.svg', '.eot', '.ttf', '.otf', '.json', '.txt', '.map', '.ico', '.xml')
+# A variant is kept only when it saves at least this share of the size
+MIN_COMPRESSION_GAIN = 0.05
+IMMUTABLE_MAX_AGE = 365*24*60*60
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+ACCEPT_ENCODING = re.compile(r'\s*([^\s;,]+)\s*(?:;\s*q\s*=\s*([0-9.]+))?')
+
+
+def minify(name, data):
+    """
+    Minified content of a stylesheet or script, or None when it is minified already or no minifier is installed.
+    """
+    if '.min.' in os.path.basename(name):
+        return None
+    if name.endswith('.css') and rcssmin is not None:
+        return rcssmin.cssmin(data.decode('utf-8')).encode('utf-8')
+    if name.endswith('.js') and rjsmin is not None:
+        return rjsmin.jsmin(data.decode('utf-8')).encode('utf-8')
+    return None
+
+
+def compress_gzip(data):
+    buffer = io.BytesIO()
+    with gzip.GzipFile(fileobj=buffer, mode='wb', compresslevel=9, mtime=0) as stream:
+        stream.write(data)
+    return buffer.getvalue()
+
+
+def compress_brotli(data):
+    return brotli.compress(data)
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    ManifestStaticFilesStorage which also minifies and precompresses the collected files.
+    """
+    def stored_name(self, name):
+        # before collectstatic has run, in development and tests, files keep their names
+        if not self.hashed_files:
+            return name
+        return super().stored_name(name)
+
+    def url_converter(self, name, hashed_files, template=None):
+        converter = super().url_converter(name, hashed_files, template)
+
+        def convert(matchobj):
+            try:
+                return converter(matchobj)
+            except ValueError:
+                # vendored stylesheets refer to images which are not shipped, their url is left as it is
+                return matchobj.group(0)
+        return convert
+
+    def _save(self, name, content):
+        if name.endswith(('.css', '.js')):
+            data = b''.join(content.chunks())
+            minified = minify(name, data)
+            content = ContentFile(minified if minified is not None else data)
+        return super()._save(name, content)
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        names = set(paths) | set(self.hashed_files.values())
+        for name in sorted(names):
+            if name.endswith(COMPRESSIBLE_EXTENSIONS) and self.exists(name):
+                self.compress(name)
+
+    def compress(self, name):
+        with self.open(name) as source:
+            data = source.read()
+        compressors = [('.gz', compress_gzip)]
+        if brotli is not None:
+            compressors.append(('.br', compress_brotli))
+        for suffix, compressor in compressors:
+            compressed = compressor(data)
+            if len(compressed) <= len(data) * (1 - MIN_COMPRESSION_GAIN):
+                if self.exists(name + suffix):
+                    self.delete(name + suffix)
+                self._save(name + suffix, ContentFile(compressed))
+
+
+class StaticFile(object):
+    """
+    A collected file with its precompressed variants.
+    """
+    def __init__(self, path, immutable):
+        stat = os.stat(path)
+        self.path = path
+        self.size = stat.st_size
+        self.last_modified = int(stat.st_mtime)
+        self.immutable = immutable
+        self.content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        self.variants = {}
+        for encoding, suffix in ENCODINGS:
+            if os.path.isfile(path + suffix):
+                self.variants[encoding] = (path + suffix, os.stat(path + suffix).st_size)
+
+    def get_etag(self, encoding):
+        tag = '{:x}-{:x}'.format(self.last_modified, self.size)
+        return quote_etag(tag + '-' + encoding if encoding else tag)
+
+    def choose(self, accept_encoding):
+        """
+        Path, size and encoding of the variant to send for an Accept-Encoding header.
+        """
+        accepted = set()
+        for encoding, quality in ACCEPT_ENCODING.findall(accept_encoding):
+            try:
+                if quality and float(quality) == 0:
+                    continue
+            except ValueError:
+                continue
+            accepted.add(encoding.lower())
+        for encoding, suffix in ENCODINGS:
+            if encoding in self.variants and (encoding in accepted or '*' in accepted):
+                path, size = self.variants[encoding]
+                return path, size, encoding
+        return self.path, self.size, None
+
+
+class StaticFilesMiddleware(object):
+    """
+    Serves the files collected to STATIC_ROOT. Put it right after SecurityMiddleware.
+
+    Found files are remembered per process, restart the workers after
+    collectstatic like after any deployment.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.files = {}
+        self.immutable_names = None
+
+    def __call__(self, request):
+        if request.method in ('GET', 'HEAD') and settings.STATIC_ROOT and\
+                request.path_info.startswith(settings.STATIC_URL):
+            static_file = self.find(request.path_info[len(settings.STATIC_URL):])
+            if static_file is not None:
+                return self.serve(request, static_file)
+        return self.get_response(request)
+
+    def get_immutable_names(self):
+        if self.immutable_names is None:
+            self.immutable_names = set(getattr(staticfiles_storage, 'hashed_files', {}).values())
+        return self.immutable_names
+
+    def find(self, name):
+        if name not in self.files:
+            try:
+                path = safe_join(settings.STATIC_ROOT, name)
+            except SuspiciousFileOperation:
+                return None
+            if not os.path.isfile(path):
+                return None
+            self.files[name] = StaticFile(path, name in self.get_immutable_names())
+        return self.files[name]
+
+    def serve(self, request, static_file):
+        path, size, encoding = static_file.choose(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        etag = static_file.get_etag(encoding)
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+        if_modified_since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+        if (if_none_match and etag in parse_etags(if_none_match)) or\
+                (not if_none_match and if_modified_since and static_file.last_modified <= if_modified_since):
+            response = HttpResponseNotModified()
+        elif request.method == 'HEAD':
+            response = HttpResponse(content_type=static_file.content_type)
+            response['Content-Length'] = size
+        else:
+            response = FileResponse(open(path, 'rb'), content_type=static_file.content_type)
+            response['Content-Length'] = size
+        if encoding and response.status_code == 200:
+            response['Content-Encoding'] = encoding
+        if static_file.variants:
+            response['Vary'] = 'Accept-Encoding'
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(static_file.last_modified)
+        if static_file.immutable:
+            response['Cache-Control'] = 'public, max-age={}, immutable'.format(IMMUTABLE_MAX_AGE)
+        else:
+            response['Cache-Control'] = 'public, max-age={}'.format(settings.STATIC_MAX_AGE)
+        return response
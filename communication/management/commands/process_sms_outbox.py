@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from communication.outbox import drain_outbox
+
+
+class Command(BaseCommand):
+    help = 'Send the messages waiting in the SMS outbox.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4, help='Messages sent concurrently.')
+        parser.add_argument('--batch-size', type=int, default=100, help='Messages claimed at once.')
+        parser.add_argument('--rate', type=float, default=None, help='Messages per second, SMS_RATE_LIMIT by default.')
+        parser.add_argument('--poll-interval', type=float, default=5, help='Seconds to wait when the outbox is empty.')
+        parser.add_argument('--once', action='store_true', help='Exit once the outbox is empty.')
+
+    def handle(self, *args, **options):
+        while True:
+            results = drain_outbox(workers=options['workers'], batch_size=options['batch_size'], rate=options['rate'])
+            if any(results.values()):
+                self.stdout.write('Sent {Sent}, retrying {Pending}, failed {Failed}.'.format(**results))
+            if options['once']:
+                break
+            time.sleep(options['poll_interval'])
@@ -3,6 +3,8 @@ from django.conf import settings
 from django.utils import timezone
 from django.core.validators import RegexValidator
 
+from license_agreement.managers import LiveManager
+
 
 class SMS(models.Model):
     """
@@ -11,13 +13,24 @@ class SMS(models.Model):
     mobile = models.CharField('Mobile', validators=[RegexValidator(regex=r'^\+?1?\d{9,15}$',\
                                  message="Phone number must be entered in the format:\
                                   '+999999999'. Up to 15 digits allowed.")], max_length=15,\
-                                  unique=True, blank=False, null=False)
+                                  blank=False, null=False)
     message = models.TextField(null=True, blank=True)
     status = models.CharField(max_length=10, choices=settings.MESSAGE_STATUS_CHOICES, default='Pending')
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(null=True, blank=True)
+    provider_message_id = models.CharField(max_length=64, blank=True, null=True)
+    sent_at = models.DateTimeField(blank=True, null=True)
     created_at = models.DateTimeField(default=timezone.now)
 
+    objects = models.Manager()
+    live = LiveManager()
+
     class Meta:
         verbose_name = "SMS"
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='sms_status_next_attempt_idx'),
+        ]
 
     def __str__(self):
         return self.mobile
@@ -0,0 +1,131 @@
+"""
+Durable SMS outbox.
+
+Messages are saved as Pending SMS rows and sent later by a worker, see
+`manage.py process_sms_outbox`. A worker claims a batch by moving it to
+Sending, sends the batch concurrently within the rate limit and then moves
+every message to Sent, back to Pending with an exponential backoff, or to
+Failed once it ran out of attempts. Messages claimed by a worker which died
+are claimed again after SMS_SEND_TIMEOUT. An attempt is counted when its
+message is claimed, so a message whose workers keep dying is moved to Failed
+instead of being claimed again once it ran out of attempts.
+"""
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction, connection
+from django.db.models import F, Q
+from django.utils import timezone
+
+from communication.models import SMS
+from communication.providers import get_provider, SMSPermanentError
+
+logger = logging.getLogger('licensing_log')
+
+
+class RateLimiter(object):
+    """
+    Thread safe token bucket allowing ``rate`` calls per second.
+    """
+    def __init__(self, rate):
+        self.rate = float(rate)
+        self.tokens = self.rate
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def wait(self):
+        if self.rate <= 0:
+            return
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.rate, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+
+
+def enqueue_sms(mobile, message):
+    """
+    Saves a message to the outbox, it is sent by the outbox worker.
+    """
+    return SMS.objects.create(mobile=mobile, message=message)
+
+
+def retry_delay(attempts):
+    delay = min(settings.SMS_RETRY_BACKOFF * 2 ** (attempts - 1), settings.SMS_RETRY_BACKOFF_MAX)
+    return timedelta(seconds=delay * random.uniform(0.8, 1.2))
+
+
+def claim_batch(batch_size):
+    """
+    Moves up to batch_size due messages to Sending and returns them with the number of messages failed instead.
+    """
+    now = timezone.now()
+    due = Q(status='Pending') | Q(status='Sending')
+    failed = 0
+    while True:
+        with transaction.atomic():
+            rows = list(SMS.objects.select_for_update(skip_locked=True).filter(due, next_attempt_at__lte=now)\
+                        .order_by('next_attempt_at').values_list('id', 'attempts')[:batch_size])
+            # messages whose last attempt never reported back, their worker died sending them
+            exhausted = [sms_id for sms_id, attempts in rows if attempts >= settings.SMS_MAX_ATTEMPTS]
+            ids = [sms_id for sms_id, attempts in rows if attempts < settings.SMS_MAX_ATTEMPTS]
+            failed += SMS.objects.filter(id__in=exhausted).update(
+                status='Failed', last_error='No outcome of the last attempt, its worker stopped.')
+            SMS.objects.filter(id__in=ids).update(status='Sending', attempts=F('attempts') + 1,
+                                                  next_attempt_at=now + timedelta(seconds=settings.SMS_SEND_TIMEOUT))
+        for sms_id in exhausted:
+            logger.error('Failed to send SMS {}, ran out of attempts.'.format(sms_id))
+        if ids or not rows:
+            return list(SMS.objects.filter(id__in=ids).order_by('next_attempt_at', 'id')), failed
+
+
+def send_sms(sms, provider, rate_limiter):
+    """
+    Sends one claimed message from a worker thread and records the outcome.
+    """
+    try:
+        rate_limiter.wait()
+        try:
+            message_id = provider.send(sms.mobile, sms.message)
+        except Exception as e:
+            permanent = isinstance(e, SMSPermanentError) or sms.attempts >= settings.SMS_MAX_ATTEMPTS
+            status = 'Failed' if permanent else 'Pending'
+            SMS.objects.filter(id=sms.id, status='Sending').update(
+                status=status, last_error=str(e), next_attempt_at=timezone.now() + retry_delay(sms.attempts))
+            logger.error('{}, failed to send SMS {} (attempt {}).'.format(e, sms.id, sms.attempts))
+            return status
+        SMS.objects.filter(id=sms.id, status='Sending').update(status='Sent', sent_at=timezone.now(),
+                                                                provider_message_id=message_id, last_error=None)
+        return 'Sent'
+    finally:
+        connection.close()
+
+
+def drain_outbox(workers=4, batch_size=100, rate=None, max_batches=None):
+    """
+    Sends due messages until none are left, returns a count of messages per final status.
+    """
+    provider = get_provider()
+    rate_limiter = RateLimiter(settings.SMS_RATE_LIMIT if rate is None else rate)
+    results = {'Sent': 0, 'Pending': 0, 'Failed': 0}
+    batches = 0
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while max_batches is None or batches < max_batches:
+            batch, failed = claim_batch(batch_size)
+            results['Failed'] += failed
+            if not batch:
+                break
+            batches += 1
+            for status in executor.map(lambda sms: send_sms(sms, provider, rate_limiter), batch):
+                results[status] += 1
+    return results
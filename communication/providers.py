@@ -0,0 +1,82 @@
+"""
+SMS providers.
+
+A provider sends one message and returns the provider's id for it. It raises
+SMSProviderError when sending failed and may be retried, and
+SMSPermanentError when retrying cannot help (e.g. an invalid number).
+"""
+import threading
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+class SMSProviderError(Exception):
+    """
+    Sending failed, the message may be retried.
+    """
+
+
+class SMSPermanentError(SMSProviderError):
+    """
+    Sending failed and retrying will not help.
+    """
+
+
+class SMSProvider(object):
+    """
+    Base class of SMS providers, instances are shared by the worker threads.
+    """
+    def send(self, to, body):
+        raise NotImplementedError
+
+
+class TwilioSMSProvider(SMSProvider):
+    """
+    Sends messages through Twilio with one client reused for all messages.
+    """
+    def __init__(self):
+        from twilio.rest import Client
+
+        self.client = Client(settings.TWILIO_SID, settings.TWILIO_AUTH_TOKEN)
+
+    def send(self, to, body):
+        from twilio.base.exceptions import TwilioException, TwilioRestException
+
+        try:
+            message = self.client.messages.create(from_=settings.TWILIO_PHONE_NUMBER, body=body, to=to)
+        except TwilioRestException as e:
+            if 400 <= e.status < 500 and e.status != 429:
+                raise SMSPermanentError(str(e))
+            raise SMSProviderError(str(e))
+        except (TwilioException, IOError) as e:
+            raise SMSProviderError(str(e))
+        return message.sid
+
+
+class LocalSMSProvider(SMSProvider):
+    """
+    Keeps sent messages in ``outbox`` instead of sending them, for tests and local runs.
+
+    Numbers listed in ``failures`` fail with the given exception.
+    """
+    outbox = []
+    failures = {}
+    lock = threading.Lock()
+
+    def send(self, to, body):
+        with self.lock:
+            if to in self.failures:
+                raise self.failures[to]
+            self.outbox.append({'to': to, 'body': body})
+            return 'local-%d' % len(self.outbox)
+
+
+_provider = None
+
+
+def get_provider():
+    global _provider
+    if _provider is None or _provider.__class__ is not import_string(settings.SMS_PROVIDER):
+        _provider = import_string(settings.SMS_PROVIDER)()
+    return _provider
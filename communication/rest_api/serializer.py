@@ -11,4 +11,4 @@ class SMSSerializer(serializers.ModelSerializer):
     class Meta:
         model = SMS
         fields = ('id', 'mobile', 'message', 'status', 'created_at')
-        read_only_fields = ('id', 'created_at',)
+        read_only_fields = ('id', 'status', 'created_at',)
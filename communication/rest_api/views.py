@@ -1,13 +1,11 @@
-from django.conf import settings
-
+from rest_framework import status
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 
-from twilio.rest import Client
-
-
 from communication.models import *
+from communication.outbox import enqueue_sms
+from communication.rest_api.serializer import SMSSerializer
 
 
 class SMSView(APIView):
@@ -16,22 +14,20 @@ class SMSView(APIView):
 
     def post(self, request, format=None):
         """
-        SMS
+        Queue an SMS, it is sent by the outbox worker.
         """
-        try:
-            sms = SMS.objects.create(mobile=request.POST['mobile'], message=request.POST['message'])
-            client = Client(settings.TWILIO_SID, settings.TWILIO_AUTH_TOKEN)
-            message = client.messages.create(from_=settings.TWILIO_PHONE_NUMBER, body=request.POST['message'],\
-                                             to=request.POST['mobile'])
-            sms.status = "Sent"
-            sms.save()
-            data = {
-                "status": 200,
-                "msg": "SMS sent successfully."
-            }
-        except Exception as e:
+        serializer = SMSSerializer(data=request.data)
+        if not serializer.is_valid():
             data = {
-                "status": 500,
-                "msg": "SMS failed to sent."
+                "status": 400,
+                "msg": "SMS failed to queue.",
+                "errors": serializer.errors
             }
-        return Response(data)
+            return Response(data, status=status.HTTP_400_BAD_REQUEST)
+        sms = enqueue_sms(serializer.validated_data['mobile'], serializer.validated_data.get('message'))
+        data = {
+            "status": 202,
+            "msg": "SMS queued successfully.",
+            "id": sms.id
+        }
+        return Response(data, status=status.HTTP_202_ACCEPTED)
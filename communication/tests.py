@@ -1,3 +1,48 @@
-from django.test import TestCase
+from django.test import TransactionTestCase, override_settings
 
-# Create your tests here.
+from communication.models import SMS
+from communication.outbox import enqueue_sms, drain_outbox
+from communication.providers import LocalSMSProvider, SMSProviderError, SMSPermanentError
+
+
+@override_settings(SMS_PROVIDER='communication.providers.LocalSMSProvider', SMS_RATE_LIMIT=0, SMS_MAX_ATTEMPTS=2)
+class SMSOutboxTest(TransactionTestCase):
+    """
+    Draining the outbox against the local provider.
+    """
+    def setUp(self):
+        LocalSMSProvider.outbox = []
+        LocalSMSProvider.failures = {}
+
+    def test_messages_are_sent(self):
+        for i in range(5):
+            enqueue_sms('+91999999999%d' % i, 'Message %d' % i)
+        self.assertEqual(drain_outbox(workers=2, batch_size=2), {'Sent': 5, 'Pending': 0, 'Failed': 0})
+        self.assertEqual(len(LocalSMSProvider.outbox), 5)
+        self.assertEqual(SMS.objects.filter(status='Sent', attempts=1).count(), 5)
+
+    def test_failures_are_retried_then_failed(self):
+        LocalSMSProvider.failures = {'+919999999990': SMSProviderError('timeout'),
+                                     '+919999999991': SMSPermanentError('invalid number')}
+        retried = enqueue_sms('+919999999990', 'Retried')
+        invalid = enqueue_sms('+919999999991', 'Invalid')
+        self.assertEqual(drain_outbox(workers=1), {'Sent': 0, 'Pending': 1, 'Failed': 1})
+        retried.refresh_from_db()
+        self.assertEqual((retried.status, retried.last_error), ('Pending', 'timeout'))
+        self.assertEqual(SMS.objects.get(id=invalid.id).status, 'Failed')
+
+        SMS.objects.filter(id=retried.id).update(next_attempt_at=retried.created_at)
+        self.assertEqual(drain_outbox(workers=1), {'Sent': 0, 'Pending': 0, 'Failed': 1})
+        self.assertEqual(SMS.objects.get(id=retried.id).attempts, 2)
+
+    def test_reclaimed_messages_run_out_of_attempts(self):
+        # workers died sending these, the first has an attempt left and the second has none
+        sms = [enqueue_sms('+91999999999%d' % i, 'Reclaimed %d' % i) for i in range(2)]
+        for message, attempts in zip(sms, (1, 2)):
+            SMS.objects.filter(id=message.id).update(status='Sending', attempts=attempts,
+                                                     next_attempt_at=message.created_at)
+        self.assertEqual(drain_outbox(workers=1), {'Sent': 1, 'Pending': 0, 'Failed': 1})
+        self.assertEqual(SMS.objects.get(id=sms[0].id).attempts, 2)
+        self.assertEqual(SMS.objects.get(id=sms[1].id).status, 'Failed')
+        self.assertEqual(SMS.objects.get(id=sms[1].id).attempts, 2)
+        self.assertEqual([sent['body'] for sent in LocalSMSProvider.outbox], ['Reclaimed 0'])
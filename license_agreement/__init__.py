@@ -0,0 +1 @@
+default_app_config = 'license_agreement.apps.LicenseAgreementConfig'
@@ -3,3 +3,14 @@ from django.apps import AppConfig
 
 class LicenseAgreementConfig(AppConfig):
     name = 'license_agreement'
+
+    def ready(self):
+        from django.core import checks
+        from django.db.models.signals import post_migrate
+        from license_agreement.signals import create_search_tables
+        from license_agreement.tokens import check_signing_keys
+        # connects the signals dropping cached credentials
+        import license_agreement.rest_api.authentication
+
+        post_migrate.connect(create_search_tables, sender=self)
+        checks.register(check_signing_keys)
@@ -0,0 +1,80 @@
+"""
+Set based updates of licensors, licensees, softwares and license agreements.
+
+queryset.update() skips save() and its signals. bulk_set() runs one UPDATE
+with the filter of the queryset in its WHERE clause and carries out the work
+save() would have done, without reading the rows: updated_at is set, the
+dashboard counters are moved by the number of rows per old status and expiry
+date, agreement status changes are logged by an INSERT ... SELECT and the
+search documents of changed agreements are indexed. Only the ids of
+agreements whose validity changes are read, to drop their cached validity.
+"""
+from collections import Counter as Tally
+
+from django.db import connections, transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from license_agreement.cache import invalidate_license_validity
+from license_agreement.counters import counter_keys, update_counters
+from license_agreement.models import *
+from license_agreement.search import SEARCH_FIELDS, update_search_documents
+
+VALIDITY_FIELDS = ('status', 'expiry_date', 'valid_ip_addresses')
+LOG_FIELDS = ('agreement', 'old_status', 'new_status', 'reason', 'changed_at')
+
+
+def bulk_set(queryset, reason='bulk update', **values):
+    """
+    Sets the given values on the rows of the queryset in one transaction, returns the number of rows.
+    """
+    model = queryset.model
+    is_agreement = model is SoftwareLicenseAgreement
+    counted = ('status', 'expiry_date') if is_agreement else ('status',)
+    # the rows as a subquery, so that also querysets with ordering, annotations or extra tables can be updated
+    rows = model._base_manager.using(queryset.db).filter(pk__in=queryset.order_by().values('pk'))
+    with transaction.atomic(using=queryset.db):
+        # the rows are locked as they are counted, the counts are those of the rows the UPDATE changes
+        locked = queryset.order_by().select_for_update(of=('self',)).values('pk')
+        groups = list(model._base_manager.using(queryset.db).filter(pk__in=locked).order_by()\
+                      .values_list(*counted).annotate(rows=Count('pk')))
+        if not groups:
+            return 0
+        now = timezone.now()
+        values['updated_at'] = now
+        if is_agreement and 'status' in values:
+            log_status_changes(rows, values['status'], reason, now)
+        if is_agreement and any(name in values for name, weight, boost in SEARCH_FIELDS):
+            update_search_documents(rows, values)
+        if is_agreement and any(name in values for name in VALIDITY_FIELDS):
+            ids = list(rows.values_list('id', flat=True))
+            transaction.on_commit(lambda: invalidate_license_validity(*ids), using=queryset.db)
+        updated = rows.update(**values)
+
+        deltas = Tally()
+        for group in groups:
+            old = dict(zip(counted, group))
+            new = dict(old, **{name: values[name] for name in counted if name in values})
+            for key in counter_keys(model, old):
+                deltas[key] -= group[-1]
+            for key in counter_keys(model, new):
+                deltas[key] += group[-1]
+        update_counters(deltas)
+    return updated
+
+
+def log_status_changes(rows, status, reason, changed_at):
+    """
+    Logs the change of the agreements among the rows which do not have the status yet, in one statement.
+    """
+    connection = connections[rows.db]
+    qn = connection.ops.quote_name
+    meta = AgreementStatusLog._meta
+    changed, params = rows.exclude(status=status).values_list('id', 'status').query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute('INSERT INTO {log} ({columns}) SELECT changed.id, changed.status, %s, %s, %s '
+                       'FROM ({changed}) changed'\
+                       .format(log=qn(meta.db_table), changed=changed,
+                               columns=', '.join(qn(meta.get_field(name).column) for name in LOG_FIELDS)),
+                       [status, reason, meta.get_field('changed_at').get_db_prep_value(changed_at, connection)] +
+                       list(params))
@@ -0,0 +1,190 @@
+"""
+Two level cache for license validity lookups.
+
+A small per process LRU sits in front of the shared django cache backend so
+that repeated validity checks for the same agreement are served without a
+database round trip.
+"""
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime as dt, timedelta
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+
+from SoftwareLicensing.db_router import get_read_database
+
+VALIDITY_CACHE_KEY = 'license_validity:{}'
+
+# Marker stored for agreements which do not exist, so that lookups of unknown
+# ids are cached too.
+MISSING = {'missing': True}
+
+
+class LRUCache(object):
+    """
+    Thread safe in-process LRU cache with per entry expiry.
+    """
+    def __init__(self, max_size=1024, timeout=5):
+        self.max_size = max_size
+        self.timeout = timeout
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                expires_at, value = self._data[key]
+            except KeyError:
+                return default
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout=None):
+        if timeout is None:
+            timeout = self.timeout
+        with self._lock:
+            self._data[key] = (time.monotonic() + timeout, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+local_validity_cache = LRUCache(max_size=settings.VALIDITY_LOCAL_CACHE_SIZE,
+                                timeout=settings.VALIDITY_LOCAL_CACHE_TIMEOUT)
+
+
+def get_shared_cache():
+    return caches[settings.VALIDITY_CACHE_ALIAS]
+
+
+def validity_cache_key(agreement_id):
+    return VALIDITY_CACHE_KEY.format(agreement_id)
+
+
+def build_license_validity(status, expiry_date, valid_ip_addresses=None):
+    """
+    Build the validity payload of an agreement from its status and expiry date.
+    """
+    data = {
+        "is_valid": status == 'Active' and timezone.localdate() <= expiry_date,
+        "expiry_date": expiry_date,
+        "status": status,
+        "valid_ip_addresses": valid_ip_addresses
+    }
+    return data
+
+
+def validity_timeout(data):
+    """
+    Seconds a validity payload may be cached, capped so that a valid license
+    drops out of the cache at midnight on its expiry date. A replica may not
+    have the change an invalidation was for yet, payloads of requests reading
+    a replica are cached for REPLICA_STICKY_SECONDS at most.
+    """
+    timeout = settings.VALIDITY_CACHE_TIMEOUT
+    if get_read_database() is not None:
+        timeout = min(timeout, settings.REPLICA_STICKY_SECONDS)
+    if data.get('missing') or not data['is_valid']:
+        return timeout
+    midnight = timezone.make_aware(dt.combine(data['expiry_date'] + timedelta(days=1), dt.min.time()))
+    return max(1, min(timeout, int((midnight - timezone.now()).total_seconds())))
+
+
+def load_license_validity(agreement_id):
+    """
+    Read the validity of an agreement straight from the database.
+    """
+    from license_agreement.models import SoftwareLicenseAgreement
+
+    row = SoftwareLicenseAgreement.objects.filter(id=agreement_id)\
+        .values('status', 'expiry_date', 'valid_ip_addresses').first()
+    if row is None:
+        return MISSING
+    return build_license_validity(row['status'], row['expiry_date'], row['valid_ip_addresses'])
+
+
+def get_license_validity(agreement_id):
+    """
+    Return the validity payload of an agreement, or None if it does not exist.
+    """
+    key = validity_cache_key(agreement_id)
+    data = local_validity_cache.get(key)
+    if data is None:
+        shared_cache = get_shared_cache()
+        data = shared_cache.get(key)
+        if data is None:
+            data = load_license_validity(agreement_id)
+            shared_cache.set(key, data, validity_timeout(data))
+        local_validity_cache.set(key, data, min(settings.VALIDITY_LOCAL_CACHE_TIMEOUT, validity_timeout(data)))
+    if data.get('missing'):
+        return None
+    return data
+
+
+def get_license_validities(agreement_ids):
+    """
+    Return validity payloads of many agreements keyed by id, None for unknown ids.
+
+    Ids missing from both cache levels are loaded with a single query.
+    """
+    found = {}
+    missed = {}
+    for agreement_id in set(agreement_ids):
+        key = validity_cache_key(agreement_id)
+        data = local_validity_cache.get(key)
+        if data is None:
+            missed[key] = agreement_id
+        else:
+            found[agreement_id] = data
+
+    if missed:
+        shared_cache = get_shared_cache()
+        fetched = shared_cache.get_many(list(missed))
+        unknown = [key for key in missed if key not in fetched]
+        if unknown:
+            from license_agreement.models import SoftwareLicenseAgreement
+
+            loaded = dict.fromkeys(unknown, MISSING)
+            rows = SoftwareLicenseAgreement.objects.filter(id__in=[missed[key] for key in unknown])\
+                .values('id', 'status', 'expiry_date', 'valid_ip_addresses')
+            for row in rows:
+                loaded[validity_cache_key(row['id'])] = build_license_validity(row['status'], row['expiry_date'],
+                                                                               row['valid_ip_addresses'])
+            by_timeout = {}
+            for key, data in loaded.items():
+                by_timeout.setdefault(validity_timeout(data), {})[key] = data
+            for timeout, entries in by_timeout.items():
+                shared_cache.set_many(entries, timeout)
+            fetched.update(loaded)
+        for key, data in fetched.items():
+            found[missed[key]] = data
+            local_validity_cache.set(key, data, min(settings.VALIDITY_LOCAL_CACHE_TIMEOUT, validity_timeout(data)))
+
+    return {agreement_id: None if data.get('missing') else data for agreement_id, data in found.items()}
+
+
+def invalidate_license_validity(*agreement_ids):
+    """
+    Drop cached validity of the given agreements.
+    """
+    keys = [validity_cache_key(agreement_id) for agreement_id in agreement_ids]
+    for key in keys:
+        local_validity_cache.delete(key)
+    get_shared_cache().delete_many(keys)
@@ -0,0 +1,134 @@
+"""
+Maintained counts of live objects for the dashboard.
+
+Counts live in the Counter table and are updated by the save and delete
+signals of the counted models, in the transaction of the save. Active
+agreements are counted per expiry date so that the dashboard can tell active,
+expiring and overdue licenses apart from the same rows, agreements of the
+other statuses are counted per status. The expiry sweep moves past days to
+the Expired row, so the table holds about a row per future expiry date, and
+the dashboard sums the rows in the database. reconcile_counters() rebuilds
+the table from the counted tables.
+"""
+from collections import Counter as Tally
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+from django.utils import timezone
+
+from license_agreement.models import *
+
+COUNTED_MODELS = (
+    (Licensor, 'licensors'),
+    (Licensee, 'licensees'),
+    (Software, 'softwares'),
+)
+LICENSES_PREFIX = 'licenses:'
+ACTIVE_PREFIX = LICENSES_PREFIX + 'Active:'
+
+
+def license_key(status, expiry_date=None):
+    if status == 'Active':
+        return ACTIVE_PREFIX + expiry_date.isoformat()
+    return LICENSES_PREFIX + status
+
+
+def counter_keys(model, values):
+    """
+    Returns the (key, day) counters an object with the given values counts towards.
+    """
+    if values.get('status') in (None, 'Delete'):
+        return []
+    if model is SoftwareLicenseAgreement:
+        if values['status'] != 'Active':
+            return [(license_key(values['status']), None)]
+        if values.get('expiry_date') is None:
+            return []
+        return [(license_key('Active', values['expiry_date']), values['expiry_date'])]
+    return [(dict(COUNTED_MODELS)[model], None)]
+
+
+def current_values(instance):
+    return {'status': instance.status, 'expiry_date': getattr(instance, 'expiry_date', None)}
+
+
+def update_counters(deltas):
+    """
+    Adds the deltas, a mapping of (key, day) to an integer, to the counters.
+    """
+    for (key, day), delta in sorted(deltas.items(), key=lambda item: item[0][0]):
+        if not delta:
+            continue
+        if Counter.objects.filter(key=key).update(value=F('value') + delta):
+            continue
+        try:
+            with transaction.atomic():
+                Counter.objects.create(key=key, day=day, value=delta)
+        except IntegrityError:
+            Counter.objects.filter(key=key).update(value=F('value') + delta)
+
+
+def record_change(model, old_values, new_values):
+    deltas = Tally()
+    for key in counter_keys(model, old_values):
+        deltas[key] -= 1
+    for key in counter_keys(model, new_values):
+        deltas[key] += 1
+    update_counters(deltas)
+
+
+@transaction.atomic
+def reconcile_counters():
+    """
+    Rebuilds all counters from the counted tables, returns the number of counters changed.
+    """
+    counts = Tally()
+    for model, key in COUNTED_MODELS:
+        counts[(key, None)] = model.live.count()
+    rows = SoftwareLicenseAgreement.live.values('status', 'expiry_date').annotate(count=Count('id'))\
+        .order_by()
+    for row in rows:
+        for key in counter_keys(SoftwareLicenseAgreement, row):
+            counts[key] += row['count']
+
+    existing = {counter.key: counter for counter in Counter.objects.select_for_update()}
+    changed = 0
+    for (key, day), value in counts.items():
+        counter = existing.pop(key, None)
+        if counter is None:
+            Counter.objects.create(key=key, day=day, value=value)
+            changed += 1
+        elif counter.value != value:
+            Counter.objects.filter(pk=counter.pk).update(value=value)
+            changed += 1
+    stale = [counter.pk for counter in existing.values() if counter.value]
+    Counter.objects.filter(pk__in=[counter.pk for counter in existing.values()]).delete()
+    return changed + len(stale)
+
+
+def prune_counters():
+    """
+    Deletes the per day counters which dropped to zero, returns the number deleted.
+    """
+    deleted, by_model = Counter.objects.filter(day__isnull=False, value=0).delete()
+    return deleted
+
+
+def get_dashboard_counts(today=None):
+    """
+    Returns the dashboard counts summed up from the counter table in a single query.
+    """
+    today = today or timezone.localdate()
+    expiring_until = today + timedelta(days=settings.DASHBOARD_EXPIRING_DAYS)
+    active = Q(key__startswith=ACTIVE_PREFIX)
+    sums = {'%s_count' % key: Sum('value', filter=Q(key=key)) for model, key in COUNTED_MODELS}
+    sums.update({
+        'licenses_count': Sum('value', filter=Q(key__startswith=LICENSES_PREFIX)),
+        'active_licenses_count': Sum('value', filter=active & Q(day__gte=today)),
+        'expiring_licenses_count': Sum('value', filter=active & Q(day__gte=today, day__lte=expiring_until)),
+        # active licenses past their expiry date which the expiry sweep has not flipped yet count as expired
+        'expired_licenses_count': Sum('value', filter=Q(key=license_key('Expired')) | active & Q(day__lt=today)),
+    })
+    return {name: value or 0 for name, value in Counter.objects.aggregate(**sums).items()}
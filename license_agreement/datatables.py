@@ -0,0 +1,116 @@
+"""
+DataTables server side processing.
+
+Big tables are not rendered into the list pages, DataTables fetches one page
+at a time from a JSON view instead and paging, sorting and searching are done
+by the database.
+https://datatables.net/manual/server-side
+"""
+from functools import reduce
+import operator
+
+from django.conf import settings
+from django.contrib.auth.mixins import LoginRequiredMixin
+from django.db.models import Q
+from django.http import JsonResponse
+from django.urls import reverse
+from django.utils.formats import localize
+from django.utils.html import escape, format_html
+from django.views.generic import View
+
+
+class ServerSideListMixin(object):
+    """
+    List view mixin which renders small tables in the page and leaves bigger
+    tables to the server side processing view named by ``data_url_name``.
+    """
+    data_url_name = None
+
+    def get_context_data(self, **kwargs):
+        server_side = self.object_list.count() > settings.DATATABLES_CLIENT_SIDE_LIMIT
+        if server_side:
+            self.object_list = self.object_list.none()
+        context = super().get_context_data(**kwargs)
+        context['server_side'] = server_side
+        context['data_url'] = reverse(self.data_url_name)
+        return context
+
+
+class DataTablesView(LoginRequiredMixin, View):
+    """
+    Base view answering DataTables server side processing requests.
+
+    ``columns`` lists, for each table column, the fields the column is ordered
+    by and the fields searched for it. Columns with no order fields are not
+    orderable. Every word of a search has to be found in one of the searched
+    fields, so a full name matches its first and last name fields.
+    """
+    queryset = None
+    columns = ()
+    update_url_name = None
+    delete_url_name = None
+    max_length = 500
+    max_search_words = 10
+
+    def get_queryset(self):
+        return self.queryset.all()
+
+    def render_row(self, obj):
+        raise NotImplementedError
+
+    def get_int(self, name, default):
+        try:
+            return max(0, int(self.request.GET.get(name, default)))
+        except ValueError:
+            return default
+
+    def search(self, queryset, value):
+        fields = [field for order_fields, search_fields in self.columns for field in search_fields]
+        if not fields:
+            return queryset
+        condition = Q()
+        for word in value.split()[:self.max_search_words]:
+            condition &= reduce(operator.or_, [Q(**{'%s__icontains' % field: word}) for field in fields])
+        return queryset.filter(condition)
+
+    def get_ordering(self):
+        ordering = []
+        i = 0
+        while 'order[%d][column]' % i in self.request.GET:
+            column = self.get_int('order[%d][column]' % i, 0)
+            prefix = '-' if self.request.GET.get('order[%d][dir]' % i) == 'desc' else ''
+            if column < len(self.columns):
+                ordering.extend(prefix + field for field in self.columns[column][0])
+            i += 1
+        ordering.append('-id')
+        return ordering
+
+    def get(self, request):
+        queryset = self.get_queryset()
+        records_total = queryset.count()
+
+        value = request.GET.get('search[value]', '').strip()
+        if value:
+            queryset = self.search(queryset, value)
+            records_filtered = queryset.count()
+        else:
+            records_filtered = records_total
+
+        start = self.get_int('start', 0)
+        length = min(self.get_int('length', 10), self.max_length) or self.max_length
+        page = queryset.order_by(*self.get_ordering())[start:start + length]
+
+        data = {
+            'draw': self.get_int('draw', 0),
+            'recordsTotal': records_total,
+            'recordsFiltered': records_filtered,
+            'data': [[escape(localize(cell)) if cell is not None else '' for cell in self.render_row(obj)] +\
+                     [self.render_actions(obj)] for obj in page]
+        }
+        return JsonResponse(data)
+
+    def render_actions(self, obj):
+        return format_html('<a class="fa fa-pencil-square-o" href="{}"></a>\n'
+                           '<a class="fa fa-times client_delete_icon" href="{}" obj_name=\'\' '
+                           'style="padding-left:50px;"></a>',
+                           reverse(self.update_url_name, args=(obj.id,)), reverse(self.delete_url_name, args=(obj.id,)))
@@ -0,0 +1,38 @@
+"""
+Expiry sweep of license agreements.
+
+Active agreements past their expiry date are flipped to Expired in chunks
+selected on the (status, expiry_date) index. Each chunk is one bulk_set()
+transaction: one UPDATE, the AgreementStatusLog rows of the change, the
+dashboard counters moved and the cached validity of the chunk dropped. The
+per day counters the sweep emptied are deleted afterwards.
+"""
+from django.conf import settings
+from django.utils import timezone
+
+from license_agreement.counters import prune_counters
+from license_agreement.models import *
+
+EXPIRED = 'Expired'
+
+
+def expire_agreements(today=None, chunk_size=None):
+    """
+    Flips active agreements which expired before today to Expired, returns the number flipped.
+    """
+    today = today or timezone.localdate()
+    chunk_size = chunk_size or settings.EXPIRY_SWEEP_CHUNK_SIZE
+    expired = 0
+    while True:
+        count = expire_chunk(today, chunk_size)
+        expired += count
+        if count < chunk_size:
+            prune_counters()
+            return expired
+
+
+def expire_chunk(today, chunk_size):
+    chunk = SoftwareLicenseAgreement.objects.filter(status='Active', expiry_date__lt=today)\
+        .order_by('expiry_date', 'id').values('id')[:chunk_size]
+    return SoftwareLicenseAgreement.objects.filter(id__in=chunk, status='Active')\
+        .bulk_set(reason='expiry sweep', status=EXPIRED)
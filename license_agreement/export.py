@@ -0,0 +1,179 @@
+"""
+Streaming CSV and XLSX export of license agreements.
+
+Rows are fetched with values_list() in chunks of EXPORT_CHUNK_SIZE from a
+server side cursor where the database supports one and written to the
+response as they arrive, so an export of any size starts at once and holds
+one chunk in memory. The XLSX file is a zip archive written without seeking,
+its worksheet is compressed and sent row by row like the CSV.
+"""
+import csv
+import re
+import zipfile
+from datetime import date
+from decimal import Decimal
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+# Exported columns and the fields they are read from, names are joined from first and last name
+AGREEMENT_EXPORT_COLUMNS = (
+    ('ID', ('id',)),
+    ('Licensor', ('licensor__email',)),
+    ('Licensor Name', ('licensor__first_name', 'licensor__last_name')),
+    ('Licensee', ('licensee__email',)),
+    ('Licensee Name', ('licensee__first_name', 'licensee__last_name')),
+    ('Software', ('software__name',)),
+    ('Start Date', ('effective_date',)),
+    ('Expiry Date', ('expiry_date',)),
+    ('Delivery Date', ('delivery_date',)),
+    ('Price', ('price',)),
+    ('Number Of Copies', ('no_of_copies',)),
+    ('Warrenty Period', ('warrenty_period',)),
+    ('Valid IP Addresses', ('valid_ip_addresses',)),
+    ('Status', ('status',)),
+    ('Created At', ('created_at',)),
+)
+
+# Leading characters which make spreadsheet applications evaluate a cell
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+EXPORT_FORMATS = ('csv', 'xlsx')
+
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+XML_HEAD = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+MAIN_NS = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+RELATIONSHIPS_NS = 'http://schemas.openxmlformats.org/package/2006/relationships'
+DOCUMENT_NS = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+XLSX_PARTS = (
+    ('[Content_Types].xml',
+     '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+     '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+     '<Default Extension="xml" ContentType="application/xml"/>'
+     '<Override PartName="/xl/workbook.xml" '
+     'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+     '<Override PartName="/xl/worksheets/sheet1.xml" '
+     'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/></Types>'),
+    ('_rels/.rels',
+     '<Relationships xmlns="{rels}"><Relationship Id="rId1" Type="{document}/officeDocument" '
+     'Target="xl/workbook.xml"/></Relationships>'.format(rels=RELATIONSHIPS_NS, document=DOCUMENT_NS)),
+    ('xl/workbook.xml',
+     '<workbook xmlns="{main}" xmlns:r="{document}"><sheets><sheet name="Licenses" sheetId="1" r:id="rId1"/>'
+     '</sheets></workbook>'.format(main=MAIN_NS, document=DOCUMENT_NS)),
+    ('xl/_rels/workbook.xml.rels',
+     '<Relationships xmlns="{rels}"><Relationship Id="rId1" Type="{document}/worksheet" '
+     'Target="worksheets/sheet1.xml"/></Relationships>'.format(rels=RELATIONSHIPS_NS, document=DOCUMENT_NS)),
+)
+WORKSHEET = 'xl/worksheets/sheet1.xml'
+# Characters XML 1.0 does not allow
+INVALID_XML = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+class Echo(object):
+    """
+    File-like object whose write() returns the value, for csv.writer over a generator.
+    """
+    def write(self, value):
+        return value
+
+
+class StreamBuffer(object):
+    """
+    Write only file for zipfile, the bytes written so far are taken out with pop().
+    """
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def clean_cell(value):
+    if value is None:
+        return ''
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def agreement_rows(queryset, chunk_size=None):
+    """
+    Yields the header and one row per agreement of the queryset.
+    """
+    yield [header for header, names in AGREEMENT_EXPORT_COLUMNS]
+    queryset = queryset.order_by(*(list(queryset.query.order_by) + ['id']))
+    fields = [name for header, names in AGREEMENT_EXPORT_COLUMNS for name in names]
+    spans = [len(names) for header, names in AGREEMENT_EXPORT_COLUMNS]
+    for values in queryset.values_list(*fields).iterator(chunk_size=chunk_size or settings.EXPORT_CHUNK_SIZE):
+        row = []
+        i = 0
+        for span in spans:
+            row.append(values[i] if span == 1 else ' '.join(str(value) for value in values[i:i + span] if value))
+            i += span
+        yield row
+
+
+def xlsx_cell(value):
+    """
+    Cell of a worksheet row. Text is an inline string, which spreadsheet applications never evaluate as a formula.
+    """
+    if value is None or value == '':
+        return '<c/>'
+    if isinstance(value, (int, float, Decimal)) and not isinstance(value, bool):
+        return '<c><v>%s</v></c>' % value
+    if isinstance(value, date):
+        value = value.isoformat()
+    return '<c t="inlineStr"><is><t xml:space="preserve">%s</t></is></c>' % escape(INVALID_XML.sub('', str(value)))
+
+
+def xlsx_chunks(rows):
+    """
+    Yields the bytes of an XLSX workbook with the rows on its only worksheet, as they are compressed.
+    """
+    buffer = StreamBuffer()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for name, content in XLSX_PARTS:
+            archive.writestr(name, XML_HEAD + content)
+        yield buffer.pop()
+        with archive.open(WORKSHEET, 'w', force_zip64=True) as worksheet:
+            worksheet.write((XML_HEAD + '<worksheet xmlns="%s"><sheetData>' % MAIN_NS).encode('utf-8'))
+            for number, row in enumerate(rows, 1):
+                worksheet.write(('<row r="%d">%s</row>' % (number, ''.join(xlsx_cell(value) for value in row)))\
+                                .encode('utf-8'))
+                data = buffer.pop()
+                if data:
+                    yield data
+            worksheet.write(b'</sheetData></worksheet>')
+    yield buffer.pop()
+
+
+def export_agreements(queryset, chunk_size=None, file_format='csv'):
+    """
+    Streaming CSV or XLSX response of the agreements of the queryset.
+    """
+    rows = agreement_rows(queryset, chunk_size)
+    if file_format == 'xlsx':
+        response = StreamingHttpResponse(xlsx_chunks(rows), content_type=XLSX_CONTENT_TYPE)
+    else:
+        writer = csv.writer(Echo())
+        response = StreamingHttpResponse((writer.writerow([clean_cell(value) for value in row]) for row in rows),
+                                         content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = 'attachment; filename="licenses-%s.%s"' % (timezone.now().strftime('%Y%m%d'),
+                                                                               file_format)
+    return response
@@ -0,0 +1,221 @@
+"""
+Streaming bulk import of licensors and licensees.
+
+Rows are read lazily from CSV or JSON lines input and handled in chunks: a
+chunk is validated, checked for duplicate emails and mobiles with one query
+each, and its addresses and parties are written with bulk_create in one
+transaction. Rows which fail are reported with their line number and do not
+stop the import. Only one chunk is held in memory at a time. A file which is
+not UTF-8 or not CSV stops the import with ImportFileError, the chunks before
+the broken line stay imported.
+
+CSV columns and JSON keys are the party fields (first_name, last_name,
+designation, organization_name, mobile, email, status) and the address fields
+(line1, line2, city_or_village, state, country, zip_code). JSON rows may also
+nest the address fields under "address".
+"""
+import codecs
+import csv
+import json
+from collections import Counter as Tally
+from itertools import islice
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+
+from rest_framework import serializers
+
+from license_agreement.counters import counter_keys, update_counters
+from license_agreement.models import *
+from license_agreement.rest_api.serializer import AddressSerializer
+
+PARTY_FIELDS = ('first_name', 'last_name', 'designation', 'organization_name', 'mobile', 'email', 'status')
+ADDRESS_FIELDS = ('line1', 'line2', 'city_or_village', 'state', 'country', 'zip_code')
+FORMATS = ('csv', 'jsonl')
+
+
+class ImportFileError(ValueError):
+    """
+    The file can not be read, ``result`` holds what was imported before.
+    """
+    def __init__(self, message, result):
+        super().__init__(message)
+        self.result = result
+
+
+class ImportResult(object):
+    """
+    Number of created rows and the errors of the rows which failed
+    """
+    def __init__(self, max_errors=None):
+        self.created = 0
+        self.failed = 0
+        self.errors = []
+        self.max_errors = settings.IMPORT_MAX_REPORTED_ERRORS if max_errors is None else max_errors
+
+    def add_error(self, line, errors):
+        self.failed += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({'line': line, 'errors': errors})
+
+    def as_dict(self):
+        return {'created': self.created, 'failed': self.failed, 'errors': self.errors,
+                'errors_truncated': self.failed > len(self.errors)}
+
+
+def get_import_serializer(model):
+    """
+    Serializer validating one imported row, uniqueness is checked per chunk instead of per row.
+    """
+    class PartyImportSerializer(serializers.ModelSerializer):
+        address = AddressSerializer()
+
+        class Meta:
+            fields = PARTY_FIELDS + ('address',)
+            extra_kwargs = {
+                'email': {'validators': []},
+                'mobile': {'validators': model._meta.get_field('mobile').validators[:1]},
+            }
+
+    PartyImportSerializer.Meta.model = model
+    return PartyImportSerializer
+
+
+def read_csv(stream):
+    reader = csv.DictReader(codecs.iterdecode(stream, 'utf-8-sig'))
+    for row in reader:
+        yield reader.line_num, row
+
+
+def read_jsonl(stream):
+    for line_number, line in enumerate(codecs.iterdecode(stream, 'utf-8-sig'), 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+            if not isinstance(row, dict):
+                raise ValueError('Expected a JSON object.')
+        except ValueError as e:
+            yield line_number, e
+            continue
+        yield line_number, row
+
+
+def read_rows(stream, format):
+    """
+    Yields (line number, row) of a binary stream, row is an exception for lines which can not be parsed.
+    """
+    rows = read_csv(stream) if format == 'csv' else read_jsonl(stream)
+    for line_number, row in rows:
+        if isinstance(row, Exception):
+            yield line_number, row
+            continue
+        address = row.get('address') if isinstance(row.get('address'), dict) else\
+            {name: row.get(name) for name in ADDRESS_FIELDS}
+        data = {name: row.get(name) for name in PARTY_FIELDS if row.get(name) not in (None, '')}
+        data['address'] = {name: value for name, value in address.items() if value not in (None, '')}
+        yield line_number, data
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def import_parties(model, stream, format='csv', chunk_size=None, result=None):
+    """
+    Imports licensors or licensees from a binary stream, returns an ImportResult.
+    """
+    result = result or ImportResult()
+    chunk_size = chunk_size or settings.IMPORT_CHUNK_SIZE
+    serializer_class = get_import_serializer(model)
+    try:
+        for chunk in chunked(read_rows(stream, format), chunk_size):
+            import_chunk(model, serializer_class, chunk, result)
+    except UnicodeDecodeError:
+        raise ImportFileError('The file is not UTF-8 encoded.', result)
+    except csv.Error as e:
+        raise ImportFileError('The file is not valid CSV: %s.' % e, result)
+    return result
+
+
+def import_chunk(model, serializer_class, chunk, result):
+    """
+    Validates the rows of a chunk and saves the valid ones.
+    """
+    valid = []
+    for line_number, data in chunk:
+        if isinstance(data, Exception):
+            result.add_error(line_number, {'non_field_errors': [str(data)]})
+            continue
+        serializer = serializer_class(data=data)
+        if serializer.is_valid():
+            valid.append((line_number, serializer.validated_data))
+        else:
+            result.add_error(line_number, serializer.errors)
+    valid = drop_duplicates(model, valid, result)
+    if valid:
+        save_chunk(model, valid, result)
+
+
+def drop_duplicates(model, rows, result):
+    """
+    Reports rows whose email or mobile is taken by an existing row or an earlier row of the chunk.
+    """
+    taken = {
+        'email': set(model.objects.filter(email__in=[data['email'] for line, data in rows])\
+                     .values_list('email', flat=True)),
+        'mobile': set(model.objects.filter(mobile__in=[data['mobile'] for line, data in rows])\
+                      .values_list('mobile', flat=True)),
+    }
+    unique = []
+    for line_number, data in rows:
+        errors = {name: ['%s with this %s already exists.' % (model._meta.verbose_name, name)]\
+                  for name in ('email', 'mobile') if data[name] in taken[name]}
+        if errors:
+            result.add_error(line_number, errors)
+            continue
+        taken['email'].add(data['email'])
+        taken['mobile'].add(data['mobile'])
+        unique.append((line_number, data))
+    return unique
+
+
+def save_chunk(model, rows, result):
+    """
+    Writes the addresses and parties of a chunk, one row at a time if the chunk fails.
+    """
+    try:
+        with transaction.atomic():
+            addresses = [Address(**data['address']) for line, data in rows]
+            if connection.features.can_return_ids_from_bulk_insert:
+                addresses = Address.objects.bulk_create(addresses)
+            else:
+                for address in addresses:
+                    address.save()
+            parties = [model(address=address, **{name: value for name, value in data.items() if name != 'address'})\
+                       for address, (line, data) in zip(addresses, rows)]
+            model.objects.bulk_create(parties)
+            count_created(model, parties)
+        result.created += len(parties)
+    except IntegrityError:
+        if len(rows) == 1:
+            result.add_error(rows[0][0], {'non_field_errors': ['Row conflicts with an existing row.']})
+            return
+        for row in rows:
+            save_chunk(model, [row], result)
+
+
+def count_created(model, parties):
+    """
+    bulk_create sends no signals, the dashboard counters are updated here.
+    """
+    deltas = Tally()
+    for party in parties:
+        for key in counter_keys(model, {'status': party.status}):
+            deltas[key] += 1
+    update_counters(deltas)
@@ -0,0 +1,124 @@
+"""
+IP allowlists of license agreements.
+
+``valid_ip_addresses`` holds comma separated addresses, CIDR networks or
+``first-last`` ranges, IPv4 or IPv6. An allowlist is compiled once into sorted,
+merged integer intervals per IP version and looked up by bisection, compiled
+allowlists are kept in a per process LRU keyed by agreement and allowlist text.
+An empty allowlist allows every address. Entries which are not valid, left
+from before the field was validated, are logged and match no address, so an
+allowlist made of them only allows nothing instead of everything.
+"""
+import ipaddress
+import logging
+from bisect import bisect_right
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+
+from license_agreement.cache import LRUCache
+
+logger = logging.getLogger('licensing_log')
+
+
+def split_entries(text):
+    return [entry.strip() for entry in (text or '').replace('\n', ',').split(',') if entry.strip()]
+
+
+def parse_entry(entry):
+    """
+    Returns the (version, first, last) interval of an address, network or range.
+    """
+    if '-' in entry:
+        first, last = (ipaddress.ip_address(part.strip()) for part in entry.split('-', 1))
+        if first.version != last.version or first > last:
+            raise ValueError('%s is not a valid ip address range.' % entry)
+        return first.version, int(first), int(last)
+    network = ipaddress.ip_network(entry, strict=False)
+    return network.version, int(network.network_address), int(network.broadcast_address)
+
+
+def validate_ip_allowlist(value):
+    for entry in split_entries(value):
+        try:
+            parse_entry(entry)
+        except ValueError:
+            raise ValidationError('%(entry)s is not a valid ip address, network or range.', params={'entry': entry})
+
+
+class IPAllowlist(object):
+    """
+    Compiled allowlist.
+    """
+    def __init__(self, intervals=(), restricted=None):
+        self.restricted = bool(intervals) if restricted is None else restricted
+        self.starts = {4: [], 6: []}
+        self.ends = {4: [], 6: []}
+        for version, first, last in sorted(intervals):
+            starts, ends = self.starts[version], self.ends[version]
+            if ends and first <= ends[-1] + 1:
+                ends[-1] = max(ends[-1], last)
+            else:
+                starts.append(first)
+                ends.append(last)
+
+    @classmethod
+    def parse(cls, text):
+        """
+        Compiles an allowlist, entries which are not valid match no address.
+        """
+        entries = split_entries(text)
+        intervals = []
+        invalid = []
+        for entry in entries:
+            try:
+                intervals.append(parse_entry(entry))
+            except ValueError:
+                invalid.append(entry)
+        if invalid:
+            logger.warning('Invalid ip allowlist entries ignored: %s', ', '.join(invalid))
+        return cls(intervals, restricted=bool(entries))
+
+    def __len__(self):
+        return len(self.starts[4]) + len(self.starts[6])
+
+    def allows(self, address):
+        if not self.restricted:
+            return True
+        try:
+            address = ipaddress.ip_address(address)
+        except ValueError:
+            return False
+        if address.version == 6 and address.ipv4_mapped:
+            address = address.ipv4_mapped
+        value = int(address)
+        i = bisect_right(self.starts[address.version], value) - 1
+        return i >= 0 and value <= self.ends[address.version][i]
+
+
+allowlist_cache = LRUCache(max_size=settings.IP_ALLOWLIST_CACHE_SIZE, timeout=settings.IP_ALLOWLIST_CACHE_TIMEOUT)
+
+
+def get_ip_allowlist(agreement_id, text):
+    """
+    Returns the compiled allowlist of an agreement.
+    """
+    key = (agreement_id, text)
+    allowlist = allowlist_cache.get(key)
+    if allowlist is None:
+        allowlist = IPAllowlist.parse(text)
+        allowlist_cache.set(key, allowlist)
+    return allowlist
+
+
+def get_client_ip(request):
+    """
+    Address of the client, taken from X-Forwarded-For when behind LICENSE_TRUSTED_PROXIES proxies.
+    """
+    proxies = settings.LICENSE_TRUSTED_PROXIES
+    if proxies:
+        forwarded = [address.strip() for address in request.META.get('HTTP_X_FORWARDED_FOR', '').split(',')\
+                     if address.strip()]
+        if len(forwarded) >= proxies:
+            return forwarded[-proxies]
+    return request.META.get('REMOTE_ADDR')
@@ -0,0 +1,186 @@
+import json
+import math
+import random
+import sys
+import threading
+import time
+from datetime import date, timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connection, connections, reset_queries
+from django.test import Client
+
+from SoftwareLicensing.querycount import QueryRecorder
+
+from license_agreement.management.commands.generate_data import WORDS
+from license_agreement.models import *
+
+SCENARIOS = ('validity', 'list', 'dashboard', 'pages', 'search', 'create')
+PAGES = ('/license/agreements/', '/license/licensors/', '/license/licensees/', '/license/softwares/')
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[max(0, math.ceil(fraction * len(values)) - 1)]
+
+
+class Command(BaseCommand):
+    help = 'Measure latency, throughput and database queries of the hot endpoints in process, against the ' \
+           'configured database. Fill the database with generate_data first.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('scenarios', nargs='*', metavar='scenario',
+                            help='One or more of %s, all by default.' % ', '.join(SCENARIOS))
+        parser.add_argument('--requests', type=int, default=500, help='Measured requests per scenario.')
+        parser.add_argument('--warmup', type=int, default=20, help='Unmeasured requests run first per scenario.')
+        parser.add_argument('--concurrency', type=int, default=1,
+                            help='Threads sending requests at the same time, each with its own database connection.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='Write the results as JSON to this file.')
+        parser.add_argument('--baseline', help='Compare with the JSON results of an earlier run.')
+        parser.add_argument('--tolerance', type=float, default=0.2,
+                            help='Allowed p50 slow down against the baseline, 0.2 is 20%%.')
+
+    def handle(self, *args, **options):
+        unknown = set(options['scenarios']) - set(SCENARIOS)
+        if unknown:
+            raise CommandError('Unknown scenarios: {}.'.format(', '.join(sorted(unknown))))
+        self.rnd = random.Random(options['seed'])
+        self.agreement = SoftwareLicenseAgreement.live.filter(status='Active')\
+            .select_related('licensor', 'licensee', 'software').order_by('id').first()
+        if self.agreement is None:
+            raise CommandError('No active agreements found, run generate_data first.')
+        self.agreement_ids = list(SoftwareLicenseAgreement.live.order_by('?').values_list('id', flat=True)[:1000])
+        self.user, created = User.objects.get_or_create(username='benchmark', defaults={'is_staff': True})
+        self.client = self.make_client()
+
+        results = {}
+        for name in options['scenarios'] or SCENARIOS:
+            request = getattr(self, 'request_%s' % name)
+            for i in range(options['warmup']):
+                self.check_response(name, request(self.client))
+            results[name] = self.measure(name, request, options['requests'], options['concurrency'])
+            self.report(name, results[name])
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump({'vendor': connection.vendor, 'results': results}, f, indent=2)
+        if options['baseline']:
+            self.compare(results, options['baseline'], options['tolerance'])
+
+    def make_client(self):
+        client = Client()
+        client.force_login(self.user)
+        return client
+
+    def measure(self, name, request, requests, concurrency=1):
+        latencies = []
+        queries = []
+        errors = []
+        remaining = [requests]
+        lock = threading.Lock()
+
+        def send(client):
+            try:
+                while True:
+                    with lock:
+                        if remaining[0] == 0 or errors:
+                            return
+                        remaining[0] -= 1
+                    # the query log is bounded, counts are wrong once it wraps around
+                    reset_queries()
+                    with QueryRecorder() as recorder:
+                        begin = time.perf_counter()
+                        self.check_response(name, request(client))
+                        latency = time.perf_counter() - begin
+                    if concurrency > 1:
+                        # as at the end of a served request, which the test client leaves out
+                        close_old_connections()
+                    with lock:
+                        latencies.append(latency)
+                        queries.append(recorder.count)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                if concurrency > 1:
+                    connections.close_all()
+
+        start = time.perf_counter()
+        if concurrency == 1:
+            send(self.client)
+        else:
+            threads = [threading.Thread(target=send, args=(self.make_client(),)) for i in range(concurrency)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        elapsed = time.perf_counter() - start
+        if errors:
+            raise errors[0]
+        return {
+            'requests': requests,
+            'concurrency': concurrency,
+            'p50_ms': percentile(latencies, 0.5) * 1000,
+            'p99_ms': percentile(latencies, 0.99) * 1000,
+            'mean_ms': sum(latencies) / requests * 1000,
+            'throughput': requests / elapsed,
+            'queries_per_request': sum(queries) / requests,
+        }
+
+    def check_response(self, name, response):
+        if response.status_code >= 400:
+            raise CommandError('{} answered {}: {}'.format(name, response.status_code, response.content[:500]))
+
+    def report(self, name, result):
+        self.stdout.write('{:<10} p50 {p50_ms:>8.2f} ms  p99 {p99_ms:>8.2f} ms  {throughput:>8.1f} req/s  '
+                          '{queries_per_request:>6.1f} queries/req'.format(name, **result))
+
+    def compare(self, results, path, tolerance):
+        with open(path) as f:
+            baseline = json.load(f)['results']
+        regressions = []
+        for name, result in results.items():
+            if name not in baseline:
+                continue
+            before, after = baseline[name], result
+            if after['p50_ms'] > before['p50_ms'] * (1 + tolerance):
+                regressions.append('{}: p50 {:.2f} ms -> {:.2f} ms'.format(name, before['p50_ms'], after['p50_ms']))
+            if after['queries_per_request'] > before['queries_per_request']:
+                regressions.append('{}: {:.1f} -> {:.1f} queries/req'.format(
+                    name, before['queries_per_request'], after['queries_per_request']))
+        for regression in regressions:
+            self.stderr.write('Regression ' + regression)
+        if regressions:
+            sys.exit(1)
+        self.stdout.write('No regressions against {}.'.format(path))
+
+    def request_validity(self, client):
+        return client.get('/license/api/agreements/%d/validity' % self.rnd.choice(self.agreement_ids))
+
+    def request_list(self, client):
+        return client.get('/license/api/agreements/')
+
+    def request_dashboard(self, client):
+        return client.get('/license/')
+
+    def request_pages(self, client):
+        return client.get(self.rnd.choice(PAGES))
+
+    def request_search(self, client):
+        return client.get('/license/api/agreements/', {'search': ' '.join(self.rnd.sample(WORDS, 2))})
+
+    def request_create(self, client):
+        # created agreements are Inactive so the other scenarios see the same active licenses
+        today = date.today()
+        return client.post('/license/api/agreements/', {
+            'effective_date': today.isoformat(),
+            'licensor': self.agreement.licensor.email,
+            'licensee': self.agreement.licensee.email,
+            'software': self.agreement.software.name,
+            'terms_and_conditions': 'Benchmark ' + ' '.join(self.rnd.sample(WORDS, 10)),
+            'expiry_date': (today + timedelta(days=365)).isoformat(),
+            'no_of_copies': 1,
+            'delivery_date': today.isoformat(),
+            'status': 'Inactive',
+        })
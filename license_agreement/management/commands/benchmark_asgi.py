@@ -0,0 +1,187 @@
+import asyncio
+import collections
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.authtoken.models import Token
+
+from license_agreement.management.commands.benchmark import percentile
+from license_agreement.models import *
+
+SERVERS = {
+    'wsgi': ['SoftwareLicensing.wsgi:application'],
+    'asgi': ['SoftwareLicensing.asgi:application'],
+}
+SCENARIOS = ('validity', 'bulk')
+# the gunicorn script, with the python running this command
+GUNICORN = 'from gunicorn.app.wsgiapp import run; run()'
+
+
+class Command(BaseCommand):
+    help = 'Load test the validity endpoints over http, served by gunicorn with sync workers and with uvicorn ' \
+           'workers through the ASGI application, the same number of worker processes each. Fill the database ' \
+           'with generate_data first.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('servers', nargs='*', metavar='server',
+                            help='One or more of %s, all by default.' % ', '.join(SERVERS))
+        parser.add_argument('--scenario', choices=SCENARIOS, default='validity',
+                            help='Single validity checks or bulk checks of --bulk-size agreements.')
+        parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Worker processes of each server.')
+        parser.add_argument('--asgi-worker', default='uvicorn.workers.UvicornWorker',
+                            help='Worker class of the ASGI server, uvicorn.workers.UvicornH11Worker runs without '
+                                 'uvloop and httptools.')
+        parser.add_argument('--connections', type=int, default=500, help='Concurrent client connections.')
+        parser.add_argument('--duration', type=float, default=10, help='Measured seconds per server.')
+        parser.add_argument('--warmup', type=float, default=2, help='Unmeasured seconds run first per server.')
+        parser.add_argument('--bulk-size', type=int, default=50)
+        parser.add_argument('--timeout', type=float, default=30, help='Seconds after which a request failed.')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='Write the results as JSON to this file.')
+
+    def handle(self, *args, **options):
+        unknown = set(options['servers']) - set(SERVERS)
+        if unknown:
+            raise CommandError('Unknown servers: {}.'.format(', '.join(sorted(unknown))))
+        self.options = options
+        self.rnd = random.Random(options['seed'])
+        self.agreement_ids = list(SoftwareLicenseAgreement.live.order_by('?').values_list('id', flat=True)[:1000])
+        if not self.agreement_ids:
+            raise CommandError('No agreements found, run generate_data first.')
+        user, created = User.objects.get_or_create(username='benchmark', defaults={'is_staff': True})
+        self.token, created = Token.objects.get_or_create(user=user)
+
+        self.stdout.write('{} over {} connections, {} workers per server'.format(
+            options['scenario'], options['connections'], options['workers']))
+        results = {}
+        for name in options['servers'] or SERVERS:
+            application = SERVERS[name]
+            if name == 'asgi':
+                application = application + ['--worker-class', options['asgi_worker']]
+            process = self.start(application)
+            try:
+                self.load(options['warmup'])
+                results[name] = self.load(options['duration'])
+            finally:
+                process.terminate()
+                process.wait()
+            self.report(name, results[name])
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump({'scenario': options['scenario'], 'workers': options['workers'],
+                           'connections': options['connections'], 'results': results}, f, indent=2)
+
+    def start(self, application):
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [settings.BASE_DIR,
+                                                                         os.environ.get('PYTHONPATH')])))
+        process = subprocess.Popen([sys.executable, '-c', GUNICORN] + application + [
+            '--workers', str(self.options['workers']), '--bind', '127.0.0.1:%d' % self.options['port'],
+            '--chdir', settings.BASE_DIR, '--log-level', 'warning'], env=env)
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise CommandError('{} exited with {}.'.format(' '.join(application), process.returncode))
+            try:
+                socket.create_connection(('127.0.0.1', self.options['port']), timeout=1).close()
+                return process
+            except OSError:
+                time.sleep(0.2)
+        process.terminate()
+        raise CommandError('{} did not start listening within 30 seconds.'.format(' '.join(application)))
+
+    def make_request(self):
+        headers = 'Host: 127.0.0.1\r\nAuthorization: Token {}\r\n'.format(self.token.key)
+        if self.options['scenario'] == 'bulk':
+            body = json.dumps({'ids': self.rnd.sample(self.agreement_ids,
+                                                      min(self.options['bulk_size'], len(self.agreement_ids)))})
+            return 'POST /license/api/agreements/validity HTTP/1.1\r\n{}Content-Type: application/json\r\n' \
+                   'Content-Length: {}\r\n\r\n{}'.format(headers, len(body), body).encode()
+        return 'GET /license/api/agreements/{}/validity HTTP/1.1\r\n{}\r\n'.format(
+            self.rnd.choice(self.agreement_ids), headers).encode()
+
+    def load(self, duration):
+        loop = asyncio.new_event_loop()
+        try:
+            return loop.run_until_complete(self.run_clients(loop, duration))
+        finally:
+            loop.close()
+
+    async def run_clients(self, loop, duration):
+        latencies = []
+        errors = collections.Counter()
+        deadline = loop.time() + duration
+
+        async def client():
+            reader = writer = None
+            while loop.time() < deadline:
+                begin = loop.time()
+                try:
+                    if writer is None:
+                        reader, writer = await asyncio.wait_for(
+                            asyncio.open_connection('127.0.0.1', self.options['port']), self.options['timeout'])
+                    writer.write(self.make_request())
+                    status, keep_alive = await asyncio.wait_for(read_response(reader), self.options['timeout'])
+                except (OSError, ValueError, asyncio.TimeoutError, asyncio.IncompleteReadError) as e:
+                    errors[type(e).__name__] += 1
+                    status, keep_alive = None, False
+                else:
+                    latencies.append(loop.time() - begin)
+                    if status != 200:
+                        errors[status] += 1
+                if not keep_alive and writer is not None:
+                    writer.close()
+                    writer = None
+            if writer is not None:
+                writer.close()
+
+        start = loop.time()
+        await asyncio.gather(*[client() for i in range(self.options['connections'])])
+        elapsed = loop.time() - start
+        if not latencies:
+            raise CommandError('No request was answered: {}'.format(dict(errors)))
+        return {
+            'requests': len(latencies),
+            'p50_ms': percentile(latencies, 0.5) * 1000,
+            'p99_ms': percentile(latencies, 0.99) * 1000,
+            'throughput': len(latencies) / elapsed,
+            'errors': {str(key): count for key, count in errors.items()},
+        }
+
+    def report(self, name, result):
+        self.stdout.write('{:<6} p50 {p50_ms:>8.2f} ms  p99 {p99_ms:>9.2f} ms  {throughput:>8.1f} req/s  '
+                          '{requests:>7} requests  errors {errors}'.format(name, **result))
+
+
+async def read_response(reader):
+    """
+    Status of an http response and whether the connection can be reused, the body is read and dropped.
+    """
+    head = (await reader.readuntil(b'\r\n\r\n')).decode('latin1').split('\r\n')
+    status = int(head[0].split()[1])
+    headers = {}
+    for line in head[1:]:
+        if ':' in line:
+            name, value = line.split(':', 1)
+            headers[name.strip().lower()] = value.strip().lower()
+    if 'content-length' in headers:
+        await reader.readexactly(int(headers['content-length']))
+    elif headers.get('transfer-encoding') == 'chunked':
+        while True:
+            size = int((await reader.readuntil(b'\r\n')).split(b';')[0], 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    else:
+        await reader.read()
+        return status, False
+    return status, headers.get('connection') != 'close'
@@ -0,0 +1,75 @@
+import ipaddress
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from license_agreement.ipallowlist import IPAllowlist, get_ip_allowlist, split_entries, allowlist_cache
+
+
+def naive_allows(text, address):
+    """
+    Parse and scan the allowlist on every check.
+    """
+    address = ipaddress.ip_address(address)
+    for entry in split_entries(text):
+        network = ipaddress.ip_network(entry, strict=False)
+        if network.version == address.version and address in network:
+            return True
+    return False
+
+
+class Command(BaseCommand):
+    help = 'Compare compiled and cached ip allowlist checks with parsing the allowlist on every check.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ranges', type=int, default=5000, help='Networks per allowlist.')
+        parser.add_argument('--agreements', type=int, default=10, help='Number of distinct allowlists.')
+        parser.add_argument('--lookups', type=int, default=10000, help='Number of checks to run.')
+        parser.add_argument('--naive-lookups', type=int, default=200, help='Number of uncompiled checks to run.')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def random_network(self, rnd):
+        if rnd.random() < 0.8:
+            prefix = rnd.randint(16, 32)
+            return str(ipaddress.ip_network((rnd.getrandbits(32), prefix), strict=False))
+        prefix = rnd.randint(48, 128)
+        return str(ipaddress.ip_network((rnd.getrandbits(128), prefix), strict=False))
+
+    def random_address(self, rnd):
+        if rnd.random() < 0.8:
+            return str(ipaddress.IPv4Address(rnd.getrandbits(32)))
+        return str(ipaddress.IPv6Address(rnd.getrandbits(128)))
+
+    def handle(self, *args, **options):
+        rnd = random.Random(options['seed'])
+        allowlists = {agreement_id: ', '.join(self.random_network(rnd) for i in range(options['ranges']))\
+                      for agreement_id in range(options['agreements'])}
+        checks = [(rnd.randrange(options['agreements']), self.random_address(rnd))\
+                  for i in range(options['lookups'])]
+
+        start = time.perf_counter()
+        compiled = IPAllowlist.parse(allowlists[0])
+        compile_time = time.perf_counter() - start
+
+        allowlist_cache.clear()
+        for agreement_id, text in allowlists.items():
+            get_ip_allowlist(agreement_id, text)
+        start = time.perf_counter()
+        allowed = [get_ip_allowlist(agreement_id, allowlists[agreement_id]).allows(address)\
+                   for agreement_id, address in checks]
+        cached_time = time.perf_counter() - start
+
+        naive_checks = checks[:options['naive_lookups']]
+        start = time.perf_counter()
+        naive_allowed = [naive_allows(allowlists[agreement_id], address) for agreement_id, address in naive_checks]
+        naive_time = time.perf_counter() - start
+        assert naive_allowed == allowed[:len(naive_checks)]
+
+        self.stdout.write('{} networks per allowlist, {} allowlists, {} intervals after merging'.format(
+            options['ranges'], options['agreements'], len(compiled)))
+        self.stdout.write('compile one allowlist {:>10.2f} ms'.format(compile_time * 1000))
+        self.stdout.write('compiled and cached   {:>10.2f} us/check over {} checks'.format(
+            cached_time / len(checks) * 1e6, len(checks)))
+        self.stdout.write('parse every check     {:>10.2f} us/check over {} checks'.format(
+            naive_time / len(naive_checks) * 1e6, len(naive_checks)))
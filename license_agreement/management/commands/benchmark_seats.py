@@ -0,0 +1,97 @@
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from license_agreement.management.commands.benchmark import percentile
+from license_agreement.models import *
+from license_agreement.seats import NoSeatAvailable, activate_seat
+
+
+class Command(BaseCommand):
+    help = 'Measure seat activation throughput while many installations activate seats of the same agreement at ' \
+           'once, and check that no more seats are leased than the agreement has. Runs against a copy of an ' \
+           'active agreement which is deleted afterwards, fill the database with generate_data first.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--installations', type=int, default=1000, help='Installations activating a seat.')
+        parser.add_argument('--seats', type=int, default=500, help='Number of copies of the agreement.')
+        parser.add_argument('--concurrency', type=int, default=50,
+                            help='Threads activating at the same time, each with its own database connection.')
+        parser.add_argument('--renewals', type=int, default=1,
+                            help='Activations per installation, the later ones renew the lease.')
+
+    def handle(self, *args, **options):
+        template = SoftwareLicenseAgreement.live.filter(status='Active').order_by('id').first()
+        if template is None:
+            raise CommandError('No active agreements found, run generate_data first.')
+        template.pk = None
+        template.no_of_copies = options['seats']
+        template.terms_and_conditions = 'Seat benchmark'
+        template.save()
+        try:
+            result = self.measure(template.id, options)
+            leased = SeatActivation.objects.filter(agreement_id=template.id).count()
+        finally:
+            SoftwareLicenseAgreement.objects.filter(id=template.id).hard_delete()
+
+        self.stdout.write('{} installations, {} seats, {} threads'.format(
+            options['installations'], options['seats'], options['concurrency']))
+        self.stdout.write('p50 {p50_ms:>8.2f} ms  p99 {p99_ms:>8.2f} ms  {throughput:>8.1f} activations/s  '
+                          '{granted} granted  {refused} refused'.format(**result))
+        expected = min(options['seats'], options['installations'])
+        if leased != expected or result['granted'] != expected:
+            raise CommandError('{} seats leased and {} granted, expected {}.'.format(leased, result['granted'],
+                                                                                     expected))
+        self.stdout.write('{} seats leased, none over the limit.'.format(leased))
+
+    def measure(self, agreement_id, options):
+        installations = ['benchmark-%d' % i for i in range(options['installations'])] * options['renewals']
+        latencies = []
+        granted = set()
+        refused = [0]
+        errors = []
+        lock = threading.Lock()
+        barrier = threading.Barrier(options['concurrency'])
+
+        def activate():
+            try:
+                barrier.wait()
+                while True:
+                    with lock:
+                        if not installations or errors:
+                            return
+                        installation_id = installations.pop()
+                    begin = time.perf_counter()
+                    try:
+                        activate_seat(agreement_id, installation_id)
+                    except NoSeatAvailable:
+                        with lock:
+                            refused[0] += 1
+                    else:
+                        with lock:
+                            granted.add(installation_id)
+                    with lock:
+                        latencies.append(time.perf_counter() - begin)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=activate) for i in range(options['concurrency'])]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        if errors:
+            raise errors[0]
+        return {
+            'p50_ms': percentile(latencies, 0.5) * 1000,
+            'p99_ms': percentile(latencies, 0.99) * 1000,
+            'throughput': len(latencies) / elapsed,
+            'granted': len(granted),
+            'refused': refused[0],
+        }
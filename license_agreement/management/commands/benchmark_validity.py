@@ -0,0 +1,52 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from license_agreement.cache import get_license_validity, load_license_validity, local_validity_cache,\
+    invalidate_license_validity
+from license_agreement.models import SoftwareLicenseAgreement
+
+
+class Command(BaseCommand):
+    help = 'Compare database round trips of uncached and cached license validity checks.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=10000, help='Number of validity checks to run.')
+        parser.add_argument('--agreements', type=int, default=100, help='Number of distinct agreements to check.')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def run(self, lookup, agreement_ids, requests):
+        rnd = random.Random(self.seed)
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            for i in range(requests):
+                lookup(rnd.choice(agreement_ids))
+            elapsed = time.perf_counter() - start
+        return len(queries), elapsed
+
+    def handle(self, *args, **options):
+        self.seed = options['seed']
+        agreement_ids = list(SoftwareLicenseAgreement.live\
+                             .values_list('id', flat=True)[:options['agreements']])
+        if not agreement_ids:
+            raise CommandError('No agreements found, create some agreements before running the benchmark.')
+
+        invalidate_license_validity(*agreement_ids)
+        results = [('uncached', self.run(load_license_validity, agreement_ids, options['requests'])),
+                   ('cached', self.run(get_license_validity, agreement_ids, options['requests']))]
+        local_validity_cache.clear()
+        results.append(('shared cache only', self.run(get_license_validity_without_local, agreement_ids,
+                                                      options['requests'])))
+
+        self.stdout.write('{} validity checks over {} agreements'.format(options['requests'], len(agreement_ids)))
+        for name, (queries, elapsed) in results:
+            self.stdout.write('{:<18} {:>8} queries {:>10.1f} ms {:>10.0f} checks/s'.format(
+                name, queries, elapsed * 1000, options['requests'] / elapsed))
+
+
+def get_license_validity_without_local(agreement_id):
+    local_validity_cache.clear()
+    return get_license_validity(agreement_id)
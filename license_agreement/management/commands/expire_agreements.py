@@ -0,0 +1,24 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from license_agreement.expiry import expire_agreements
+
+
+class Command(BaseCommand):
+    help = 'Flip active license agreements past their expiry date to Expired. Run it daily, e.g. from cron ' \
+           'shortly after midnight.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--today', help='Sweep as of this date, YYYY-MM-DD, today by default.')
+        parser.add_argument('--chunk-size', type=int, help='Agreements updated per transaction.')
+
+    def handle(self, *args, **options):
+        today = None
+        if options['today']:
+            try:
+                today = datetime.strptime(options['today'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError('--today must be a date in the YYYY-MM-DD format.')
+        expired = expire_agreements(today, options['chunk_size'])
+        self.stdout.write('{} license agreements expired.'.format(expired))
@@ -0,0 +1,130 @@
+import random
+import time
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+
+from license_agreement.counters import reconcile_counters
+from license_agreement.models import *
+from license_agreement.search import index_new_documents
+
+WORDS = ('license', 'software', 'support', 'maintenance', 'warranty', 'liability', 'termination', 'payment',
+         'annual', 'monthly', 'perpetual', 'subscription', 'update', 'upgrade', 'breach', 'notice', 'days',
+         'renewal', 'refund', 'copies', 'installation', 'server', 'desktop', 'cloud', 'confidential', 'source',
+         'indemnity', 'damages', 'invoice', 'agreement', 'party', 'rights', 'transfer', 'audit', 'usage')
+FIRST_NAMES = ('Aarav', 'Vivaan', 'Aditya', 'Diya', 'Ananya', 'Ishaan', 'Kavya', 'Rohan', 'Sara', 'John', 'Maria',
+               'Wei', 'Fatima', 'Liam', 'Emma', 'Noah', 'Olivia', 'Lucas', 'Mia', 'Arjun')
+LAST_NAMES = ('Sharma', 'Patel', 'Iyer', 'Khan', 'Gupta', 'Smith', 'Garcia', 'Chen', 'Kumar', 'Brown', 'Singh',
+              'Joshi', 'Nair', 'Rao', 'Mehta', 'Wilson', 'Lopez', 'Wang', 'Das', 'Reddy')
+CITIES = (('Pune', 'Maharashtra', 411001), ('Mumbai', 'Maharashtra', 400001), ('Bengaluru', 'Karnataka', 560001),
+          ('Chennai', 'Tamil Nadu', 600001), ('Hyderabad', 'Telangana', 500001), ('Delhi', 'Delhi', 110001))
+
+
+class Command(BaseCommand):
+    help = 'Fill the database with generated licensors, licensees, softwares and license agreements for ' \
+           'benchmarking. Rows are added to the existing data.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--agreements', type=int, default=100000)
+        parser.add_argument('--licensors', type=int, help='Defaults to one per 1000 agreements.')
+        parser.add_argument('--licensees', type=int, help='Defaults to one per 10 agreements.')
+        parser.add_argument('--softwares', type=int, help='Defaults to one per 5000 agreements.')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        self.rnd = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.today = date.today()
+        # keeps the unique emails, mobiles and names of repeated runs apart
+        self.run_tag = int(time.time()) % 100000
+        agreements = options['agreements']
+        start = time.perf_counter()
+
+        licensor_ids = self.create_parties(Licensor, options['licensors'] or max(1, agreements // 1000))
+        licensee_ids = self.create_parties(Licensee, options['licensees'] or max(1, agreements // 10))
+        software_ids = self.create_softwares(options['softwares'] or max(1, agreements // 5000))
+        self.create_agreements(agreements, licensor_ids, licensee_ids, software_ids)
+
+        self.stdout.write('Updating dashboard counters and search index...')
+        reconcile_counters()
+        index_new_documents(connection)
+        self.stdout.write('Done in {:.1f} s.'.format(time.perf_counter() - start))
+
+    def batches(self, total):
+        for offset in range(0, total, self.batch_size):
+            yield offset, min(self.batch_size, total - offset)
+
+    def bulk_create(self, model, objs):
+        """
+        bulk_create which sets the primary keys also on databases that do not return them.
+        """
+        with transaction.atomic():
+            objs = model.objects.bulk_create(objs)
+            if objs and objs[0].pk is None:
+                ids = reversed(model.objects.order_by('-pk').values_list('pk', flat=True)[:len(objs)])
+                for obj, pk in zip(objs, ids):
+                    obj.pk = pk
+        return [obj.pk for obj in objs]
+
+    def text(self, words):
+        return ' '.join(self.rnd.choice(WORDS) for i in range(words)).capitalize() + '.'
+
+    def create_parties(self, model, total):
+        ids = []
+        for offset, size in self.batches(total):
+            cities = [self.rnd.choice(CITIES) for i in range(size)]
+            address_ids = self.bulk_create(Address, [
+                Address(line1='%d %s Road' % (self.rnd.randint(1, 999), self.rnd.choice(LAST_NAMES)),
+                        city_or_village=city, state=state, country='India', zip_code=zip_code)
+                for city, state, zip_code in cities])
+            ids += self.bulk_create(model, [
+                model(first_name=self.rnd.choice(FIRST_NAMES), last_name=self.rnd.choice(LAST_NAMES),
+                      designation='Manager', organization_name='%s Pvt Ltd' % self.rnd.choice(LAST_NAMES),
+                      mobile='+9%05d%08d' % (self.run_tag, offset + i),
+                      email='%s.%d.%d@example.com' % (model.__name__.lower(), self.run_tag, offset + i),
+                      status='Active' if self.rnd.random() < 0.95 else 'Inactive', address_id=address_id)
+                for i, address_id in enumerate(address_ids)])
+            self.stdout.write('{} {} created.'.format(offset + size, model._meta.verbose_name_plural))
+        return ids
+
+    def create_softwares(self, total):
+        return self.bulk_create(Software, [
+            Software(name='Software %d-%d' % (self.run_tag, i), specification=self.text(30),
+                     user_guide_document='user_guide_docs/software-%d-%d.pdf' % (self.run_tag, i),
+                     indemnity=self.text(20))
+            for i in range(total)])
+
+    def create_agreements(self, total, licensor_ids, licensee_ids, software_ids):
+        now = timezone.now()
+        for offset, size in self.batches(total):
+            agreements = []
+            for i in range(size):
+                effective_date = self.today - timedelta(days=self.rnd.randint(0, 5 * 365))
+                status = self.rnd.choices(('Active', 'Inactive', 'Delete'), (90, 7, 3))[0]
+                agreements.append(SoftwareLicenseAgreement(
+                    effective_date=effective_date,
+                    licensor_id=self.rnd.choice(licensor_ids),
+                    licensee_id=self.rnd.choice(licensee_ids),
+                    software_id=self.rnd.choice(software_ids),
+                    valid_ip_addresses='10.%d.0.0/16, 192.168.%d.10' % (self.rnd.randint(0, 255),
+                                                                        self.rnd.randint(0, 255))\
+                        if self.rnd.random() < 0.3 else None,
+                    terms_and_conditions=self.text(60),
+                    limitation_of_liability=self.text(20),
+                    termination=self.text(15),
+                    expiry_date=effective_date + timedelta(days=self.rnd.choice((365, 730, 1095, 1825))),
+                    price=self.rnd.randint(10, 99999),
+                    payment_plan=self.text(10),
+                    no_of_copies=self.rnd.randint(1, 500),
+                    delivery_date=effective_date + timedelta(days=self.rnd.randint(0, 30)),
+                    warrenty_period=self.rnd.choice((None, 30, 90, 365)),
+                    maintenance_agreement=self.text(20),
+                    status=status,
+                    created_at=now - timedelta(seconds=self.rnd.randint(0, 5 * 365 * 86400)),
+                ))
+            with transaction.atomic():
+                SoftwareLicenseAgreement.objects.bulk_create(agreements)
+            self.stdout.write('{} license agreements created.'.format(offset + size))
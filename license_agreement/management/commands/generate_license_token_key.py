@@ -0,0 +1,22 @@
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Generate an RSA private key for signing license tokens.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File to write the PEM encoded private key to.')
+        parser.add_argument('--bits', type=int, default=2048)
+
+    def handle(self, *args, **options):
+        key = rsa.generate_private_key(public_exponent=65537, key_size=options['bits'], backend=default_backend())
+        pem = key.private_bytes(encoding=serialization.Encoding.PEM, format=serialization.PrivateFormat.PKCS8,
+                                encryption_algorithm=serialization.NoEncryption())
+        with open(options['path'], 'wb') as key_file:
+            key_file.write(pem)
+        self.stdout.write('Private key written to {}, add it to LICENSE_TOKEN_SIGNING_KEYS to publish it.'\
+                          .format(options['path']))
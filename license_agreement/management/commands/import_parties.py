@@ -0,0 +1,31 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from license_agreement.importer import ImportFileError, import_parties, FORMATS
+from license_agreement.models import Licensor, Licensee
+
+MODELS = {'licensors': Licensor, 'licensees': Licensee}
+
+
+class Command(BaseCommand):
+    help = 'Import licensors or licensees from a CSV or JSON lines file.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(MODELS))
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=FORMATS, help='Defaults to the file extension.')
+        parser.add_argument('--chunk-size', type=int)
+
+    def handle(self, *args, **options):
+        file_format = options['format'] or options['path'].rsplit('.', 1)[-1].lower()
+        if file_format not in FORMATS:
+            raise CommandError('Unknown file format, use --format.')
+        with open(options['path'], 'rb') as stream:
+            try:
+                result = import_parties(MODELS[options['kind']], stream, file_format, options['chunk_size'])
+            except ImportFileError as e:
+                raise CommandError('{} {} imported before.'.format(e, e.result.created))
+        for error in result.errors:
+            self.stderr.write('line {}: {}'.format(error['line'], json.dumps(error['errors'])))
+        self.stdout.write('{} imported, {} failed.'.format(result.created, result.failed))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from license_agreement.seats import reclaim_seats
+
+
+class Command(BaseCommand):
+    help = 'Delete the seats of license agreements whose lease has lapsed. Lapsed seats are free already, run it ' \
+           'daily, e.g. from cron, to keep the table small.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, help='Seats deleted per transaction.')
+
+    def handle(self, *args, **options):
+        reclaimed = reclaim_seats(options['chunk_size'])
+        self.stdout.write('{} lapsed seats reclaimed.'.format(reclaimed))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from license_agreement.counters import reconcile_counters
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the dashboard counters from the counted tables. Run it periodically, e.g. nightly from cron.'
+
+    def handle(self, *args, **options):
+        changed = reconcile_counters()
+        self.stdout.write('{} counters reconciled.'.format(changed))
@@ -0,0 +1,42 @@
+from django.db import models
+
+
+class SoftDeleteQuerySet(models.QuerySet):
+    """
+    QuerySet whose delete() soft deletes, setting the Delete status like the models' delete() does.
+    """
+    def bulk_set(self, reason='bulk update', **values):
+        """
+        Set based update which also does what save() does, see license_agreement.bulk.
+        """
+        from license_agreement.bulk import bulk_set
+        return bulk_set(self, reason=reason, **values)
+
+    def delete(self):
+        """
+        Returns the number of rows and the number per model, as QuerySet.delete() does.
+        """
+        deleted = self.bulk_set(reason='delete', status='Delete')
+        return deleted, {self.model._meta.label: deleted}
+    delete.queryset_only = True
+
+    def hard_delete(self):
+        """
+        Removes the rows from the database.
+        """
+        return super().delete()
+    hard_delete.queryset_only = True
+
+
+class LiveManager(models.Manager.from_queryset(SoftDeleteQuerySet)):
+    """
+    Manager of the objects which are not soft deleted.
+
+    Models keep a plain ``objects`` manager as their default manager so that
+    unique checks and related lookups still see deleted rows.
+    """
+    def get_queryset(self):
+        return super().get_queryset().exclude(status='Delete')
+
+
+SoftDeleteManager = models.Manager.from_queryset(SoftDeleteQuerySet)
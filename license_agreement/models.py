@@ -2,6 +2,34 @@ from django.db import models
 from django.conf import settings
 from django.utils import timezone
 from django.core.validators import RegexValidator
+from django.db import transaction
+
+from license_agreement.cache import invalidate_license_validity
+from license_agreement.ipallowlist import validate_ip_allowlist
+from license_agreement.managers import LiveManager, SoftDeleteManager
+
+
+class TrackedModel(models.Model):
+    """
+    Abstract model which remembers the values it was loaded from the database with
+    """
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def save(self, *args, **kwargs):
+        """
+        Save the instance and run its post_save handlers in one transaction
+        """
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
+        self._loaded_values = {field.attname: getattr(self, field.attname) for field in self._meta.concrete_fields\
+                               if field.attname in self.__dict__}
 
 
 class Address(models.Model):
@@ -19,7 +47,7 @@ class Address(models.Model):
         return '%s(%s, %s)' % (self.city_or_village, self.state, self.country)
 
 
-class Licensor(models.Model):
+class Licensor(TrackedModel):
     """
     Licensor model
     """
@@ -35,9 +63,17 @@ class Licensor(models.Model):
     email = models.EmailField('Email', blank=False, null=False, unique=True)
     status = models.CharField(max_length=10, choices=settings.STATUS_CHOICES, default='Active')
     created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = SoftDeleteManager()
+    live = LiveManager()
 
     class Meta:
         verbose_name = "Licensor"
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='licensor_created_idx'),
+            models.Index(fields=['status'], name='licensor_status_idx'),
+        ]
 
     def __str__(self):
         return '%s %s' % (self.first_name, self.last_name)
@@ -55,7 +91,7 @@ class Licensor(models.Model):
         self.save()
 
 
-class Licensee(models.Model):
+class Licensee(TrackedModel):
     """
     Licensee model
     """
@@ -71,9 +107,17 @@ class Licensee(models.Model):
     email = models.EmailField('Email', blank=False, null=False, unique=True)
     status = models.CharField(max_length=10, choices=settings.STATUS_CHOICES, default='Active')
     created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = SoftDeleteManager()
+    live = LiveManager()
 
     class Meta:
         verbose_name = "Licensee"
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='licensee_created_idx'),
+            models.Index(fields=['status'], name='licensee_status_idx'),
+        ]
 
     def __str__(self):
         return '%s %s' % (self.first_name, self.last_name)
@@ -91,7 +135,7 @@ class Licensee(models.Model):
         self.save()
 
 
-class Software(models.Model):
+class Software(TrackedModel):
     """
     Software model
     """
@@ -101,10 +145,18 @@ class Software(models.Model):
     indemnity = models.TextField(null=True, blank=True)   #copyright or patent information
     status = models.CharField(max_length=10, choices=settings.STATUS_CHOICES, default='Active')
     created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = SoftDeleteManager()
+    live = LiveManager()
 
     class Meta:
         verbose_name = "Software"
         verbose_name_plural = "Softwares"
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='software_created_idx'),
+            models.Index(fields=['status'], name='software_status_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -117,20 +169,22 @@ class Software(models.Model):
         self.save()
 
 
-class SoftwareLicenseAgreement(models.Model):
+class SoftwareLicenseAgreement(TrackedModel):
     """
     SoftwareLicenseAgreement model
     """
     effective_date = models.DateField('Start Date', blank=False, null=False)
     licensor = models.ForeignKey('Licensor', related_name='software_license_agreement', blank=False, null=False,\
-                                 on_delete=models.CASCADE)
+                                 on_delete=models.CASCADE, db_index=False)
     licensee = models.ForeignKey('Licensee', related_name='software_license_agreement', blank=False, null=False,\
-                                 on_delete=models.CASCADE)
+                                 on_delete=models.CASCADE, db_index=False)
     software = models.ForeignKey('Software', related_name='software_license_agreement', blank=False, null=False,\
                                  on_delete=models.CASCADE)
 
-    valid_ip_addresses = models.CharField('Valid IP Addresses', max_length=512, blank=True, null=True,\
-                                          help_text="Enter valid comma separated ip addresses.")
+    valid_ip_addresses = models.TextField('Valid IP Addresses', blank=True, null=True,\
+                                          validators=[validate_ip_allowlist],\
+                                          help_text="Enter valid comma separated ip addresses, networks "\
+                                                    "(10.0.0.0/8) or ranges (10.0.0.1-10.0.0.9).")
     terms_and_conditions = models.TextField('Terms And Conditions', null=False, blank=False)
     limitation_of_liability = models.TextField('Limitation Of Liability', null=True, blank=True)
     termination = models.TextField(null=True, blank=True)
@@ -144,17 +198,97 @@ class SoftwareLicenseAgreement(models.Model):
     maintenance_agreement = models.TextField('Maintenance Agreement', null=True, blank=True)
     status = models.CharField(max_length=10, choices=settings.STATUS_CHOICES, default='Active')
     created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = SoftDeleteManager()
+    live = LiveManager()
 
     class Meta:
         verbose_name = "Software License Agreement"
         verbose_name_plural = "Software License Agreements"
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='agreement_created_idx'),
+            models.Index(fields=['status', 'expiry_date'], name='agreement_status_expiry_idx'),
+            models.Index(fields=['licensee', 'software', 'status'], name='agreement_licensee_sw_idx'),
+            models.Index(fields=['licensor', 'status'], name='agreement_licensor_idx'),
+        ]
 
     def __str__(self):
         return 'Agreement between %s and %s for %s' % (self.licensor.full_name, self.licensee.full_name, self.software.name)
 
+    @property
+    def validity_state(self):
+        "Returns the fields which decide validity of the license."
+        return (self.status, self.expiry_date, self.valid_ip_addresses)
+
+    def save(self, *args, **kwargs):
+        """
+        Save SoftwareLicenseAgreement and drop its cached validity if it changed
+        """
+        loaded_values = getattr(self, '_loaded_values', {})
+        loaded_state = (loaded_values.get('status'), loaded_values.get('expiry_date'),
+                        loaded_values.get('valid_ip_addresses'))
+        super().save(*args, **kwargs)
+        if loaded_state != self.validity_state:
+            agreement_id = self.pk
+            transaction.on_commit(lambda: invalidate_license_validity(agreement_id))
+
     def delete(self):
         """
         Delete SoftwareLicenseAgreement
         """
         self.status = 'Delete'
         self.save()
+
+
+class SeatActivation(models.Model):
+    """
+    SeatActivation model, a seat of a license agreement held by an installation until its lease expires
+    """
+    agreement = models.ForeignKey('SoftwareLicenseAgreement', related_name='seat_activations',\
+                                  on_delete=models.CASCADE)
+    installation_id = models.CharField('Installation Id', max_length=128)
+    ip_address = models.GenericIPAddressField('IP Address', blank=True, null=True)
+    activated_at = models.DateTimeField(default=timezone.now)
+    lease_expires_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = ('agreement', 'installation_id')
+        indexes = [
+            models.Index(fields=['agreement', 'lease_expires_at'], name='seat_lease_idx'),
+            models.Index(fields=['lease_expires_at'], name='seat_lease_expiry_idx'),
+        ]
+
+    def __str__(self):
+        return '%s: %s' % (self.agreement_id, self.installation_id)
+
+
+class Counter(models.Model):
+    """
+    Counter model, maintained counts of live objects for the dashboard
+    """
+    key = models.CharField(max_length=64, unique=True)
+    day = models.DateField(blank=True, null=True)
+    value = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return '%s: %s' % (self.key, self.value)
+
+
+class AgreementStatusLog(models.Model):
+    """
+    AgreementStatusLog model, status changes of agreements made by bulk updates such as the expiry sweep
+    """
+    agreement = models.ForeignKey('SoftwareLicenseAgreement', related_name='status_logs', on_delete=models.CASCADE)
+    old_status = models.CharField(max_length=10, choices=settings.STATUS_CHOICES)
+    new_status = models.CharField(max_length=10, choices=settings.STATUS_CHOICES)
+    reason = models.CharField(max_length=64, blank=True, null=True)
+    changed_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['changed_at'], name='agreement_status_log_idx'),
+        ]
+
+    def __str__(self):
+        return '%s: %s -> %s' % (self.agreement_id, self.old_status, self.new_status)
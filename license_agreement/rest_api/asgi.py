@@ -0,0 +1,265 @@
+"""
+Async license validity endpoints for the ASGI entry point.
+
+Installed clients check their license with a token or basic credentials,
+many at once and mostly for agreements whose validity is cached.
+ValidityApplication answers GET agreements/<id>/validity and POST
+agreements/validity in the event loop, so a waiting client costs a
+coroutine instead of a whole worker. Django 2.0 has no async database
+access, the credential check and validity cache misses run on a pool of
+ASGI_THREADS threads, sized like the connection pool of the worker.
+Concurrent misses for the same agreement share a single load.
+
+Requests without an Authorization header, which includes browsers with a
+session, requests asking for another format than JSON and every other path
+are handed to the Django application.
+"""
+import asyncio
+import functools
+import io
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIRequest
+from django.db import close_old_connections
+from django.urls import Resolver404, resolve
+
+from rest_framework import exceptions
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from SoftwareLicensing.db_router import STICKY_COOKIE, pick_replica, state
+from license_agreement.cache import get_license_validity, local_validity_cache, validity_cache_key
+from license_agreement.ipallowlist import get_client_ip
+from license_agreement.rest_api.authentication import CachedBasicAuthentication, CachedTokenAuthentication
+from license_agreement.rest_api.serializer import BulkValidityCheckSerializer
+from license_agreement.rest_api.views import BulkCheckValidityOfLicense, CheckValidityOfLicense
+
+JSON_MEDIA_TYPES = ('application/json', 'application/*', '*/*')
+
+
+def get_path_info(scope):
+    root_path = scope.get('root_path', '')
+    path = scope['path']
+    return path[len(root_path):] if path.startswith(root_path) else path
+
+
+def build_environ(scope, body):
+    """
+    WSGI environ of an http scope, for a Django request.
+    """
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', ''),
+        'PATH_INFO': get_path_info(scope),
+        'QUERY_STRING': scope['query_string'].decode('ascii'),
+        'SERVER_PROTOCOL': 'HTTP/%s' % scope['http_version'],
+        'SERVER_NAME': scope.get('server', ('localhost', 80))[0],
+        'SERVER_PORT': str(scope.get('server', ('localhost', 80))[1]),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': io.BytesIO(),
+    }
+    if scope.get('client'):
+        environ['REMOTE_ADDR'] = scope['client'][0]
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin1').upper().replace('-', '_')
+        if name not in ('CONTENT_LENGTH', 'CONTENT_TYPE'):
+            name = 'HTTP_' + name
+        value = value.decode('latin1')
+        environ[name] = environ[name] + ',' + value if name in environ else value
+    return environ
+
+
+def run_with_connections(func, replica, *args):
+    """
+    Runs database work in a pool thread, with the connection handling and replica routing of a request.
+    """
+    close_old_connections()
+    state.replica = replica
+    state.wrote = False
+    try:
+        return func(*args)
+    finally:
+        state.replica = None
+        state.wrote = False
+        close_old_connections()
+
+
+def authenticate(request):
+    """
+    User authenticated by the token or basic credentials of a request, None when there are none.
+    """
+    user = Request(request, authenticators=[CachedTokenAuthentication(), CachedBasicAuthentication()]).user
+    return user if user.is_authenticated else None
+
+
+def check_many(request, data):
+    if authenticate(request) is None:
+        return None
+    serializer = BulkValidityCheckSerializer(data=data)
+    if not serializer.is_valid():
+        return 400, serializer.errors
+    return 200, BulkCheckValidityOfLicense().check(serializer.validated_data)
+
+
+def accepts_json(request):
+    if 'format' in request.GET:
+        return False
+    accept = request.META.get('HTTP_ACCEPT')
+    return not accept or any(media_type in accept for media_type in JSON_MEDIA_TYPES)
+
+
+class ValidityApplication(object):
+    """
+    ASGI application serving the validity endpoints and handing everything else to ``fallback``.
+    """
+    def __init__(self, fallback):
+        self.fallback = fallback
+        self.executor = ThreadPoolExecutor(max_workers=settings.ASGI_THREADS, thread_name_prefix='validity')
+        self.renderer = JSONRenderer()
+        self.loading = {}
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+            return
+        view_class, kwargs = self.resolve(scope)
+        if view_class is CheckValidityOfLicense and scope['method'] == 'GET':
+            await self.check_one(scope, receive, send, kwargs['id'])
+        elif view_class is BulkCheckValidityOfLicense and scope['method'] == 'POST':
+            await self.check_many(scope, receive, send)
+        else:
+            await self.fallback(scope, receive, send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.executor.shutdown(wait=True)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    def resolve(self, scope):
+        """
+        View class and url arguments of an http request.
+        """
+        if scope['type'] != 'http':
+            return None, {}
+        try:
+            match = resolve(get_path_info(scope))
+        except Resolver404:
+            return None, {}
+        return getattr(match.func, 'cls', None) or getattr(match.func, 'view_class', None), match.kwargs
+
+    async def run(self, func, *args, replica=None):
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(run_with_connections, func, replica, *args))
+
+    async def get_validity(self, agreement_id, replica):
+        """
+        Validity of an agreement from the local cache, or loaded in a pool thread once for all waiting requests.
+        """
+        data = local_validity_cache.get(validity_cache_key(agreement_id))
+        if data is not None:
+            return None if data.get('missing') else data
+        key = (agreement_id, replica)
+        future = self.loading.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self.run(get_license_validity, agreement_id, replica=replica))
+            self.loading[key] = future
+            future.add_done_callback(lambda done: self.loading.pop(key, None))
+        return await asyncio.shield(future)
+
+    async def check_one(self, scope, receive, send, agreement_id):
+        request = self.make_request(scope, b'')
+        if 'HTTP_AUTHORIZATION' not in request.META or not accepts_json(request):
+            await self.fallback(scope, receive, send)
+            return
+        try:
+            user = await self.run(authenticate, request)
+        except exceptions.APIException as exc:
+            await self.respond(send, exc.status_code, {'detail': exc.detail}, self.authenticate_header())
+            return
+        if user is None:
+            await self.fallback(scope, receive, send)
+            return
+
+        replica = None if STICKY_COOKIE in request.COOKIES else pick_replica()
+        validity = await self.get_validity(agreement_id, replica)
+        if validity is None:
+            await self.respond(send, 404, {'detail': 'Not found.'})
+            return
+        data = CheckValidityOfLicense().public_validity(agreement_id, validity, get_client_ip(request))
+        await self.respond(send, 200, data)
+
+    async def check_many(self, scope, receive, send):
+        body = await self.read_body(receive)
+        if body is None:
+            return
+        request = self.make_request(scope, body)
+        try:
+            data = json.loads(body.decode('utf-8'))
+        except ValueError:
+            data = None
+        if 'HTTP_AUTHORIZATION' not in request.META or not accepts_json(request) or\
+                request.content_type != 'application/json' or not isinstance(data, dict):
+            await self.fallback(scope, self.replay(body, receive), send)
+            return
+        try:
+            result = await self.run(check_many, request, data)
+        except exceptions.APIException as exc:
+            await self.respond(send, exc.status_code, {'detail': exc.detail}, self.authenticate_header())
+            return
+        if result is None:
+            await self.fallback(scope, self.replay(body, receive), send)
+            return
+        await self.respond(send, *result)
+
+    def make_request(self, scope, body):
+        return WSGIRequest(build_environ(scope, body))
+
+    def authenticate_header(self):
+        # as DRF, from the first authentication class
+        return [(b'www-authenticate', b'Token')]
+
+    async def read_body(self, receive):
+        """
+        The whole request body, None when the client disconnected first.
+        """
+        chunks = []
+        more_body = True
+        while more_body:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return None
+            chunks.append(message.get('body', b''))
+            more_body = message.get('more_body', False)
+        return b''.join(chunks)
+
+    def replay(self, body, receive):
+        """
+        receive callable handing an already read body to the fallback application.
+        """
+        replayed = False
+
+        async def replay_receive():
+            nonlocal replayed
+            if replayed:
+                return await receive()
+            replayed = True
+            return {'type': 'http.request', 'body': body, 'more_body': False}
+        return replay_receive
+
+    async def respond(self, send, status, data, headers=()):
+        body = self.renderer.render(data)
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode('ascii')),
+                        (b'vary', b'Accept')] + list(headers),
+        })
+        await send({'type': 'http.response.body', 'body': body})
@@ -0,0 +1,120 @@
+"""
+Cached authentication for the REST api.
+
+TokenAuthentication reads the token and its user from the database on every
+request and BasicAuthentication runs the password hasher, PBKDF2 by default,
+on every request. Machine clients authenticate on every validity check, so
+both resolutions are kept in the shared cache for AUTH_CACHE_TIMEOUT
+seconds.
+
+Basic credentials are cached under an HMAC of the username and password,
+never in the clear, and under a per user generation which is replaced when
+the user is saved, so a changed password or a deactivated user stops
+matching at once. Cached tokens are dropped when the token is deleted, by
+logout or by a password change, and when their user is saved. Clients
+should still exchange their credentials for a token at api/auth/token.
+"""
+import hashlib
+import hmac
+import uuid
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.db.models.signals import post_save, post_delete
+
+from rest_framework import exceptions
+from rest_framework.authentication import BasicAuthentication, TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+TOKEN_CACHE_KEY = 'auth_token:{}'
+BASIC_CACHE_KEY = 'auth_basic:{}:{}'
+GENERATION_CACHE_KEY = 'auth_generation:{}'
+
+
+def get_auth_cache():
+    return caches[settings.AUTH_CACHE_ALIAS]
+
+
+def token_cache_key(key):
+    return TOKEN_CACHE_KEY.format(hashlib.sha256(key.encode('utf-8')).hexdigest())
+
+
+def generation_cache_key(username):
+    return GENERATION_CACHE_KEY.format(hashlib.sha256(username.encode('utf-8')).hexdigest())
+
+
+def get_generation(username):
+    """
+    Current generation of the cached basic credentials of a user.
+    """
+    cache = get_auth_cache()
+    key = generation_cache_key(username)
+    generation = cache.get(key)
+    if generation is None:
+        generation = uuid.uuid4().hex
+        cache.add(key, generation, None)
+        generation = cache.get(key, generation)
+    return generation
+
+
+def basic_cache_key(username, password):
+    digest = hmac.new(settings.SECRET_KEY.encode('utf-8'), '{}:{}'.format(username, password).encode('utf-8'),
+                      hashlib.sha256).hexdigest()
+    return BASIC_CACHE_KEY.format(get_generation(username), digest)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication resolving a token to its user from the cache.
+    """
+    def authenticate_credentials(self, key):
+        cache = get_auth_cache()
+        cache_key = token_cache_key(key)
+        cached = cache.get(cache_key)
+        if cached is None:
+            cached = super().authenticate_credentials(key)
+            cache.set(cache_key, cached, settings.AUTH_CACHE_TIMEOUT)
+        return cached
+
+
+class CachedBasicAuthentication(BasicAuthentication):
+    """
+    BasicAuthentication checking repeated credentials against the cache instead of the password hasher.
+    """
+    def authenticate_credentials(self, userid, password, request=None):
+        cache = get_auth_cache()
+        cache_key = basic_cache_key(userid, password)
+        cached = cache.get(cache_key)
+        if cached is None:
+            cached = super().authenticate_credentials(userid, password, request)
+            cache.set(cache_key, cached, settings.AUTH_CACHE_TIMEOUT)
+        if not cached[0].is_active:
+            raise exceptions.AuthenticationFailed('User inactive or deleted.')
+        return cached
+
+
+def invalidate_user_credentials(user):
+    """
+    Drops the cached tokens and basic credentials of a user.
+    """
+    cache = get_auth_cache()
+    cache.set(generation_cache_key(user.get_username()), uuid.uuid4().hex, None)
+    cache.delete_many([token_cache_key(key) for key in Token.objects.filter(user=user).values_list('key', flat=True)])
+
+
+def user_saved(sender, instance, created, raw=False, **kwargs):
+    if created or raw:
+        return
+    if instance._password is not None:
+        # a new password revokes the tokens issued with the old one
+        Token.objects.filter(user=instance).delete()
+    invalidate_user_credentials(instance)
+
+
+def token_deleted(sender, instance, **kwargs):
+    get_auth_cache().delete(token_cache_key(instance.key))
+
+
+post_save.connect(user_saved, sender=User, dispatch_uid='auth_cache_user_saved')
+post_delete.connect(token_deleted, sender=Token, dispatch_uid='auth_cache_token_deleted')
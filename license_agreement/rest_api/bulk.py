@@ -0,0 +1,58 @@
+"""
+Bulk update and bulk soft delete for the REST api viewsets.
+
+PATCH and DELETE on <list url>/bulk/ act on the rows selected by the
+viewset filters given as query parameters, e.g. ?licensor=3&status=Active,
+and/or by the ``ids`` of the body. Each request is one transaction of set
+based UPDATEs through queryset.bulk_set(), so its cost does not grow with
+a query or a save() per row.
+"""
+from rest_framework import serializers, status
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+
+class BulkSelectionSerializer(serializers.Serializer):
+    """
+    Bulk Selection Serializer
+    """
+    ids = serializers.ListField(child=serializers.IntegerField(min_value=1), required=False, default=list)
+
+
+class BulkUpdateMixin(object):
+    """
+    ModelViewSet mixin adding PATCH and DELETE <list url>/bulk/.
+
+    PATCH sets the ``bulk_update_fields`` given in the body, validated by the
+    viewset serializer, and DELETE sets the Delete status. Requests without a
+    filter or ids are refused, they would change every row.
+    """
+    bulk_update_fields = ('status',)
+
+    @action(detail=False, methods=['patch', 'delete'], url_path='bulk')
+    def bulk(self, request):
+        selection = BulkSelectionSerializer(data=request.data)
+        selection.is_valid(raise_exception=True)
+        ids = selection.validated_data['ids']
+        filter_params = set(getattr(self, 'filter_fields', ())) | {api_settings.SEARCH_PARAM}
+        if not ids and not filter_params.intersection(request.query_params):
+            return Response({'detail': 'Provide ids or filters selecting the rows.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        if ids:
+            queryset = queryset.filter(id__in=ids)
+        if request.method == 'DELETE':
+            deleted, by_model = queryset.delete()
+            return Response({'deleted': deleted})
+
+        values = {key: value for key, value in request.data.items() if key != 'ids'}
+        if not values:
+            return Response({'detail': 'Provide the values to set.'}, status=status.HTTP_400_BAD_REQUEST)
+        errors = {key: ['This field can not be bulk updated.'] for key in values if key not in self.bulk_update_fields}
+        if errors:
+            return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+        serializer = self.get_serializer(data=values, partial=True)
+        serializer.is_valid(raise_exception=True)
+        return Response({'updated': queryset.bulk_set(**serializer.validated_data)})
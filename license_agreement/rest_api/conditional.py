@@ -0,0 +1,147 @@
+"""
+Conditional requests for the REST api viewsets.
+
+ETag and Last-Modified are derived from the updated_at columns named by
+``etag_fields`` instead of from the rendered body. A detail GET reads only
+those columns before deciding on a 304, a list GET computes them from the
+page it fetched, so unchanged resources are never serialized. Updates and
+deletes honour If-Match and If-Unmodified-Since with the row locked, so a
+client editing a stale copy gets a 412 instead of overwriting a newer edit.
+"""
+import hashlib
+from datetime import datetime
+
+from django.db import transaction
+from django.http import Http404
+from django.utils.http import http_date, parse_etags, parse_http_date_safe, quote_etag
+
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.response import Response
+
+
+class PreconditionFailed(APIException):
+    status_code = status.HTTP_412_PRECONDITION_FAILED
+    default_detail = 'The resource has been modified.'
+    default_code = 'precondition_failed'
+
+
+class ConditionalMixin(object):
+    """
+    ModelViewSet mixin adding ETag and Last-Modified to retrieve, list, update and destroy.
+
+    ``etag_fields`` are the version columns of the representation, related
+    objects shown in it are included with their own updated_at.
+    """
+    etag_fields = ('updated_at',)
+
+    def get_version(self, rows):
+        """
+        Returns the ETag and last modification time of a representation built from the given version values.
+        """
+        digest = hashlib.md5(self.request.accepted_renderer.format.encode('utf-8'))
+        last_modified = None
+        for row in rows:
+            digest.update(repr(row).encode('utf-8'))
+            for value in row:
+                if isinstance(value, datetime) and (last_modified is None or value > last_modified):
+                    last_modified = value
+        return quote_etag(digest.hexdigest()), last_modified
+
+    def get_object_version(self, lock=False):
+        """
+        Version of the requested object, read from its version columns only.
+        """
+        queryset = self.filter_queryset(self.get_queryset())
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        queryset = queryset.filter(**{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        if lock:
+            queryset = queryset.select_for_update(of=('self',))
+        rows = list(queryset.values_list('pk', *self.etag_fields)[:1])
+        if not rows:
+            raise Http404
+        return self.get_version(rows)
+
+    def get_instance_version(self, obj):
+        """
+        Version values of a listed object, a model instance or a values() row.
+        """
+        if isinstance(obj, dict):
+            return tuple([obj['id']] + [obj[field] for field in self.etag_fields])
+        values = [obj.pk]
+        for field in self.etag_fields:
+            value = obj
+            for attr in field.split('__'):
+                value = getattr(value, attr)
+            values.append(value)
+        return tuple(values)
+
+    def get_list_queryset(self):
+        return self.filter_queryset(self.get_queryset())
+
+    def serialize_list(self, objects):
+        return self.get_serializer(objects, many=True).data
+
+    def is_not_modified(self, request, etag, last_modified):
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+        if if_none_match:
+            etags = parse_etags(if_none_match)
+            return '*' in etags or etag in etags
+        if_modified_since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+        return bool(if_modified_since and last_modified and int(last_modified.timestamp()) <= if_modified_since)
+
+    def check_preconditions(self, request, etag, last_modified):
+        if_match = request.META.get('HTTP_IF_MATCH')
+        if if_match:
+            etags = parse_etags(if_match)
+            if '*' not in etags and etag not in etags:
+                raise PreconditionFailed()
+            return
+        if_unmodified_since = parse_http_date_safe(request.META.get('HTTP_IF_UNMODIFIED_SINCE', ''))
+        if if_unmodified_since and last_modified and int(last_modified.timestamp()) > if_unmodified_since:
+            raise PreconditionFailed()
+
+    def set_version_headers(self, response, etag, last_modified):
+        response['ETag'] = etag
+        if last_modified:
+            response['Last-Modified'] = http_date(last_modified.timestamp())
+        return response
+
+    def retrieve(self, request, *args, **kwargs):
+        etag, last_modified = self.get_object_version()
+        if self.is_not_modified(request, etag, last_modified):
+            return self.set_version_headers(Response(status=status.HTTP_304_NOT_MODIFIED), etag, last_modified)
+        return self.set_version_headers(super().retrieve(request, *args, **kwargs), etag, last_modified)
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.get_list_queryset()
+        page = self.paginate_queryset(queryset)
+        objects = page if page is not None else list(queryset)
+        rows = [self.get_instance_version(obj) for obj in objects]
+        if page is not None:
+            rows.append((self.paginator.get_next_link(), self.paginator.get_previous_link()))
+        etag, last_modified = self.get_version(rows)
+        if self.is_not_modified(request, etag, last_modified):
+            return self.set_version_headers(Response(status=status.HTTP_304_NOT_MODIFIED), etag, last_modified)
+
+        data = self.serialize_list(objects)
+        if page is not None:
+            response = self.get_paginated_response(data)
+        else:
+            response = Response(data)
+        return self.set_version_headers(response, etag, last_modified)
+
+    def update(self, request, *args, **kwargs):
+        with transaction.atomic():
+            self.check_preconditions(request, *self.get_object_version(lock=True))
+            response = super().update(request, *args, **kwargs)
+        try:
+            return self.set_version_headers(response, *self.get_object_version())
+        except Http404:
+            # updated out of the queryset, e.g. to the Delete status
+            return response
+
+    def destroy(self, request, *args, **kwargs):
+        with transaction.atomic():
+            self.check_preconditions(request, *self.get_object_version(lock=True))
+            return super().destroy(request, *args, **kwargs)
@@ -0,0 +1,157 @@
+"""
+Eager loading and values() list path for the REST api viewsets.
+
+The related objects a serializer reads, nested serializers and related
+fields, are found by inspecting its fields, and the viewset queryset selects
+or prefetches them, so a serializer change can not bring back an N+1.
+
+Lists of simple serializers, model fields, slug and primary key related
+fields and nested serializers of the same, can also be built from .values()
+rows. Every value still goes through the field's to_representation, so the
+response is the same as the one built from model instances, byte for byte.
+"""
+from collections import OrderedDict
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import FileField
+
+from rest_framework import serializers
+from rest_framework.relations import ManyRelatedField, PrimaryKeyRelatedField, SlugRelatedField
+
+
+def get_related_paths(serializer, prefix=''):
+    """
+    Returns the select_related and prefetch_related lookups a serializer needs.
+    """
+    select, prefetch = [], []
+    for field in serializer.fields.values():
+        if field.write_only or field.source == '*':
+            continue
+        path = prefix + '__'.join(field.source_attrs)
+        if isinstance(field, (serializers.ListSerializer, ManyRelatedField)):
+            prefetch.append(path)
+        elif isinstance(field, serializers.BaseSerializer):
+            select.append(path)
+            nested_select, nested_prefetch = get_related_paths(field, path + '__')
+            select += nested_select
+            prefetch += nested_prefetch
+        elif isinstance(field, serializers.RelatedField) and not isinstance(field, PrimaryKeyRelatedField):
+            select.append(path)
+    return select, prefetch
+
+
+class UnsupportedField(Exception):
+    pass
+
+
+# Fields which read something else than the model field value
+UNSUPPORTED_FIELDS = (serializers.SerializerMethodField, serializers.HiddenField, serializers.ReadOnlyField,
+                      serializers.ModelField)
+
+
+class ValuesRepresentation(object):
+    """
+    Builds the representation of a ModelSerializer from .values() rows.
+    Raises UnsupportedField for serializers which need model instances.
+    """
+    def __init__(self, serializer, prefix=''):
+        model = serializer.Meta.model
+        self.paths = []
+        # (name, values() key, to_representation of the value or None to use it as it is, nested representation)
+        self.fields = []
+        for field in serializer.fields.values():
+            if field.write_only:
+                continue
+            if len(field.source_attrs) != 1:
+                raise UnsupportedField(field.field_name)
+            try:
+                model_field = model._meta.get_field(field.source_attrs[0])
+            except FieldDoesNotExist:
+                raise UnsupportedField(field.field_name)
+            path = prefix + field.source_attrs[0]
+
+            if isinstance(field, serializers.ModelSerializer) and model_field.many_to_one:
+                nested = ValuesRepresentation(field, path + '__')
+                self.paths += [path] + nested.paths
+                self.fields.append((field.field_name, path, None, nested))
+            elif isinstance(field, SlugRelatedField) and model_field.many_to_one and '__' not in field.slug_field:
+                self.paths.append(path + '__' + field.slug_field)
+                self.fields.append((field.field_name, path + '__' + field.slug_field, None, None))
+            elif isinstance(field, PrimaryKeyRelatedField) and model_field.many_to_one and field.pk_field is None:
+                self.paths.append(path)
+                self.fields.append((field.field_name, path, None, None))
+            elif model_field.concrete and not model_field.is_relation and not isinstance(model_field, FileField)\
+                    and not isinstance(field, (serializers.BaseSerializer, serializers.RelatedField,
+                                               ManyRelatedField) + UNSUPPORTED_FIELDS):
+                self.paths.append(path)
+                self.fields.append((field.field_name, path, field.to_representation, None))
+            else:
+                raise UnsupportedField(field.field_name)
+
+    def to_representation(self, row):
+        ret = OrderedDict()
+        for name, path, to_representation, nested in self.fields:
+            value = row[path]
+            if value is None:
+                ret[name] = None
+            elif nested is not None:
+                ret[name] = nested.to_representation(row)
+            elif to_representation is not None:
+                ret[name] = to_representation(value)
+            else:
+                ret[name] = value
+        return ret
+
+
+related_paths_cache = {}
+values_representation_cache = {}
+
+
+class EagerLoadingMixin(object):
+    """
+    ModelViewSet mixin selecting and prefetching what the serializer reads.
+
+    With ``fast_list`` set, lists are built from .values() rows when the
+    serializer supports it. The list itself is served by ConditionalMixin.
+    """
+    fast_list = False
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        serializer_class = self.get_serializer_class()
+        if serializer_class not in related_paths_cache:
+            related_paths_cache[serializer_class] = get_related_paths(self.get_serializer())
+        select, prefetch = related_paths_cache[serializer_class]
+        if select:
+            queryset = queryset.select_related(*select)
+        if prefetch:
+            queryset = queryset.prefetch_related(*prefetch)
+        return queryset
+
+    def get_values_representation(self):
+        if not self.fast_list:
+            return None
+        serializer_class = self.get_serializer_class()
+        if serializer_class not in values_representation_cache:
+            try:
+                values_representation_cache[serializer_class] = ValuesRepresentation(self.get_serializer())
+            except UnsupportedField:
+                values_representation_cache[serializer_class] = None
+        return values_representation_cache[serializer_class]
+
+    def get_list_queryset(self):
+        queryset = super().get_list_queryset()
+        representation = self.get_values_representation()
+        if representation is None:
+            return queryset
+        # the values the pagination and the ETag read, besides the serialized ones
+        extra = list(getattr(self, 'etag_fields', ())) + list(queryset.query.annotations) +\
+            [field.lstrip('-') for field in queryset.query.order_by if isinstance(field, str)]
+        paths = representation.paths + [path for path in extra if path not in representation.paths]
+        return queryset.values(*OrderedDict.fromkeys(paths))
+
+    def serialize_list(self, objects):
+        representation = self.get_values_representation()
+        if representation is None:
+            return super().serialize_list(objects)
+        return [representation.to_representation(row) for row in objects]
@@ -0,0 +1,203 @@
+"""
+Keyset (cursor) pagination for the REST api.
+
+Pages are selected with a WHERE clause on the values of the last row of the
+previous page instead of an OFFSET, so fetching a deep page costs the same as
+fetching the first one.
+"""
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+from datetime import date, datetime
+from decimal import Decimal
+
+import coreapi
+import coreschema
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import F, Q
+from django.utils.encoding import force_text
+
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+def encode_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+class KeysetPagination(BasePagination):
+    """
+    Paginates on the requested ordering followed by ``cursor_ordering`` of the
+    view, (-created_at, -id) by default, which makes every position unique.
+    """
+    cursor_query_param = 'cursor'
+    cursor_query_description = 'The pagination cursor value.'
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'page_size'
+    page_size_query_description = 'Number of results to return per page.'
+    max_page_size = 1000
+    ordering = ('-created_at', '-id')
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.base_url = request.build_absolute_uri()
+        self.model = queryset.model
+        self.ordering = self.get_ordering(queryset, view)
+
+        cursor = self.decode_cursor(request)
+        reverse = bool(cursor and cursor['r'])
+        queryset = queryset.order_by(*self.get_order_by(reverse))
+        if cursor:
+            try:
+                queryset = queryset.filter(self.get_position_filter(cursor['v'], reverse))
+            except (TypeError, ValueError, ValidationError):
+                # values of a tampered cursor which do not fit their fields
+                raise NotFound(self.invalid_cursor_message)
+
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if reverse:
+            results.reverse()
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, cursor is not None
+
+        self.next_position = self.get_position(results[-1]) if has_next and results else None
+        self.previous_position = self.get_position(results[0]) if has_previous and results else None
+        if reverse and not results:
+            self.next_position = None
+        return results
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+            if page_size > 0:
+                return min(page_size, self.max_page_size)
+        except (KeyError, ValueError):
+            pass
+        return self.page_size
+
+    def get_ordering(self, queryset, view):
+        """
+        Requested ordering of the queryset, completed with the view's cursor ordering.
+        """
+        ordering = [force_text(field) for field in queryset.query.order_by]
+        fields = {field.lstrip('-') for field in ordering}
+        for field in getattr(view, 'cursor_ordering', self.ordering):
+            if field.lstrip('-') not in fields:
+                ordering.append(field)
+        return ordering
+
+    def is_nullable(self, name):
+        try:
+            return self.model._meta.get_field(name).null
+        except FieldDoesNotExist:
+            return False
+
+    def get_order_by(self, reverse):
+        """
+        Null values sort last in the forward direction on every database.
+        """
+        order_by = []
+        for field in self.ordering:
+            descending = field.startswith('-') != reverse
+            name = field.lstrip('-')
+            if self.is_nullable(name):
+                expression = F(name).desc if descending else F(name).asc
+                order_by.append(expression(nulls_last=not reverse, nulls_first=reverse))
+            else:
+                order_by.append(('-' if descending else '') + name)
+        return order_by
+
+    def get_position(self, obj):
+        position = []
+        for field in self.ordering:
+            value = obj
+            for attr in field.lstrip('-').split('__'):
+                value = value[attr] if isinstance(value, dict) else getattr(value, attr)
+            position.append(encode_value(value))
+        return position
+
+    def get_position_filter(self, position, reverse):
+        """
+        Rows after (or before, when reverse) the position in the forward ordering.
+        """
+        query = Q(pk__in=[])
+        equal = Q()
+        for field, value in zip(self.ordering, position):
+            name = field.lstrip('-')
+            nullable = self.is_nullable(name)
+            lookup = 'lt' if field.startswith('-') != reverse else 'gt'
+            if value is None:
+                beyond = Q(**{'%s__isnull' % name: False}) if reverse else Q(pk__in=[])
+                query |= equal & beyond
+                equal &= Q(**{'%s__isnull' % name: True})
+            else:
+                beyond = Q(**{'%s__%s' % (name, lookup): value})
+                if nullable and not reverse:
+                    beyond |= Q(**{'%s__isnull' % name: True})
+                query |= equal & beyond
+                equal &= Q(**{name: value})
+        return query
+
+    def encode_cursor(self, position, reverse):
+        cursor = json.dumps({'o': self.ordering, 'v': position, 'r': int(reverse)}, separators=(',', ':'))
+        return replace_query_param(self.base_url, self.cursor_query_param,
+                                   urlsafe_b64encode(cursor.encode('utf-8')).decode('ascii'))
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            cursor = json.loads(urlsafe_b64decode(encoded.encode('ascii')).decode('utf-8'))
+            if cursor['o'] != self.ordering or len(cursor['v']) != len(self.ordering) or cursor['r'] not in (0, 1):
+                raise ValueError
+            if not all(value is None or isinstance(value, (str, int, float)) for value in cursor['v']):
+                raise ValueError
+            return cursor
+        except (TypeError, ValueError, KeyError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        return self.encode_cursor(self.next_position, False)
+
+    def get_previous_link(self):
+        if self.previous_position is None:
+            return None
+        return self.encode_cursor(self.previous_position, True)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data)
+        ]))
+
+    def get_schema_fields(self, view):
+        return [
+            coreapi.Field(
+                name=self.cursor_query_param,
+                required=False,
+                location='query',
+                schema=coreschema.String(description=force_text(self.cursor_query_description))
+            ),
+            coreapi.Field(
+                name=self.page_size_query_param,
+                required=False,
+                location='query',
+                schema=coreschema.Integer(description=force_text(self.page_size_query_description))
+            )
+        ]
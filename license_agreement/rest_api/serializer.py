@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.contrib.auth.models import User
 from django.db import transaction
 
@@ -50,8 +51,8 @@ class LicensorSerializer(serializers.ModelSerializer):
     class Meta:
         model = Licensor
         fields = ('id', 'first_name', 'last_name', 'designation', 'organization_name', 'mobile', 'email', 'status',\
-                  'address', 'created_at')
-        read_only_fields = ('id', 'created_at',)
+                  'address', 'created_at', 'updated_at')
+        read_only_fields = ('id', 'created_at', 'updated_at',)
 
     @transaction.atomic
     def create(self, validated_data):
@@ -90,10 +91,10 @@ class LicenseeSerializer(serializers.ModelSerializer):
     address = AddressSerializer()
 
     class Meta:
-        model = Licensor
+        model = Licensee
         fields = ('id', 'first_name', 'last_name', 'designation', 'organization_name', 'mobile', 'email', 'status',\
-                  'address', 'created_at')
-        read_only_fields = ('id', 'created_at',)
+                  'address', 'created_at', 'updated_at')
+        read_only_fields = ('id', 'created_at', 'updated_at',)
 
     @transaction.atomic
     def create(self, validated_data):
@@ -132,21 +133,52 @@ class SoftwareSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Software
-        fields = ('id', 'name', 'specification', 'user_guide_document', 'indemnity', 'status', 'created_at')
-        read_only_fields = ('id', 'created_at',)
+        fields = ('id', 'name', 'specification', 'user_guide_document', 'indemnity', 'status', 'created_at', 'updated_at')
+        read_only_fields = ('id', 'created_at', 'updated_at',)
 
 
 class SoftwareLicenseAgreementSerializer(serializers.ModelSerializer):
     """
     SoftwareLicenseAgreement Serializer
     """
-    licensor = serializers.SlugRelatedField(slug_field='email', queryset=Licensor.objects.exclude(status='Delete'))
-    licensee = serializers.SlugRelatedField(slug_field='email', queryset=Licensee.objects.exclude(status='Delete'))
-    software = serializers.SlugRelatedField(slug_field='name', queryset=Software.objects.exclude(status='Delete'))
+    licensor = serializers.SlugRelatedField(slug_field='email', queryset=Licensor.live.all())
+    licensee = serializers.SlugRelatedField(slug_field='email', queryset=Licensee.live.all())
+    software = serializers.SlugRelatedField(slug_field='name', queryset=Software.live.all())
 
     class Meta:
         model = SoftwareLicenseAgreement
         fields = ('id', 'effective_date', 'licensor', 'licensee', 'software', 'valid_ip_addresses','terms_and_conditions',\
                   'limitation_of_liability', 'termination', 'expiry_date', 'price', 'payment_plan', 'no_of_copies',\
-                  'delivery_date', 'warrenty_period', 'maintenance_agreement', 'status', 'created_at')
-        read_only_fields = ('id', 'created_at',)
+                  'delivery_date', 'warrenty_period', 'maintenance_agreement', 'status', 'created_at', 'updated_at')
+        read_only_fields = ('id', 'created_at', 'updated_at',)
+
+
+class LicensePairSerializer(serializers.Serializer):
+    """
+    Licensee email and software name identifying a license
+    """
+    licensee = serializers.EmailField()
+    software = serializers.CharField(max_length=128)
+
+
+class BulkValidityCheckSerializer(serializers.Serializer):
+    """
+    Bulk Validity Check Serializer
+    """
+    ids = serializers.ListField(child=serializers.IntegerField(min_value=1), required=False, default=list)
+    licenses = LicensePairSerializer(many=True, required=False, default=list)
+
+    def validate(self, data):
+        if not data['ids'] and not data['licenses']:
+            raise serializers.ValidationError('Provide agreement ids or licensee and software pairs.')
+        if len(data['ids']) + len(data['licenses']) > settings.BULK_VALIDITY_MAX_ITEMS:
+            raise serializers.ValidationError('At most {} licenses can be checked at once.'\
+                                              .format(settings.BULK_VALIDITY_MAX_ITEMS))
+        return data
+
+
+class SeatActivationSerializer(serializers.Serializer):
+    """
+    Seat Activation Serializer
+    """
+    installation_id = serializers.CharField(max_length=128)
@@ -16,4 +16,11 @@ router.register(r'agreements', SoftwareLicenseAgreementViewSet)
 urlpatterns = [
     path('', include(router.urls)),
     path('agreements/<int:id>/validity', CheckValidityOfLicense.as_view()),
+    path('agreements/validity', BulkCheckValidityOfLicense.as_view()),
+    path('agreements/<int:id>/token', IssueLicenseToken.as_view()),
+    path('agreements/<int:id>/seats', ActivateSeat.as_view()),
+    path('agreements/<int:id>/seats/<str:installation_id>', DeactivateSeat.as_view()),
+    path('keys', LicenseTokenKeySet.as_view()),
+    path('auth/token', ObtainAuthToken.as_view()),
+    path('auth/logout', RevokeAuthToken.as_view()),
     ]
@@ -1,14 +1,28 @@
-from datetime import datetime as dt
 from django.contrib.auth.models import User
+from django.db.models import Q
+from django.http import Http404
 from django_filters.rest_framework import DjangoFilterBackend
 
-from rest_framework import viewsets, filters
+from rest_framework import viewsets, filters, status
+from rest_framework.authtoken import views as authtoken_views
+from rest_framework.authtoken.models import Token
+from rest_framework.decorators import action
 from rest_framework.parsers import FormParser, MultiPartParser
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAuthenticated, AllowAny
 
+from license_agreement.cache import get_license_validity, get_license_validities, build_license_validity
+from license_agreement.export import export_agreements, EXPORT_FORMATS
+from license_agreement.importer import ImportFileError, import_parties, FORMATS
+from license_agreement.ipallowlist import get_ip_allowlist, get_client_ip
 from license_agreement.models import *
+from license_agreement.search import FullTextSearchFilter
+from license_agreement.seats import LicenseNotValid, NoSeatAvailable, activate_seat, deactivate_seat
+from license_agreement.tokens import SigningKeysNotConfigured, issue_license_token, get_public_key_set
+from license_agreement.rest_api.bulk import BulkUpdateMixin
+from license_agreement.rest_api.conditional import ConditionalMixin
+from license_agreement.rest_api.eager import EagerLoadingMixin
 from license_agreement.rest_api.serializer import *
 
 
@@ -20,10 +34,35 @@ class UserViewSet(viewsets.ModelViewSet):
     search_fields = ('username', 'email')
     ordering_fields = ('username', 'email')
     filter_fields = ('username', 'email', 'is_staff')
+    cursor_ordering = ('-date_joined', '-id')
 
 
-class LicensorViewSet(viewsets.ModelViewSet):
-    queryset = Licensor.objects.exclude(status='Delete')
+class BulkImportMixin(object):
+    """
+    Adds POST <list url>/import/ which imports an uploaded CSV or JSON lines file.
+    """
+
+    @action(detail=False, methods=['post'], url_path='import', parser_classes=(MultiPartParser, FormParser,))
+    def bulk_import(self, request):
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({'file': ['No file was submitted.']}, status=status.HTTP_400_BAD_REQUEST)
+        file_format = request.data.get('file_format') or upload.name.rsplit('.', 1)[-1].lower()
+        if file_format not in FORMATS:
+            return Response({'file_format': ['Expected one of %s.' % ', '.join(FORMATS)]},
+                            status=status.HTTP_400_BAD_REQUEST)
+        try:
+            result = import_parties(self.get_queryset().model, upload, file_format)
+        except ImportFileError as e:
+            return Response(dict(e.result.as_dict(), file=[str(e)]), status=status.HTTP_400_BAD_REQUEST)
+        return Response(result.as_dict())
+
+
+class LicensorViewSet(BulkImportMixin, BulkUpdateMixin, EagerLoadingMixin, ConditionalMixin, viewsets.ModelViewSet):
+    queryset = Licensor.live.all()
+    fast_list = True
+    read_from_replica = True
+    bulk_update_fields = ('status', 'designation', 'organization_name')
     serializer_class = LicensorSerializer
     # parser_classes = (MultiPartParser, FormParser,)
     filter_backends = (DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter,)
@@ -32,8 +71,11 @@ class LicensorViewSet(viewsets.ModelViewSet):
     filter_fields = ('status',)
 
 
-class LicenseeViewSet(viewsets.ModelViewSet):
-    queryset = Licensee.objects.exclude(status='Delete')
+class LicenseeViewSet(BulkImportMixin, BulkUpdateMixin, EagerLoadingMixin, ConditionalMixin, viewsets.ModelViewSet):
+    queryset = Licensee.live.all()
+    fast_list = True
+    read_from_replica = True
+    bulk_update_fields = ('status', 'designation', 'organization_name')
     serializer_class = LicenseeSerializer
     # parser_classes = (MultiPartParser, FormParser,)
     filter_backends = (DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter,)
@@ -42,8 +84,10 @@ class LicenseeViewSet(viewsets.ModelViewSet):
     filter_fields = ('status',)
 
 
-class SoftwareViewSet(viewsets.ModelViewSet):
-    queryset = Software.objects.exclude(status='Delete')
+class SoftwareViewSet(BulkUpdateMixin, EagerLoadingMixin, ConditionalMixin, viewsets.ModelViewSet):
+    queryset = Software.live.all()
+    fast_list = True
+    read_from_replica = True
     serializer_class = SoftwareSerializer
     # parser_classes = (MultiPartParser, FormParser,)
     filter_backends = (DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter,)
@@ -52,35 +96,247 @@ class SoftwareViewSet(viewsets.ModelViewSet):
     filter_fields = ('status',)
 
 
-class SoftwareLicenseAgreementViewSet(viewsets.ModelViewSet):
-    queryset = SoftwareLicenseAgreement.objects.exclude(status='Delete')
+class SoftwareLicenseAgreementViewSet(BulkUpdateMixin, EagerLoadingMixin, ConditionalMixin, viewsets.ModelViewSet):
+    queryset = SoftwareLicenseAgreement.live.all()
+    fast_list = True
+    read_from_replica = True
+    bulk_update_fields = ('status', 'expiry_date', 'no_of_copies', 'warrenty_period', 'price', 'delivery_date')
     serializer_class = SoftwareLicenseAgreementSerializer
+    etag_fields = ('updated_at', 'licensor__updated_at', 'licensee__updated_at', 'software__updated_at')
     # parser_classes = (MultiPartParser, FormParser,)
-    filter_backends = (DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter,)
+    filter_backends = (DjangoFilterBackend, FullTextSearchFilter, filters.OrderingFilter,)
     search_fields = ('terms_and_conditions', 'limitation_of_liability', 'termination', 'payment_plan',\
                      'maintenance_agreement', 'valid_ip_addresses')
     ordering_fields = ('effective_date', 'expiry_date', 'delivery_date', 'created_at', 'no_of_copies', 'price',\
                        'warrenty_period')
     filter_fields = ('licensor', 'licensee', 'software', 'status')
 
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """
+        Streams the filtered agreements as CSV or with ?file_format=xlsx as XLSX, unpaginated.
+        """
+        file_format = request.query_params.get('file_format', 'csv')
+        if file_format not in EXPORT_FORMATS:
+            return Response({'file_format': ['Expected one of %s.' % ', '.join(EXPORT_FORMATS)]},
+                            status=status.HTTP_400_BAD_REQUEST)
+        return export_agreements(self.filter_queryset(self.get_queryset()), file_format=file_format)
+
 
 class CheckValidityOfLicense(APIView):
 
     permission_classes = (IsAuthenticated,)
+    read_from_replica = True
 
     def get(self, request, id, format=None):
         """
         check validity of license.
         """
-        license = SoftwareLicenseAgreement.objects.get(id=id)
-        if dt.today().date() > license.expiry_date:
+        validity = get_license_validity(id)
+        if validity is None:
+            raise Http404
+        return Response(self.public_validity(id, validity, get_client_ip(request)))
+
+    def public_validity(self, id, validity, client_ip):
+        ip_allowed = get_ip_allowlist(id, validity['valid_ip_addresses']).allows(client_ip)
+        if validity['is_valid'] and ip_allowed:
             data = {
-                "is_valid": False,
-                "expiry_date": license.expiry_date
+                "is_valid": True
+                # "expiry_date": license.expiry_date
             }
         else:
             data = {
-                "is_valid": True
-                # "expiry_date": license.expiry_date
+                "is_valid": False,
+                "expiry_date": validity['expiry_date'],
+                "status": validity['status'],
+                "ip_allowed": ip_allowed
+            }
+        return data
+
+
+class BulkCheckValidityOfLicense(APIView):
+
+    permission_classes = (IsAuthenticated,)
+
+    def post(self, request, format=None):
+        """
+        check validity of many licenses, given by agreement ids or by licensee email and software name.
+        """
+        serializer = BulkValidityCheckSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return Response(self.check(serializer.validated_data))
+
+    def check(self, validated_data):
+        ids = validated_data['ids']
+        pairs = validated_data['licenses']
+
+        data = {}
+        if ids:
+            data['agreements'] = {str(agreement_id): self.public_validity(validity) for agreement_id, validity in\
+                                  get_license_validities(ids).items()}
+        if pairs:
+            data['licenses'] = self.check_pairs(pairs)
+        return data
+
+    def public_validity(self, validity):
+        """
+        The ip allowlist is left out, a bulk caller is a proxy and not the licensed installation.
+        """
+        if validity is None:
+            return None
+        return {key: validity[key] for key in ('is_valid', 'expiry_date', 'status')}
+
+    def check_pairs(self, pairs):
+        """
+        Resolve licensee and software pairs to their best agreement in a single query.
+        """
+        query = Q()
+        for pair in pairs:
+            query |= Q(licensee__email=pair['licensee'], software__name=pair['software'])
+        rows = SoftwareLicenseAgreement.live.filter(query)\
+            .values('id', 'licensee__email', 'software__name', 'status', 'expiry_date')
+
+        best = {}
+        for row in rows:
+            validity = self.public_validity(build_license_validity(row['status'], row['expiry_date']))
+            validity['id'] = row['id']
+            key = (row['licensee__email'], row['software__name'])
+            current = best.get(key)
+            if current is None or (validity['is_valid'], validity['expiry_date']) >\
+                    (current['is_valid'], current['expiry_date']):
+                best[key] = validity
+
+        result = []
+        for pair in pairs:
+            validity = best.get((pair['licensee'], pair['software']))
+            result.append(dict(pair, **(validity or {"is_valid": False, "id": None})))
+        return result
+
+
+def tokens_not_configured():
+    data = {
+        "detail": "License tokens are not available, no signing keys are configured."
+    }
+    return Response(data, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+
+class IssueLicenseToken(APIView):
+
+    permission_classes = (IsAuthenticated,)
+
+    def post(self, request, id, format=None):
+        """
+        issue a signed license token which clients can verify offline.
+        """
+        try:
+            license = SoftwareLicenseAgreement.objects.select_related('licensee', 'software').get(id=id)
+        except SoftwareLicenseAgreement.DoesNotExist:
+            raise Http404
+        validity = build_license_validity(license.status, license.expiry_date)
+        if not validity['is_valid']:
+            data = {
+                "is_valid": False,
+                "expiry_date": license.expiry_date,
+                "status": license.status,
+                "detail": "License is not valid."
             }
+            return Response(data, status=status.HTTP_403_FORBIDDEN)
+        try:
+            token, expires_at = issue_license_token(license)
+        except SigningKeysNotConfigured:
+            return tokens_not_configured()
+        data = {
+            "token": token,
+            "expires_at": expires_at
+        }
         return Response(data)
+
+
+class ActivateSeat(APIView):
+
+    permission_classes = (IsAuthenticated,)
+
+    def post(self, request, id, format=None):
+        """
+        lease a seat of the license to an installation, or renew the lease of its seat.
+        """
+        serializer = SeatActivationSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            activation, created = activate_seat(id, serializer.validated_data['installation_id'],
+                                                get_client_ip(request))
+        except SoftwareLicenseAgreement.DoesNotExist:
+            raise Http404
+        except LicenseNotValid as e:
+            data = {
+                "is_valid": False,
+                "expiry_date": e.expiry_date,
+                "status": e.status,
+                "detail": str(e)
+            }
+            return Response(data, status=status.HTTP_403_FORBIDDEN)
+        except NoSeatAvailable as e:
+            data = {
+                "no_of_copies": e.no_of_copies,
+                "detail": str(e)
+            }
+            return Response(data, status=status.HTTP_409_CONFLICT)
+        data = {
+            "installation_id": activation.installation_id,
+            "activated_at": activation.activated_at,
+            "lease_expires_at": activation.lease_expires_at
+        }
+        return Response(data, status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
+
+
+class DeactivateSeat(APIView):
+
+    permission_classes = (IsAuthenticated,)
+
+    def delete(self, request, id, installation_id, format=None):
+        """
+        free the seat of an installation.
+        """
+        if not deactivate_seat(id, installation_id):
+            raise Http404
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class LicenseTokenKeySet(APIView):
+
+    permission_classes = (AllowAny,)
+
+    def get(self, request, format=None):
+        """
+        public keys to verify license tokens.
+        """
+        try:
+            response = Response(get_public_key_set())
+        except SigningKeysNotConfigured:
+            return tokens_not_configured()
+        response['Cache-Control'] = 'public, max-age=3600'
+        return response
+
+
+class ObtainAuthToken(authtoken_views.ObtainAuthToken):
+
+    def post(self, request, *args, **kwargs):
+        """
+        exchange a username and password, in the body or as basic auth, for an api token.
+        """
+        if not request.user.is_authenticated:
+            return super().post(request, *args, **kwargs)
+        token, created = Token.objects.get_or_create(user=request.user)
+        return Response({'token': token.key})
+
+
+class RevokeAuthToken(APIView):
+
+    permission_classes = (IsAuthenticated,)
+
+    def post(self, request, format=None):
+        """
+        log out an api client, its token stops working.
+        """
+        Token.objects.filter(user=request.user).delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
@@ -0,0 +1,222 @@
+"""
+Full text search over the text fields of license agreements.
+
+On PostgreSQL the agreement table gets a weighted tsvector column with a GIN
+index, on SQLite a FTS5 table keyed by agreement id stands in for it. Both are
+created after migrate and kept up to date on save and by the set based bulk
+updates. bulk_create() sends no post_save, code adding agreements with it calls
+index_new_documents() afterwards, or run the rebuild_search_index command.
+Other databases fall back to the icontains search of rest_framework's
+SearchFilter.
+"""
+from django.conf import settings
+from django.db import connections
+from django.db.models.expressions import RawSQL
+
+from rest_framework.filters import BaseFilterBackend, SearchFilter
+from rest_framework.settings import api_settings
+
+# Searched fields and their weight in the ranking
+SEARCH_FIELDS = (
+    ('terms_and_conditions', 'A', 4.0),
+    ('limitation_of_liability', 'B', 2.0),
+    ('termination', 'B', 2.0),
+    ('payment_plan', 'C', 1.0),
+    ('maintenance_agreement', 'C', 1.0),
+    ('valid_ip_addresses', 'D', 0.5),
+)
+SEARCH_COLUMN = 'search_vector'
+SEARCH_INDEX = 'agreement_search_idx'
+FTS_TABLE = 'license_agreement_search'
+
+
+def get_table():
+    from license_agreement.models import SoftwareLicenseAgreement
+    return SoftwareLicenseAgreement._meta.db_table
+
+
+def is_supported(connection):
+    return connection.vendor in ('postgresql', 'sqlite')
+
+
+def tsvector_sql(connection, columns=None):
+    """
+    SQL of the weighted tsvector of a row, ``columns`` maps fields to SQL read in place of their column.
+    """
+    qn = connection.ops.quote_name
+    columns = columns or {}
+    return ' || '.join("setweight(to_tsvector('{config}', coalesce({column}, '')), '{weight}')"\
+                       .format(config=settings.SEARCH_CONFIG, column=columns.get(name, qn(name)), weight=weight)
+                       for name, weight, boost in SEARCH_FIELDS)
+
+
+def create_search_index(connection):
+    """
+    Creates the search column or table with its index and indexes rows not indexed yet.
+    """
+    if not is_supported(connection):
+        return
+    qn = connection.ops.quote_name
+    table = qn(get_table())
+    columns = ', '.join(qn(name) for name, weight, boost in SEARCH_FIELDS)
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {column} tsvector'\
+                           .format(table=table, column=SEARCH_COLUMN))
+            cursor.execute('CREATE INDEX IF NOT EXISTS {index} ON {table} USING GIN ({column})'\
+                           .format(index=SEARCH_INDEX, table=table, column=SEARCH_COLUMN))
+        else:
+            cursor.execute('CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({columns})'\
+                           .format(fts=FTS_TABLE, columns=columns))
+            # the weights of the hidden rank column, which unlike bm25() can be grouped by
+            weights = ', '.join(str(boost) for name, weight, boost in SEARCH_FIELDS)
+            cursor.execute("INSERT INTO {fts} ({fts}, rank) VALUES ('rank', 'bm25({weights})')"\
+                           .format(fts=FTS_TABLE, weights=weights))
+    index_new_documents(connection)
+
+
+def index_new_documents(connection):
+    """
+    Indexes the rows not indexed yet, such as rows added by bulk_create which sends no post_save.
+
+    Unlike create_search_index it changes no schema, so it also runs in a
+    transaction with deferred foreign key checks pending.
+    """
+    if not is_supported(connection):
+        return
+    qn = connection.ops.quote_name
+    table = qn(get_table())
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('UPDATE {table} SET {column} = {vector} WHERE {column} IS NULL'\
+                           .format(table=table, column=SEARCH_COLUMN, vector=tsvector_sql(connection)))
+        else:
+            columns = ', '.join(qn(name) for name, weight, boost in SEARCH_FIELDS)
+            cursor.execute('INSERT INTO {fts} (rowid, {columns}) SELECT id, {columns} FROM {table} '
+                           'WHERE id NOT IN (SELECT rowid FROM {fts})'\
+                           .format(fts=FTS_TABLE, columns=columns, table=table))
+
+
+def rebuild_search_index(connection):
+    """
+    Indexes all rows again.
+    """
+    if not is_supported(connection):
+        return
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('UPDATE {table} SET {column} = NULL'\
+                           .format(table=connection.ops.quote_name(get_table()), column=SEARCH_COLUMN))
+        else:
+            cursor.execute('DROP TABLE IF EXISTS {fts}'.format(fts=FTS_TABLE))
+    create_search_index(connection)
+
+
+def update_search_document(connection, agreement_id):
+    """
+    Indexes the text of one agreement.
+    """
+    if not is_supported(connection):
+        return
+    qn = connection.ops.quote_name
+    table = qn(get_table())
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('UPDATE {table} SET {column} = {vector} WHERE id = %s'\
+                           .format(table=table, column=SEARCH_COLUMN, vector=tsvector_sql(connection)),
+                           [agreement_id])
+        else:
+            columns = ', '.join(qn(name) for name, weight, boost in SEARCH_FIELDS)
+            cursor.execute('DELETE FROM {fts} WHERE rowid = %s'.format(fts=FTS_TABLE), [agreement_id])
+            cursor.execute('INSERT INTO {fts} (rowid, {columns}) SELECT id, {columns} FROM {table} WHERE id = %s'\
+                           .format(fts=FTS_TABLE, columns=columns, table=table), [agreement_id])
+
+
+def update_search_documents(queryset, values=None):
+    """
+    Indexes the text of the agreements of a queryset in one statement, as it reads with ``values`` set.
+
+    Set based updates index the rows before their UPDATE, which may change
+    the fields the queryset selects by.
+    """
+    connection = connections[queryset.db]
+    if not is_supported(connection):
+        return
+    values = values or {}
+    qn = connection.ops.quote_name
+    table = qn(get_table())
+    selected, params = queryset.order_by().values('pk').query.sql_with_params()
+    # the new values are parameters of the statement, the other fields are read from their columns
+    names = [name for name, weight, boost in SEARCH_FIELDS if name in values]
+    columns = {name: '%s' for name in names}
+    params = [values[name] for name in names] + list(params)
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('UPDATE {table} SET {column} = {vector} WHERE id IN ({selected})'\
+                           .format(table=table, column=SEARCH_COLUMN, vector=tsvector_sql(connection, columns),
+                                   selected=selected), params)
+        else:
+            cursor.execute('DELETE FROM {fts} WHERE rowid IN ({selected})'.format(fts=FTS_TABLE, selected=selected),
+                           params[len(names):])
+            cursor.execute('INSERT INTO {fts} (rowid, {fields}) SELECT id, {columns} FROM {table} '
+                           'WHERE id IN ({selected})'\
+                           .format(fts=FTS_TABLE, fields=', '.join(qn(name) for name, weight, boost in SEARCH_FIELDS),
+                                   columns=', '.join(columns.get(name, qn(name))
+                                                     for name, weight, boost in SEARCH_FIELDS),
+                                   table=table, selected=selected), params)
+
+
+def delete_search_document(connection, agreement_id):
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM {fts} WHERE rowid = %s'.format(fts=FTS_TABLE), [agreement_id])
+
+
+def fts5_query(terms):
+    """
+    Every word of the search quoted, so that FTS5 operators in it are taken literally.
+    """
+    return ' '.join('"%s"' % word.replace('"', '""') for word in terms.split())
+
+
+def search(queryset, terms):
+    """
+    Agreements matching the search terms, annotated with search_rank and best matches first.
+    """
+    connection = connections[queryset.db]
+    qn = connection.ops.quote_name
+    table = qn(get_table())
+    if connection.vendor == 'postgresql':
+        query = "plainto_tsquery('{config}', %s)".format(config=settings.SEARCH_CONFIG)
+        # ts_rank() is a real, as double precision the rank of a keyset cursor compares equal to the row's again
+        rank = RawSQL('ts_rank({table}.{column}, {query})::float8'.format(table=table, column=SEARCH_COLUMN,
+                                                                          query=query), [terms])
+        tables = []
+        where = ['{table}.{column} @@ {query}'.format(table=table, column=SEARCH_COLUMN, query=query)]
+        params = [terms]
+    else:
+        # the FTS table is joined rather than queried per row, a correlated MATCH runs once for every row
+        rank = RawSQL('-{fts}.rank'.format(fts=FTS_TABLE), ())
+        tables = [FTS_TABLE]
+        where = ['{fts}.rowid = {table}.id'.format(fts=FTS_TABLE, table=table), '{fts} MATCH %s'.format(fts=FTS_TABLE)]
+        params = [fts5_query(terms)]
+    return queryset.annotate(search_rank=rank).extra(tables=tables, where=where, params=params)\
+        .order_by('-search_rank')
+
+
+class FullTextSearchFilter(BaseFilterBackend):
+    """
+    Ranked full text search of agreements, with SearchFilter as fallback.
+    """
+    search_param = api_settings.SEARCH_PARAM
+
+    def filter_queryset(self, request, queryset, view):
+        terms = request.query_params.get(self.search_param, '').strip()
+        if not terms:
+            return queryset
+        if not is_supported(connections[queryset.db]):
+            return SearchFilter().filter_queryset(request, queryset, view)
+        return search(queryset, terms)
+
+    def get_schema_fields(self, view):
+        return SearchFilter().get_schema_fields(view)
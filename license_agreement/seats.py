@@ -0,0 +1,92 @@
+"""
+Seats of license agreements.
+
+An installation activates a seat and holds it for SEAT_LEASE_SECONDS,
+activating again renews the lease. At most ``no_of_copies`` seats of an
+agreement are leased at a time. Activations of an agreement are serialized
+by a lock on its row, so the seats are counted and taken in one step and
+concurrent activations can not lease more seats than the agreement has.
+Lapsed seats are free: they are not counted, the next activation of their
+agreement deletes them and reclaim_seats() sweeps the rest.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from license_agreement.cache import build_license_validity
+from license_agreement.models import *
+
+
+class LicenseNotValid(Exception):
+    def __init__(self, status, expiry_date):
+        super().__init__('License is not valid.')
+        self.status = status
+        self.expiry_date = expiry_date
+
+
+class NoSeatAvailable(Exception):
+    def __init__(self, no_of_copies):
+        super().__init__('All {} seats of the license are in use.'.format(no_of_copies))
+        self.no_of_copies = no_of_copies
+
+
+def activate_seat(agreement_id, installation_id, ip_address=None):
+    """
+    Leases a seat of an agreement to an installation or renews its lease, returns (activation, created).
+
+    Raises SoftwareLicenseAgreement.DoesNotExist, LicenseNotValid when the
+    license is not valid and NoSeatAvailable when all seats are leased.
+    """
+    now = timezone.now()
+    lease_expires_at = now + timedelta(seconds=settings.SEAT_LEASE_SECONDS)
+    with transaction.atomic():
+        # a write first, so SQLite, which ignores select_for_update, takes its write lock before the count
+        SeatActivation.objects.filter(agreement_id=agreement_id, lease_expires_at__lte=now).delete()
+        agreement = SoftwareLicenseAgreement.objects.select_for_update().filter(id=agreement_id)\
+            .values('status', 'expiry_date', 'no_of_copies').first()
+        if agreement is None:
+            raise SoftwareLicenseAgreement.DoesNotExist
+        if not build_license_validity(agreement['status'], agreement['expiry_date'])['is_valid']:
+            raise LicenseNotValid(agreement['status'], agreement['expiry_date'])
+
+        seats = SeatActivation.objects.filter(agreement_id=agreement_id)
+        activation = seats.filter(installation_id=installation_id).first()
+        if activation is not None:
+            activation.lease_expires_at = lease_expires_at
+            activation.ip_address = ip_address
+            activation.save(update_fields=['lease_expires_at', 'ip_address'])
+            return activation, False
+        if seats.count() >= agreement['no_of_copies']:
+            raise NoSeatAvailable(agreement['no_of_copies'])
+        activation = SeatActivation.objects.create(agreement_id=agreement_id, installation_id=installation_id,
+                                                   ip_address=ip_address, activated_at=now,
+                                                   lease_expires_at=lease_expires_at)
+        return activation, True
+
+
+def deactivate_seat(agreement_id, installation_id):
+    """
+    Frees the seat of an installation, returns whether it held one.
+    """
+    deleted, by_model = SeatActivation.objects.filter(agreement_id=agreement_id, installation_id=installation_id,
+                                                      lease_expires_at__gt=timezone.now()).delete()
+    return bool(deleted)
+
+
+def reclaim_seats(chunk_size=None):
+    """
+    Deletes lapsed seats of all agreements in chunks, returns the number deleted.
+    """
+    chunk_size = chunk_size or settings.SEAT_RECLAIM_CHUNK_SIZE
+    now = timezone.now()
+    reclaimed = 0
+    while True:
+        ids = list(SeatActivation.objects.filter(lease_expires_at__lte=now).order_by('lease_expires_at')\
+                   .values_list('id', flat=True)[:chunk_size])
+        if not ids:
+            return reclaimed
+        # a lease renewed since the select is kept
+        deleted, by_model = SeatActivation.objects.filter(id__in=ids, lease_expires_at__lte=now).delete()
+        reclaimed += deleted
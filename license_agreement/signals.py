@@ -0,0 +1,76 @@
+from django.db import connections
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.utils import timezone
+
+from license_agreement.counters import COUNTED_MODELS, record_change, current_values
+from license_agreement.models import *
+from license_agreement.search import SEARCH_FIELDS, create_search_index, update_search_document,\
+    delete_search_document
+
+COUNTED = [model for model, key in COUNTED_MODELS] + [SoftwareLicenseAgreement]
+
+
+def loaded_values(sender, instance):
+    """
+    Values the instance has in the database before it is saved.
+    """
+    if instance._state.adding:
+        return {}
+    values = getattr(instance, '_loaded_values', {})
+    if 'status' in values and (sender is not SoftwareLicenseAgreement or 'expiry_date' in values):
+        return values
+    fields = ('status', 'expiry_date') if sender is SoftwareLicenseAgreement else ('status',)
+    return sender.objects.filter(pk=instance.pk).values(*fields).first() or {}
+
+
+def remember_counted_values(sender, instance, raw=False, **kwargs):
+    if not raw:
+        instance._counted_values = loaded_values(sender, instance)
+
+
+def count_saved(sender, instance, raw=False, **kwargs):
+    if not raw:
+        record_change(sender, instance.__dict__.pop('_counted_values', {}), current_values(instance))
+
+
+def count_deleted(sender, instance, **kwargs):
+    record_change(sender, current_values(instance), {})
+
+
+for model in COUNTED:
+    pre_save.connect(remember_counted_values, sender=model, dispatch_uid='counters_pre_save')
+    post_save.connect(count_saved, sender=model, dispatch_uid='counters_post_save')
+    post_delete.connect(count_deleted, sender=model, dispatch_uid='counters_post_delete')
+
+
+def index_agreement(sender, instance, created, raw=False, using=None, **kwargs):
+    loaded_values = getattr(instance, '_loaded_values', {})
+    if created or raw or any(loaded_values.get(name, instance) != getattr(instance, name)\
+                             for name, weight, boost in SEARCH_FIELDS):
+        update_search_document(connections[using], instance.pk)
+
+
+def unindex_agreement(sender, instance, using=None, **kwargs):
+    delete_search_document(connections[using], instance.pk)
+
+
+def create_search_tables(sender, using, **kwargs):
+    create_search_index(connections[using])
+
+
+post_save.connect(index_agreement, sender=SoftwareLicenseAgreement, dispatch_uid='search_post_save')
+post_delete.connect(unindex_agreement, sender=SoftwareLicenseAgreement, dispatch_uid='search_post_delete')
+
+
+def touch_address_owners(sender, instance, created, raw=False, **kwargs):
+    """
+    Addresses have no version of their own, the licensors and licensees showing one get a new updated_at,
+    which renews their cached table rows and api ETags.
+    """
+    if not created and not raw:
+        now = timezone.now()
+        Licensor.objects.filter(address=instance).update(updated_at=now)
+        Licensee.objects.filter(address=instance).update(updated_at=now)
+
+
+post_save.connect(touch_address_owners, sender=Address, dispatch_uid='address_post_save')
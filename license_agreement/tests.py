@@ -1,3 +1,1371 @@
-from django.test import TestCase
+import base64
+import csv
+import gc
+import gzip
+import ipaddress
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import zipfile
+from datetime import date, datetime, timedelta
+from io import BytesIO, StringIO
+from unittest import skipUnless
+from urllib.parse import parse_qs, urlparse
+from xml.etree import ElementTree
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.cache import cache, caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, connections, transaction
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from SoftwareLicensing.db_router import STICKY_COOKIE
+from SoftwareLicensing.pooled_postgresql.pool import ConnectionPool, PoolTimeout
+from SoftwareLicensing.querycount import QueryRecorder, assert_max_queries
+from license_agreement.rest_api import views as api_views
+from license_agreement.rest_api.asgi import ValidityApplication
+
+from license_agreement.cache import build_license_validity, get_license_validities, get_license_validity,\
+    local_validity_cache, validity_timeout
+from license_agreement.counters import get_dashboard_counts, reconcile_counters
+from license_agreement.importer import ImportResult, save_chunk
+from license_agreement.ipallowlist import IPAllowlist, get_client_ip
+from license_agreement.models import *
+from license_agreement.search import index_new_documents, search, update_search_documents
+from license_agreement.tokens import check_signing_keys
+from license_agreement.verification import LicenseTokenError, LicenseTokenVerifier
+from license_agreement.seats import NoSeatAvailable, activate_seat
+
+
+def explain(queryset):
+    """
+    Returns the query plan of a queryset as text.
+    """
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+        else:
+            # statistics of the rows in the test transaction, not of whatever autovacuum saw last
+            cursor.execute('ANALYZE ' + connection.ops.quote_name(queryset.model._meta.db_table))
+            # tables of a test database are too small for the planner to prefer an index
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            cursor.execute('EXPLAIN ' + sql, params)
+        return '\n'.join(str(row) for row in cursor.fetchall())
+
+
+def create_agreement(**kwargs):
+    if 'licensor' not in kwargs:
+        address = Address.objects.create(city_or_village='Pune', state='Maharashtra', country='India', zip_code=411001)
+        kwargs['licensor'] = Licensor.objects.create(first_name='Licensor', last_name='One', mobile='+919999999991',
+                                                     email='licensor@example.com', address=address)
+        kwargs['licensee'] = Licensee.objects.create(first_name='Licensee', last_name='One', mobile='+919999999992',
+                                                     email='licensee@example.com', address=address)
+        kwargs['software'] = Software.objects.create(name='Software')
+    data = {
+        'effective_date': date(2018, 1, 1),
+        'terms_and_conditions': 'Terms',
+        'expiry_date': date(2030, 1, 1),
+        'no_of_copies': 5,
+        'delivery_date': date(2018, 1, 1),
+    }
+    data.update(kwargs)
+    return SoftwareLicenseAgreement.objects.create(**data)
+
+
+class LiveIndexesTest(TestCase):
+    """
+    Hot queries on live objects use the status indexes.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.agreement = create_agreement()
+        # enough rows of other parties, statuses and expiry dates for the planner to tell the indexes apart, the
+        # licensee and the software of the agreement have many agreements each and one together
+        address = cls.agreement.licensor.address
+        licensors = [Licensor.objects.create(first_name='Licensor', last_name=str(i), mobile='+91888888880%d' % i,
+                                             email='licensor%d@example.com' % i, address=address) for i in range(6)]
+        licensees = [Licensee.objects.create(first_name='Licensee', last_name=str(i), mobile='+91888888881%d' % i,
+                                             email='licensee%d@example.com' % i, address=address) for i in range(6)]
+        softwares = [Software.objects.create(name='Software %d' % i) for i in range(6)]
+        SoftwareLicenseAgreement.objects.bulk_create([
+            SoftwareLicenseAgreement(licensor=licensors[i % 6],
+                                     licensee=cls.agreement.licensee if i < 100 else licensees[i % 6],
+                                     software=cls.agreement.software if 100 <= i < 200 else softwares[i // 6 % 6],
+                                     effective_date=date(2018, 1, 1),
+                                     expiry_date=date(2030, 1, 1) + timedelta(days=i), delivery_date=date(2018, 1, 1),
+                                     terms_and_conditions='Terms', no_of_copies=5,
+                                     status=('Active', 'Inactive', 'Expired')[i % 3])
+            for i in range(300)])
+
+    def test_live_manager_excludes_deleted(self):
+        create_agreement(licensor=self.agreement.licensor, licensee=self.agreement.licensee,
+                         software=self.agreement.software, status='Delete')
+        deleted = SoftwareLicenseAgreement.objects.get(status='Delete')
+        self.assertEqual(SoftwareLicenseAgreement.live.count(), 301)
+        self.assertFalse(SoftwareLicenseAgreement.live.filter(id=deleted.id).exists())
+
+    def test_expiry_query_uses_status_expiry_index(self):
+        queryset = SoftwareLicenseAgreement.live.filter(status='Active', expiry_date__lt=date.today())
+        self.assertIn('agreement_status_expiry_idx', explain(queryset))
+
+    def test_licensee_software_query_uses_index(self):
+        queryset = SoftwareLicenseAgreement.live.filter(licensee=self.agreement.licensee,
+                                                        software=self.agreement.software)
+        self.assertIn('agreement_licensee_sw_idx', explain(queryset))
+
+    def test_licensor_query_uses_index(self):
+        queryset = SoftwareLicenseAgreement.live.filter(licensor=self.agreement.licensor)
+        self.assertIn('agreement_licensor_idx', explain(queryset))
+
+
+class BenchmarkTest(TestCase):
+    """
+    Generated data is consistent and every benchmark scenario runs on it.
+    """
+    def test_generate_data_and_benchmark(self):
+        call_command('generate_data', agreements=200, licensors=3, licensees=20, softwares=2, batch_size=50,
+                     stdout=StringIO())
+        self.assertEqual(SoftwareLicenseAgreement.objects.count(), 200)
+        self.assertEqual(Licensee.objects.count(), 20)
+        self.assertEqual(reconcile_counters(), 0)
+        self.assertEqual(get_dashboard_counts()['licensees_count'], Licensee.live.count())
+
+        out = StringIO()
+        call_command('benchmark', requests=2, warmup=0, stdout=out)
+        for scenario in ('validity', 'list', 'dashboard', 'search', 'create'):
+            self.assertIn(scenario, out.getvalue())
+
+
+@override_settings(QUERY_COUNT_HEADERS=True)
+class QueryCountTest(TestCase):
+    """
+    Queries of a request are reported and can be bounded in tests.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.agreement = create_agreement()
+        for i in range(3):
+            create_agreement(licensor=cls.agreement.licensor, licensee=cls.agreement.licensee,
+                             software=cls.agreement.software)
+        cls.user = User.objects.create_user('tester', password='secret')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_headers(self):
+        response = self.client.get('/license/api/agreements/%d/validity' % self.agreement.id)
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(int(response['X-Query-Count']), 0)
+        self.assertIn('X-Query-Time-Ms', response)
+        self.assertEqual(response['X-Duplicate-Queries'], '0')
+
+    def test_validity_queries(self):
+        with assert_max_queries(self, 3):
+            self.client.get('/license/api/agreements/%d/validity' % self.agreement.id)
+
+    def test_agreement_detail_queries(self):
+        with assert_max_queries(self, 4):
+            self.client.get('/license/api/agreements/%d/' % self.agreement.id)
+
+    def test_assert_max_queries_reports_duplicates(self):
+        with self.assertRaises(AssertionError) as cm:
+            with assert_max_queries(self, 1):
+                for agreement in SoftwareLicenseAgreement.objects.all():
+                    agreement.licensor
+        self.assertIn('4x SELECT', str(cm.exception))
+
+
+class ExpirySweepTest(TransactionTestCase):
+    """
+    The expiry sweep flips expired active agreements and keeps counters and caches right.
+    """
+    def test_expire_agreements(self):
+        today = date.today()
+        expired = create_agreement(expiry_date=today - timedelta(days=1))
+        parties = {'licensor': expired.licensor, 'licensee': expired.licensee, 'software': expired.software}
+        others = [create_agreement(expiry_date=today, **parties),
+                  create_agreement(expiry_date=today - timedelta(days=1), status='Inactive', **parties)]
+        more_expired = [create_agreement(expiry_date=today - timedelta(days=i), **parties) for i in range(2, 5)]
+        self.assertEqual(get_license_validity(expired.id)['status'], 'Active')
+
+        out = StringIO()
+        call_command('expire_agreements', chunk_size=2, stdout=out)
+        self.assertIn('4 license agreements expired', out.getvalue())
+
+        flipped = [expired.id] + [agreement.id for agreement in more_expired]
+        self.assertEqual(set(SoftwareLicenseAgreement.objects.filter(status='Expired').values_list('id', flat=True)),
+                         set(flipped))
+        self.assertEqual(set(AgreementStatusLog.objects.values_list('agreement_id', flat=True)), set(flipped))
+        for agreement in others:
+            agreement.refresh_from_db()
+            self.assertNotEqual(agreement.status, 'Expired')
+        self.assertEqual(get_license_validity(expired.id)['status'], 'Expired')
+        # the emptied days of the flipped agreements are gone
+        self.assertFalse(Counter.objects.filter(key__startswith='licenses:Active:', day__lt=today).exists())
+        self.assertEqual(reconcile_counters(), 0)
+        self.assertEqual(get_dashboard_counts()['expired_licenses_count'], 4)
+
+
+class DashboardCountersTest(TestCase):
+    """
+    Saves and deletes move the dashboard counters, which stay a row per status besides the future expiry dates.
+    """
+    def counts(self):
+        return get_dashboard_counts(today=date(2030, 1, 1))
+
+    def test_create_change_and_delete(self):
+        agreement = create_agreement(expiry_date=date(2030, 1, 10))
+        self.assertEqual(self.counts(), {'licensors_count': 1, 'licensees_count': 1, 'softwares_count': 1,
+                                         'licenses_count': 1, 'active_licenses_count': 1,
+                                         'expiring_licenses_count': 1, 'expired_licenses_count': 0})
+        agreement.expiry_date = date(2031, 1, 1)
+        agreement.save()
+        self.assertEqual(self.counts()['active_licenses_count'], 1)
+        self.assertEqual(self.counts()['expiring_licenses_count'], 0)
+        agreement.status = 'Inactive'
+        agreement.save()
+        self.assertEqual(self.counts()['licenses_count'], 1)
+        self.assertEqual(self.counts()['active_licenses_count'], 0)
+        agreement.status = 'Expired'
+        agreement.save()
+        self.assertEqual(self.counts()['expired_licenses_count'], 1)
+        self.assertEqual(reconcile_counters(), 0)
+
+        agreement.licensor.delete()
+        agreement.delete()
+        counts = self.counts()
+        self.assertEqual(counts['licensors_count'], 0)
+        self.assertEqual(counts['licenses_count'], 0)
+        self.assertEqual(counts['expired_licenses_count'], 0)
+        self.assertEqual(reconcile_counters(), 0)
+
+    def test_overdue_active_counted_as_expired(self):
+        create_agreement(expiry_date=date(2029, 12, 31))
+        counts = self.counts()
+        self.assertEqual(counts['active_licenses_count'], 0)
+        self.assertEqual(counts['expired_licenses_count'], 1)
+
+    def test_rows_per_status(self):
+        agreement = create_agreement(status='Expired', expiry_date=date(2020, 1, 1))
+        parties = {'licensor': agreement.licensor, 'licensee': agreement.licensee, 'software': agreement.software}
+        for i in range(1, 5):
+            create_agreement(status='Expired', expiry_date=date(2020, 1, 1) + timedelta(days=i), **parties)
+            create_agreement(status='Inactive', expiry_date=date(2020, 1, 1) + timedelta(days=i), **parties)
+        self.assertEqual(set(Counter.objects.filter(key__startswith='licenses:').values_list('key', 'value')),
+                         {('licenses:Expired', 5), ('licenses:Inactive', 4)})
+        self.assertEqual(self.counts()['expired_licenses_count'], 5)
+        self.assertEqual(reconcile_counters(), 0)
+
+
+class ConditionalRequestTest(TestCase):
+    """
+    Unchanged resources answer 304 and stale edits are refused.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.agreement = create_agreement()
+        cls.user = User.objects.create_user('tester', password='secret')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+        self.url = '/license/api/agreements/%d/' % self.agreement.id
+
+    def test_not_modified(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        with assert_max_queries(self, 3):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+        response = self.client.get('/license/api/agreements/')
+        self.assertEqual(self.client.get('/license/api/agreements/', HTTP_IF_NONE_MATCH=response['ETag']).status_code,
+                         304)
+        self.agreement.licensee.save()
+        self.assertEqual(self.client.get('/license/api/agreements/', HTTP_IF_NONE_MATCH=response['ETag']).status_code,
+                         200)
+
+    def test_if_match(self):
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.patch(self.url, '{"no_of_copies": 6}', content_type='application/json',
+                                     HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+        response = self.client.patch(self.url, '{"no_of_copies": 7}', content_type='application/json',
+                                     HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, 412)
+        self.agreement.refresh_from_db()
+        self.assertEqual(self.agreement.no_of_copies, 6)
+
+
+class EagerLoadingTest(TestCase):
+    """
+    Lists load related objects eagerly and the values() path renders the same bytes.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        agreement = create_agreement(valid_ip_addresses='10.0.0.0/8', warrenty_period=30)
+        for i in range(4):
+            create_agreement(licensor=agreement.licensor, licensee=agreement.licensee, software=agreement.software,
+                             price='10.50', warrenty_period=None)
+        cls.user = User.objects.create_user('tester', password='secret')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def get_list(self, url, fast_list):
+        viewsets = (api_views.LicensorViewSet, api_views.LicenseeViewSet, api_views.SoftwareViewSet,
+                    api_views.SoftwareLicenseAgreementViewSet)
+        saved = [viewset.fast_list for viewset in viewsets]
+        for viewset in viewsets:
+            viewset.fast_list = fast_list
+        try:
+            with assert_max_queries(self, 3):
+                response = self.client.get(url)
+        finally:
+            for viewset, value in zip(viewsets, saved):
+                viewset.fast_list = value
+        self.assertEqual(response.status_code, 200)
+        return response.content
+
+    def test_values_path_matches_instances(self):
+        for url in ('/license/api/agreements/', '/license/api/agreements/?page_size=2&ordering=warrenty_period',
+                    '/license/api/agreements/?search=terms', '/license/api/licensors/', '/license/api/licensees/',
+                    '/license/api/softwares/'):
+            self.assertEqual(self.get_list(url, True), self.get_list(url, False), url)
+
+
+class BulkOperationsTest(TestCase):
+    """
+    Bulk PATCH and DELETE run set based and queryset delete() soft deletes.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.agreement = create_agreement()
+        cls.parties = {'licensor': cls.agreement.licensor, 'licensee': cls.agreement.licensee,
+                       'software': cls.agreement.software}
+        cls.others = [create_agreement(**cls.parties) for i in range(4)]
+        cls.user = User.objects.create_user('tester', password='secret')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+        self.url = '/license/api/agreements/bulk/'
+
+    def test_bulk_update(self):
+        with assert_max_queries(self, 15):
+            response = self.client.patch(self.url + '?software=%d' % self.agreement.software_id,
+                                         json.dumps({'status': 'Inactive', 'no_of_copies': 9}),
+                                         content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'updated': 5})
+        self.assertEqual(SoftwareLicenseAgreement.objects.filter(status='Inactive', no_of_copies=9).count(), 5)
+        self.assertEqual(AgreementStatusLog.objects.filter(new_status='Inactive').count(), 5)
+        self.assertEqual(reconcile_counters(), 0)
+
+    def test_statements_independent_of_rows(self):
+        # the counters of both statuses exist from then on
+        SoftwareLicenseAgreement.objects.filter(id=self.agreement.id).bulk_set(status='Inactive')
+        SoftwareLicenseAgreement.objects.filter(id=self.agreement.id).bulk_set(status='Active')
+        statements = []
+        for queryset in (SoftwareLicenseAgreement.objects.filter(id=self.agreement.id),
+                         SoftwareLicenseAgreement.objects.filter(software=self.agreement.software)):
+            with CaptureQueriesContext(connection) as queries:
+                queryset.bulk_set(status='Inactive', no_of_copies=9)
+            statements.append(len(queries))
+            queryset.bulk_set(status='Active')
+        self.assertEqual(statements[0], statements[1])
+        self.assertEqual(AgreementStatusLog.objects.filter(new_status='Inactive').count(), 7)
+        self.assertEqual(AgreementStatusLog.objects.filter(new_status='Active').count(), 7)
+        self.assertEqual(reconcile_counters(), 0)
+
+    def test_bulk_update_by_search(self):
+        response = self.client.patch('/license/api/agreements/bulk/?search=terms', json.dumps({'status': 'Inactive'}),
+                                     content_type='application/json')
+        self.assertEqual(response.json(), {'updated': 5})
+        self.assertFalse(SoftwareLicenseAgreement.objects.filter(status='Active').exists())
+
+    def test_bulk_update_refused(self):
+        response = self.client.patch(self.url, json.dumps({'status': 'Inactive'}), content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        data = {'ids': [self.agreement.id], 'terms_and_conditions': 'Other'}
+        response = self.client.patch(self.url, json.dumps(data), content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.patch(self.url, json.dumps({'ids': [self.agreement.id], 'status': 'Unknown'}),
+                                     content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(SoftwareLicenseAgreement.objects.exclude(status='Active').exists())
+
+    def test_bulk_delete(self):
+        ids = [agreement.id for agreement in self.others[:2]]
+        response = self.client.delete(self.url, json.dumps({'ids': ids}), content_type='application/json')
+        self.assertEqual(response.json(), {'deleted': 2})
+        self.assertEqual(set(SoftwareLicenseAgreement.objects.filter(status='Delete').values_list('id', flat=True)),
+                         set(ids))
+        self.assertEqual(SoftwareLicenseAgreement.live.count(), 3)
+
+    def test_queryset_delete(self):
+        self.assertEqual(SoftwareLicenseAgreement.objects.filter(id=self.agreement.id).delete(),
+                         (1, {'license_agreement.SoftwareLicenseAgreement': 1}))
+        self.assertEqual(SoftwareLicenseAgreement.objects.get(id=self.agreement.id).status, 'Delete')
+        self.assertEqual(reconcile_counters(), 0)
+        SoftwareLicenseAgreement.objects.filter(id=self.agreement.id).hard_delete()
+        self.assertFalse(SoftwareLicenseAgreement.objects.filter(id=self.agreement.id).exists())
+
+
+class CachedAuthenticationTest(TestCase):
+    """
+    Api credentials are resolved from the cache until logout or a password change.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.agreement = create_agreement()
+        cls.user = User.objects.create_user('tester', password='secret')
+
+    def setUp(self):
+        cache.clear()
+        self.url = '/license/api/agreements/%d/validity' % self.agreement.id
+        self.basic = 'Basic ' + base64.b64encode(b'tester:secret').decode()
+
+    def test_basic_credentials(self):
+        self.assertEqual(self.client.get(self.url, HTTP_AUTHORIZATION=self.basic).status_code, 200)
+        with assert_max_queries(self, 0):
+            self.assertEqual(self.client.get(self.url, HTTP_AUTHORIZATION=self.basic).status_code, 200)
+        self.user.set_password('changed')
+        self.user.save()
+        self.assertEqual(self.client.get(self.url, HTTP_AUTHORIZATION=self.basic).status_code, 401)
+
+    def test_token(self):
+        response = self.client.post('/license/api/auth/token', HTTP_AUTHORIZATION=self.basic)
+        token = 'Token ' + response.json()['token']
+        self.assertEqual(self.client.get(self.url, HTTP_AUTHORIZATION=token).status_code, 200)
+        with assert_max_queries(self, 0):
+            self.assertEqual(self.client.get(self.url, HTTP_AUTHORIZATION=token).status_code, 200)
+        self.assertEqual(self.client.post('/license/api/auth/logout', HTTP_AUTHORIZATION=token).status_code, 204)
+        self.assertEqual(self.client.get(self.url, HTTP_AUTHORIZATION=token).status_code, 401)
+
+        response = self.client.post('/license/api/auth/token', {'username': 'tester', 'password': 'secret'})
+        token = 'Token ' + response.json()['token']
+        self.assertEqual(self.client.get(self.url, HTTP_AUTHORIZATION=token).status_code, 200)
+        self.user.set_password('changed')
+        self.user.save()
+        self.assertEqual(self.client.get(self.url, HTTP_AUTHORIZATION=token).status_code, 401)
+
+
+class StaticFilesTest(TestCase):
+    """
+    Collected static files are fingerprinted, precompressed and served immutable.
+    """
+    def test_collected_files(self):
+        with tempfile.TemporaryDirectory() as static_root, override_settings(STATIC_ROOT=static_root):
+            call_command('collectstatic', interactive=False, verbosity=0)
+            url = staticfiles_storage.url('license_agreement/js/jquery.min.js')
+            self.assertRegex(url, r'jquery\.min\.[0-9a-f]{12}\.js$')
+
+            response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip, deflate')
+            self.assertEqual(response['Content-Encoding'], 'gzip')
+            self.assertIn('immutable', response['Cache-Control'])
+            with open(os.path.join(settings.BASE_DIR, 'license_agreement/static/license_agreement/js/jquery.min.js'),
+                      'rb') as original:
+                self.assertEqual(gzip.decompress(b''.join(response.streaming_content)), original.read())
+
+            response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=response['ETag'])
+            self.assertEqual(response.status_code, 304)
+            response = self.client.get(url)
+            self.assertNotIn('Content-Encoding', response)
+
+
+class TemplateFragmentCacheTest(TestCase):
+    """
+    Cached table rows are renewed when their objects are saved.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.agreement = create_agreement()
+        cls.user = User.objects.create_user('tester', password='secret')
+
+    def setUp(self):
+        caches['template_fragments'].clear()
+        self.client.force_login(self.user)
+
+    def test_rows_renewed_on_save(self):
+        self.assertContains(self.client.get('/license/agreements/'), 'Licensor One')
+        self.assertContains(self.client.get('/license/licensors/'), 'Pune')
+
+        licensor = self.agreement.licensor
+        licensor.last_name = 'Renamed'
+        licensor.save()
+        self.assertContains(self.client.get('/license/agreements/'), 'Licensor Renamed')
+
+        licensor.address.city_or_village = 'Mumbai'
+        licensor.address.save()
+        response = self.client.get('/license/licensors/')
+        self.assertContains(response, 'Mumbai')
+        self.assertNotContains(response, 'Pune')
+
+
+class ConnectionPoolTest(SimpleTestCase):
+    """
+    Pooled connections are reused, recycled when old or broken, and limited in number.
+    """
+    def make_pool(self, **kwargs):
+        def check(connection):
+            connection.execute('SELECT 1')
+        return ConnectionPool(lambda: sqlite3.connect(':memory:', check_same_thread=False), check,
+                              lambda connection: True, **kwargs)
+
+    def test_reuse(self):
+        pool = self.make_pool()
+        connection = pool.acquire()
+        pool.release(connection)
+        self.assertIs(pool.acquire(), connection)
+        self.assertEqual(pool.size, 1)
+
+    def test_recycle(self):
+        pool = self.make_pool(max_age=None, check_after=0)
+        connection = pool.acquire()
+        pool.release(connection)
+        connection.close()
+        replacement = pool.acquire()
+        self.assertIsNot(replacement, connection)
+        self.assertEqual(pool.size, 1)
+
+        pool = self.make_pool(max_age=0)
+        connection = pool.acquire()
+        pool.release(connection)
+        self.assertIsNot(pool.acquire(), connection)
+        self.assertEqual(pool.size, 1)
+
+    def test_limit(self):
+        pool = self.make_pool(max_size=1, timeout=0.05)
+        connection = pool.acquire()
+        with self.assertRaises(PoolTimeout):
+            pool.acquire()
+        pool.release(connection)
+        self.assertIs(pool.acquire(), connection)
+
+    def test_waiting_callers_served_first(self):
+        pool = self.make_pool(max_size=1)
+        connection = pool.acquire()
+        acquired = []
+        waiter = threading.Thread(target=lambda: acquired.append(pool.acquire()))
+        waiter.start()
+        while not pool.waiters:
+            time.sleep(0.001)
+        pool.release(connection)
+        # asking again at once, as a thread running one request after another does
+        pool.timeout = 0.05
+        with self.assertRaises(PoolTimeout):
+            pool.acquire()
+        waiter.join()
+        self.assertEqual(acquired, [connection])
+
+
+class ReplicaRoutingTest(TransactionTestCase):
+    """
+    Read only requests of opted in views read a replica, clients which wrote read the primary.
+
+    The replica is a second connection to the test database.
+    """
+    replica = 'replica_test'
+
+    def setUp(self):
+        cache.clear()
+        local_validity_cache.clear()
+        connections.databases[self.replica] = dict(connections['default'].settings_dict)
+        self.addCleanup(self.remove_replica)
+        self.agreement = create_agreement()
+        self.user = User.objects.create_user('tester', password='secret')
+        self.client.force_login(self.user)
+
+    def remove_replica(self):
+        connections[self.replica].close()
+        del connections[self.replica]
+        del connections.databases[self.replica]
+
+    def replica_queries(self, method, url, **kwargs):
+        with QueryRecorder(self.replica) as recorder:
+            response = getattr(self.client, method)(url, **kwargs)
+        self.assertLess(response.status_code, 400)
+        return recorder.count
+
+    def test_routing(self):
+        with override_settings(REPLICA_DATABASES=[self.replica]):
+            self.assertGreater(self.replica_queries('get', '/license/api/agreements/%d/validity' % self.agreement.id),
+                               0)
+            self.assertGreater(self.replica_queries('get', '/license/'), 0)
+            self.assertEqual(self.replica_queries('get', '/license/agreements/'), 0)
+
+            self.assertEqual(self.replica_queries('patch', '/license/api/agreements/%d/' % self.agreement.id,
+                                                  data=json.dumps({'no_of_copies': 3}), content_type='application/json'), 0)
+            self.assertIn(STICKY_COOKIE, self.client.cookies)
+            self.assertEqual(self.replica_queries('get', '/license/api/agreements/'), 0)
+
+            del self.client.cookies[STICKY_COOKIE]
+            self.assertGreater(self.replica_queries('get', '/license/api/agreements/'), 0)
+
+
+class AsgiValidityTest(TransactionTestCase):
+    """
+    The ASGI application answers validity checks like the api and hands other requests to Django.
+    """
+    def setUp(self):
+        cache.clear()
+        local_validity_cache.clear()
+        self.agreement = create_agreement()
+        self.token = 'Token ' + Token.objects.create(user=User.objects.create_user('tester')).key
+        self.forwarded = []
+        self.application = ValidityApplication(self.fallback)
+        # the connections of the ended pool threads are closed once collected, they would block dropping the
+        # test database when CONN_MAX_AGE keeps them
+        self.addCleanup(gc.collect)
+        self.addCleanup(self.application.executor.shutdown)
+
+    async def fallback(self, scope, receive, send):
+        self.forwarded.append(scope['path'])
+        await send({'type': 'http.response.start', 'status': 204, 'headers': []})
+        await send({'type': 'http.response.body', 'body': b''})
+
+    def request(self, method, path, data=None, authorization=None):
+        body = json.dumps(data).encode() if data is not None else b''
+        headers = [(b'content-type', b'application/json')]
+        if authorization:
+            headers.append((b'authorization', authorization.encode()))
+        scope = {'type': 'http', 'http_version': '1.1', 'method': method, 'path': path, 'root_path': '',
+                 'query_string': b'', 'headers': headers, 'client': ('127.0.0.1', 50000)}
+        messages = []
+
+        async def receive():
+            return {'type': 'http.request', 'body': body, 'more_body': False}
+
+        async def send(message):
+            messages.append(message)
+        async_to_sync(self.application)(scope, receive, send)
+        body = b''.join(message.get('body', b'') for message in messages[1:])
+        return messages[0]['status'], json.loads(body.decode()) if body else None
+
+    def test_validity(self):
+        url = '/license/api/agreements/%d/validity' % self.agreement.id
+        self.assertEqual(self.request('GET', url, authorization=self.token), (200, {'is_valid': True}))
+        self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION=self.token).json(), {'is_valid': True})
+        self.assertEqual(self.request('GET', '/license/api/agreements/0/validity', authorization=self.token)[0], 404)
+        self.assertEqual(self.request('GET', url, authorization='Token unknown')[0], 401)
+        self.assertEqual(self.forwarded, [])
+
+        self.assertEqual(self.request('GET', url)[0], 204)
+        self.assertEqual(self.request('GET', '/license/api/agreements/', authorization=self.token)[0], 204)
+        self.assertEqual(self.forwarded, [url, '/license/api/agreements/'])
+
+    def test_bulk_validity(self):
+        url = '/license/api/agreements/validity'
+        data = {'ids': [self.agreement.id, self.agreement.id + 1],
+                'licenses': [{'licensee': 'licensee@example.com', 'software': 'Software'}]}
+        status, result = self.request('POST', url, data, authorization=self.token)
+        self.assertEqual(status, 200)
+        self.assertEqual(result, self.client.post(url, json.dumps(data), content_type='application/json',
+                                                  HTTP_AUTHORIZATION=self.token).json())
+        self.assertEqual(self.request('POST', url, {'ids': []}, authorization=self.token)[0], 400)
+        self.assertEqual(self.forwarded, [])
+
+
+class SeatActivationTest(TestCase):
+    """
+    Installations lease at most no_of_copies seats, lapsed leases free their seat.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.agreement = create_agreement(no_of_copies=2)
+        cls.user = User.objects.create_user('tester')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+        self.url = '/license/api/agreements/%d/seats' % self.agreement.id
+
+    def activate(self, installation_id):
+        return self.client.post(self.url, {'installation_id': installation_id}).status_code
+
+    def test_activation(self):
+        self.assertEqual(self.activate('one'), 201)
+        self.assertEqual(self.activate('one'), 200)
+        self.assertEqual(self.activate('two'), 201)
+        self.assertEqual(self.activate('three'), 409)
+        self.assertEqual(self.client.delete(self.url + '/two').status_code, 204)
+        self.assertEqual(self.client.delete(self.url + '/two').status_code, 404)
+        self.assertEqual(self.activate('three'), 201)
+
+        SeatActivation.objects.filter(installation_id='one').update(lease_expires_at=timezone.now())
+        self.assertEqual(self.activate('four'), 201)
+        self.assertEqual(set(SeatActivation.objects.values_list('installation_id', flat=True)), {'three', 'four'})
+
+        SeatActivation.objects.update(lease_expires_at=timezone.now())
+        out = StringIO()
+        call_command('reclaim_seats', stdout=out)
+        self.assertIn('2 lapsed seats reclaimed', out.getvalue())
+
+    def test_invalid_license(self):
+        SoftwareLicenseAgreement.objects.filter(id=self.agreement.id).bulk_set(status='Inactive')
+        self.assertEqual(self.activate('one'), 403)
+        self.assertEqual(self.client.post('/license/api/agreements/0/seats', {'installation_id': 'one'}).status_code,
+                         404)
+
+
+@skipUnless(connection.features.has_select_for_update, 'Needs row locks.')
+class ConcurrentSeatActivationTest(TransactionTestCase):
+    """
+    Concurrent activations do not lease more seats than the agreement has.
+    """
+    def test_concurrent_activations(self):
+        agreement = create_agreement(no_of_copies=5)
+        barrier = threading.Barrier(20)
+        granted = []
+
+        def activate(installation_id):
+            try:
+                barrier.wait()
+                activate_seat(agreement.id, installation_id)
+                granted.append(installation_id)
+            except NoSeatAvailable:
+                pass
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=activate, args=('installation-%d' % i,)) for i in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(granted), 5)
+        self.assertEqual(SeatActivation.objects.filter(agreement=agreement).count(), 5)
+
+
+class IPAllowlistTest(SimpleTestCase):
+    """
+    Allowlists match addresses, networks and ranges and fail closed on entries which are not valid.
+    """
+    def test_merge(self):
+        allowlist = IPAllowlist.parse('10.0.1.0/24, 10.0.0.0/24\n10.0.0.5, 10.0.2.0-10.0.2.9')
+        self.assertEqual(allowlist.starts[4], [int(ipaddress.ip_address('10.0.0.0'))])
+        self.assertEqual(allowlist.ends[4], [int(ipaddress.ip_address('10.0.2.9'))])
+        self.assertTrue(allowlist.allows('10.0.1.255'))
+        self.assertFalse(allowlist.allows('10.0.2.10'))
+
+    def test_networks_and_ranges(self):
+        allowlist = IPAllowlist.parse('192.168.1.10-192.168.1.20, 2001:db8::/32, 172.16.0.0/12')
+        self.assertTrue(allowlist.allows('192.168.1.15'))
+        self.assertFalse(allowlist.allows('192.168.1.21'))
+        self.assertTrue(allowlist.allows('2001:db8:ffff::1'))
+        self.assertFalse(allowlist.allows('2001:db9::1'))
+        self.assertTrue(allowlist.allows('172.31.255.255'))
+        self.assertTrue(allowlist.allows('::ffff:172.16.0.1'))
+        self.assertFalse(allowlist.allows('not an address'))
+
+    def test_invalid_entries_fail_closed(self):
+        self.assertTrue(IPAllowlist.parse('').allows('10.0.0.1'))
+        self.assertTrue(IPAllowlist.parse(None).allows('10.0.0.1'))
+        for text in ('192.168.1.*', '10.0.0.1 ; 10.0.0.2', 'office.example.com'):
+            with self.subTest(text=text):
+                self.assertFalse(IPAllowlist.parse(text).allows('10.0.0.1'))
+                self.assertFalse(IPAllowlist.parse(text).allows('192.168.1.1'))
+        allowlist = IPAllowlist.parse('10.0.0.1, 192.168.1.*')
+        self.assertTrue(allowlist.allows('10.0.0.1'))
+        self.assertFalse(allowlist.allows('192.168.1.1'))
+
+    def test_client_ip(self):
+        request = RequestFactory().get('/', HTTP_X_FORWARDED_FOR='1.1.1.1, 2.2.2.2', REMOTE_ADDR='3.3.3.3')
+        self.assertEqual(get_client_ip(request), '3.3.3.3')
+        with override_settings(LICENSE_TRUSTED_PROXIES=1):
+            self.assertEqual(get_client_ip(request), '2.2.2.2')
+        with override_settings(LICENSE_TRUSTED_PROXIES=2):
+            self.assertEqual(get_client_ip(request), '1.1.1.1')
+        with override_settings(LICENSE_TRUSTED_PROXIES=3):
+            self.assertEqual(get_client_ip(request), '3.3.3.3')
+
+
+class IPAllowlistValidityTest(TestCase):
+    """
+    Validity checks from addresses outside the allowlist are denied.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.agreement = create_agreement(valid_ip_addresses='10.0.0.0/8')
+        cls.user = User.objects.create_user('tester')
+
+    def setUp(self):
+        cache.clear()
+        local_validity_cache.clear()
+        self.client.force_login(self.user)
+        self.url = '/license/api/agreements/%d/validity' % self.agreement.id
+
+    def test_denied(self):
+        self.assertEqual(self.client.get(self.url, REMOTE_ADDR='10.1.2.3').json(), {'is_valid': True})
+        data = self.client.get(self.url, REMOTE_ADDR='192.168.1.1').json()
+        self.assertEqual((data['is_valid'], data['ip_allowed']), (False, False))
+        # only the trusted proxy's view of the client counts
+        data = self.client.get(self.url, REMOTE_ADDR='192.168.1.1', HTTP_X_FORWARDED_FOR='10.1.2.3').json()
+        self.assertFalse(data['ip_allowed'])
+
+    def test_unvalidated_allowlist_denied(self):
+        SoftwareLicenseAgreement.objects.filter(id=self.agreement.id).update(valid_ip_addresses='192.168.1.*')
+        data = self.client.get(self.url, REMOTE_ADDR='192.168.1.1').json()
+        self.assertEqual((data['is_valid'], data['ip_allowed']), (False, False))
+
+
+class FullTextSearchTest(TestCase):
+    """
+    Agreements are found by the words of their text fields, best matches first, and indexed again when they change.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.agreement = create_agreement(terms_and_conditions='Perpetual warranty of the software')
+        cls.parties = {'licensor': cls.agreement.licensor, 'licensee': cls.agreement.licensee,
+                       'software': cls.agreement.software}
+        cls.weaker = create_agreement(payment_plan='Perpetual payments', **cls.parties)
+        cls.other = create_agreement(terms_and_conditions='Subscription', **cls.parties)
+        cls.user = User.objects.create_user('tester', password='secret')
+
+    def search(self, terms):
+        return list(search(SoftwareLicenseAgreement.objects.all(), terms).values_list('id', flat=True))
+
+    def test_ranking(self):
+        self.assertEqual(self.search('perpetual'), [self.agreement.id, self.weaker.id])
+        self.assertEqual(self.search('perpetual warranty'), [self.agreement.id])
+        self.assertEqual(self.search('perpetual*'), [self.agreement.id, self.weaker.id])
+        self.assertEqual(self.search('unknown'), [])
+
+    def test_filter(self):
+        self.client.force_login(self.user)
+        response = self.client.get('/license/api/agreements/?search=perpetual')
+        self.assertEqual([agreement['id'] for agreement in response.json()['results']],
+                         [self.agreement.id, self.weaker.id])
+
+    def test_pages_of_search(self):
+        # ties and distinct ranks, the rank of a cursor has to find its row again on every database
+        for text in ('Perpetual', 'Perpetual', 'Perpetual perpetual licence', 'A perpetual and transferable licence'):
+            create_agreement(terms_and_conditions=text, **self.parties)
+        create_agreement(termination='Perpetual unless terminated', **self.parties)
+        expected = list(search(SoftwareLicenseAgreement.objects.all(), 'perpetual')\
+                        .order_by('-search_rank', '-created_at', '-id').values_list('id', flat=True))
+        self.assertEqual(len(expected), 7)
+        self.client.force_login(self.user)
+        ids = []
+        url = '/license/api/agreements/?search=perpetual&page_size=2'
+        while url:
+            data = self.client.get(url).json()
+            self.assertLessEqual(len(ids), len(expected), 'next links do not end')
+            ids.extend(agreement['id'] for agreement in data['results'])
+            url = data['next']
+        self.assertEqual(ids, expected)
+
+    def test_indexed_on_save(self):
+        self.agreement.terms_and_conditions = 'Renewed yearly'
+        self.agreement.save()
+        self.assertEqual(self.search('perpetual'), [self.weaker.id])
+        self.assertEqual(self.search('renewed'), [self.agreement.id])
+
+    def test_bulk_changes_indexed(self):
+        queryset = SoftwareLicenseAgreement.objects.filter(id=self.other.id, terms_and_conditions='Subscription')
+        update_search_documents(queryset, {'terms_and_conditions': 'Perpetual subscription'})
+        queryset.update(terms_and_conditions='Perpetual subscription')
+        self.assertEqual(self.search('subscription'), [self.other.id])
+        self.assertEqual(set(self.search('perpetual')), {self.agreement.id, self.weaker.id, self.other.id})
+
+        created = SoftwareLicenseAgreement.objects.bulk_create([
+            SoftwareLicenseAgreement(effective_date=date(2018, 1, 1), terms_and_conditions='Bulk created',
+                                     expiry_date=date(2030, 1, 1), no_of_copies=1, delivery_date=date(2018, 1, 1),
+                                     **self.parties)])
+        self.assertEqual(self.search('bulk'), [])
+        index_new_documents(connection)
+        self.assertEqual(len(self.search('bulk')), len(created))
+
+
+class LicenseTokenTest(TestCase):
+    """
+    Signed license tokens verify offline against the published keys, also across a key rotation.
+    """
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.key_dir = tempfile.TemporaryDirectory()
+        for kid in ('old', 'new'):
+            call_command('generate_license_token_key', os.path.join(cls.key_dir.name, kid + '.pem'), stdout=StringIO())
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.key_dir.cleanup()
+        super().tearDownClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.agreement = create_agreement()
+        cls.user = User.objects.create_user('tester', password='secret')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def keys(self, *kids):
+        return [{'kid': kid, 'private_key_file': os.path.join(self.key_dir.name, kid + '.pem')} for kid in kids]
+
+    def issue(self, agreement=None):
+        response = self.client.post('/license/api/agreements/%d/token' % (agreement or self.agreement).id)
+        self.assertEqual(response.status_code, 200)
+        return response.json()['token']
+
+    def write_key_set(self):
+        path = os.path.join(self.key_dir.name, 'keys.json')
+        with open(path, 'wb') as f:
+            f.write(self.client.get('/license/api/keys').content)
+        return 'file://' + path
+
+    def test_issue_and_verify(self):
+        with override_settings(LICENSE_TOKEN_SIGNING_KEYS=self.keys('new')):
+            token = self.issue()
+            verifier = LicenseTokenVerifier(self.client.get('/license/api/keys').json())
+        claims = verifier.verify(token, software='Software')
+        self.assertEqual((claims['sub'], claims['licensee']), (str(self.agreement.id), 'licensee@example.com'))
+        with self.assertRaises(LicenseTokenError):
+            verifier.verify(token, software='Other')
+        with self.assertRaises(LicenseTokenError):
+            verifier.verify(token[:-4] + ('AAAA' if not token.endswith('AAAA') else 'BBBB'))
+
+    def test_expiry(self):
+        today = timezone.localdate()
+        agreement = create_agreement(expiry_date=today, licensor=self.agreement.licensor,
+                                     licensee=self.agreement.licensee, software=self.agreement.software)
+        with override_settings(LICENSE_TOKEN_SIGNING_KEYS=self.keys('new')):
+            token = self.issue(agreement)
+            verifier = LicenseTokenVerifier(self.client.get('/license/api/keys').json())
+            with override_settings(LICENSE_TOKEN_LIFETIME=-10):
+                lapsed = self.issue()
+        midnight = timezone.make_aware(datetime.combine(today + timedelta(days=1), datetime.min.time()))
+        self.assertEqual(verifier.verify(token)['exp'], int(midnight.timestamp()))
+        with self.assertRaisesRegex(LicenseTokenError, 'expired'):
+            verifier.verify(token, today=today + timedelta(days=1))
+        with self.assertRaisesRegex(LicenseTokenError, 'expired'):
+            verifier.verify(lapsed)
+
+    def test_key_rotation(self):
+        with override_settings(LICENSE_TOKEN_SIGNING_KEYS=self.keys('old')):
+            old_token = self.issue()
+            verifier = LicenseTokenVerifier.from_url(self.write_key_set())
+        with override_settings(LICENSE_TOKEN_SIGNING_KEYS=self.keys('new', 'old')):
+            new_token = self.issue()
+            self.write_key_set()
+        self.assertEqual(verifier.verify(old_token)['sub'], str(self.agreement.id))
+        # the key set was fetched a moment ago, the new key is not looked up yet
+        with self.assertRaisesRegex(LicenseTokenError, 'unknown key'):
+            verifier.verify(new_token)
+        verifier.fetched_at -= verifier.refetch_interval
+        self.assertEqual(verifier.verify(new_token)['sub'], str(self.agreement.id))
+        self.assertEqual(verifier.verify(old_token)['sub'], str(self.agreement.id))
+
+    def test_not_configured(self):
+        with override_settings(LICENSE_TOKEN_SIGNING_KEYS=[]):
+            self.assertEqual(self.client.post('/license/api/agreements/%d/token' % self.agreement.id).status_code,
+                             503)
+            self.assertEqual(self.client.get('/license/api/keys').status_code, 503)
+            self.assertEqual([message.id for message in check_signing_keys(None)], ['license_agreement.W001'])
+        with override_settings(LICENSE_TOKEN_SIGNING_KEYS=self.keys('missing')):
+            self.assertEqual([message.id for message in check_signing_keys(None)], ['license_agreement.E001'])
+        with override_settings(LICENSE_TOKEN_SIGNING_KEYS=self.keys('new')):
+            self.assertEqual(check_signing_keys(None), [])
+
+
+class BulkValidityTest(TestCase):
+    """
+    Bulk validity checks by agreement id and by licensee and software, with the best agreement of each pair.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.best = create_agreement(expiry_date=date(2031, 1, 1))
+        parties = {'licensor': cls.best.licensor, 'licensee': cls.best.licensee}
+        cls.others = [create_agreement(software=cls.best.software, expiry_date=date(2030, 1, 1), **parties),
+                      create_agreement(software=cls.best.software, expiry_date=date(2040, 1, 1), status='Expired',
+                                       **parties)]
+        software = Software.objects.create(name='Other')
+        # only invalid agreements, the one expiring last is reported and deleted ones are left out
+        cls.inactive = create_agreement(software=software, expiry_date=date(2040, 1, 1), status='Inactive',
+                                        **parties)
+        create_agreement(software=software, expiry_date=date(2000, 1, 1), **parties)
+        create_agreement(software=software, expiry_date=date(2050, 1, 1), **parties).delete()
+        cls.user = User.objects.create_user('tester', password='secret')
+
+    def setUp(self):
+        cache.clear()
+        local_validity_cache.clear()
+        self.client.force_login(self.user)
+
+    def check(self, data):
+        return self.client.post('/license/api/agreements/validity', json.dumps(data), content_type='application/json')
+
+    def test_ids(self):
+        ids = [self.best.id, self.others[1].id, self.inactive.id]
+        with self.assertNumQueries(1):
+            validities = get_license_validities(ids + [0])
+        self.assertEqual({agreement_id: validity and validity['status'] for agreement_id, validity in
+                          validities.items()}, {self.best.id: 'Active', self.others[1].id: 'Expired',
+                                                self.inactive.id: 'Inactive', 0: None})
+        with self.assertNumQueries(0):
+            get_license_validities(ids)
+
+        unknown = SoftwareLicenseAgreement.objects.order_by('-id').first().id + 1
+        response = self.check({'ids': ids + [unknown]})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'agreements': {
+            str(self.best.id): {'is_valid': True, 'expiry_date': '2031-01-01', 'status': 'Active'},
+            str(self.others[1].id): {'is_valid': False, 'expiry_date': '2040-01-01', 'status': 'Expired'},
+            str(self.inactive.id): {'is_valid': False, 'expiry_date': '2040-01-01', 'status': 'Inactive'},
+            str(unknown): None}})
+
+    def test_best_agreement_per_pair(self):
+        pairs = [{'licensee': 'licensee@example.com', 'software': 'Software'},
+                 {'licensee': 'licensee@example.com', 'software': 'Other'},
+                 {'licensee': 'nobody@example.com', 'software': 'Software'}]
+        response = self.check({'licenses': pairs})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'licenses': [
+            dict(pairs[0], id=self.best.id, is_valid=True, expiry_date='2031-01-01', status='Active'),
+            dict(pairs[1], id=self.inactive.id, is_valid=False, expiry_date='2040-01-01', status='Inactive'),
+            dict(pairs[2], id=None, is_valid=False)]})
+
+    def test_refused(self):
+        self.assertEqual(self.check({}).status_code, 400)
+        with self.settings(BULK_VALIDITY_MAX_ITEMS=2):
+            self.assertEqual(self.check({'ids': [1, 2, 3]}).status_code, 400)
+        self.client.logout()
+        self.assertIn(self.check({'ids': [self.best.id]}).status_code, (401, 403))
+
+
+class ValidityCacheTest(TransactionTestCase):
+    """
+    Validity lookups are served from the cache until the agreement changes, and not past midnight on its expiry date.
+    """
+    def setUp(self):
+        cache.clear()
+        local_validity_cache.clear()
+        self.agreement = create_agreement()
+
+    def test_hit_and_miss(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(get_license_validity(self.agreement.id)['status'], 'Active')
+        with self.assertNumQueries(0):
+            self.assertEqual(get_license_validity(self.agreement.id)['status'], 'Active')
+        # from the shared cache once the local entry is gone
+        local_validity_cache.clear()
+        with self.assertNumQueries(0):
+            self.assertTrue(get_license_validity(self.agreement.id)['is_valid'])
+
+    def test_missing_cached(self):
+        with self.assertNumQueries(1):
+            self.assertIsNone(get_license_validity(0))
+        local_validity_cache.clear()
+        with self.assertNumQueries(0):
+            self.assertIsNone(get_license_validity(0))
+
+    def test_invalidated_on_save(self):
+        get_license_validity(self.agreement.id)
+        self.agreement.status = 'Inactive'
+        self.agreement.save()
+        self.assertEqual(get_license_validity(self.agreement.id)['status'], 'Inactive')
+        self.agreement.expiry_date = date(2031, 1, 1)
+        self.agreement.save()
+        self.assertEqual(get_license_validity(self.agreement.id)['expiry_date'], date(2031, 1, 1))
+
+    def test_invalidated_on_soft_delete(self):
+        other = create_agreement(licensor=self.agreement.licensor, licensee=self.agreement.licensee,
+                                 software=self.agreement.software)
+        get_license_validity(self.agreement.id)
+        get_license_validity(other.id)
+        self.agreement.delete()
+        SoftwareLicenseAgreement.objects.filter(id=other.id).delete()
+        for agreement in (self.agreement, other):
+            self.assertEqual(get_license_validity(agreement.id)['status'], 'Delete')
+            self.assertFalse(get_license_validity(agreement.id)['is_valid'])
+
+    def test_kept_on_rollback(self):
+        get_license_validity(self.agreement.id)
+        with self.assertRaises(ValueError):
+            with transaction.atomic():
+                self.agreement.status = 'Inactive'
+                self.agreement.save()
+                raise ValueError
+        with self.assertNumQueries(0):
+            self.assertEqual(get_license_validity(self.agreement.id)['status'], 'Active')
+
+    @override_settings(VALIDITY_CACHE_TIMEOUT=48*60*60)
+    def test_timeout_capped_at_midnight(self):
+        today = timezone.localdate()
+        midnight = timezone.make_aware(datetime.combine(today + timedelta(days=1), datetime.min.time()))
+        remaining = (midnight - timezone.now()).total_seconds()
+        timeout = validity_timeout(build_license_validity('Active', today))
+        self.assertLessEqual(timeout, max(1, remaining))
+        self.assertGreaterEqual(timeout, remaining - 5)
+        self.assertEqual(validity_timeout(build_license_validity('Active', today + timedelta(days=3))), 48*60*60)
+        # invalid licenses do not turn valid at midnight
+        self.assertEqual(validity_timeout(build_license_validity('Inactive', today)), 48*60*60)
+
+
+class KeysetPaginationTest(TestCase):
+    """
+    Cursor pages walk forward and back over tied and null values without skipping or repeating rows.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        first = create_agreement(warrenty_period=None)
+        parties = {'licensor': first.licensor, 'licensee': first.licensee, 'software': first.software}
+        cls.agreements = [first] + [create_agreement(warrenty_period=period, **parties)
+                                    for period in (30, 30, None, 10, 30, None)]
+        cls.user = User.objects.create_user('tester', password='secret')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def walk(self, url, link):
+        pages = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            pages.append([agreement['id'] for agreement in response.json()['results']])
+            url = response.json()[link]
+        return pages
+
+    def expected(self, descending):
+        agreements = sorted(self.agreements, key=lambda agreement: (-agreement.created_at.timestamp(), -agreement.id))
+        with_period = sorted([agreement for agreement in agreements if agreement.warrenty_period is not None],
+                             key=lambda agreement: agreement.warrenty_period, reverse=descending)
+        return [agreement.id for agreement in with_period + [agreement for agreement in agreements
+                                                             if agreement.warrenty_period is None]]
+
+    def test_forward_and_back(self):
+        for ordering, descending in (('warrenty_period', False), ('-warrenty_period', True)):
+            pages = self.walk('/license/api/agreements/?page_size=2&ordering=' + ordering, 'next')
+            self.assertEqual([len(page) for page in pages], [2, 2, 2, 1])
+            self.assertEqual(sum(pages, []), self.expected(descending), ordering)
+
+            response = self.client.get('/license/api/agreements/?page_size=2&ordering=' + ordering)
+            last = response.json()['next']
+            while self.client.get(last).json()['next']:
+                last = self.client.get(last).json()['next']
+            back = self.walk(self.client.get(last).json()['previous'], 'previous')
+            self.assertEqual(sum(reversed(back), []), self.expected(descending)[:-1], ordering)
+
+    def test_tampered_cursor(self):
+        url = self.client.get('/license/api/agreements/?page_size=2').json()['next']
+        cursor = json.loads(base64.urlsafe_b64decode(parse_qs(urlparse(url).query)['cursor'][0]).decode())
+        for tampered in ('not-base64!', base64.urlsafe_b64encode(b'[1, 2]').decode(),
+                         dict(cursor, v=['yesterday', 'abc']), dict(cursor, v=[{'id': 1}, 1]),
+                         dict(cursor, o=['id']), dict(cursor, r=2)):
+            if isinstance(tampered, dict):
+                tampered = base64.urlsafe_b64encode(json.dumps(tampered).encode()).decode()
+            response = self.client.get('/license/api/agreements/?page_size=2&cursor=' + tampered)
+            self.assertEqual(response.status_code, 404, tampered)
+
+
+
+class ExportTest(TestCase):
+    """
+    Exports stream the filtered agreements with joined names, cells spreadsheets would evaluate are defused.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.agreement = create_agreement(valid_ip_addresses='=HYPERLINK("http://example.com")')
+        address = cls.agreement.licensor.address
+        licensor = Licensor.objects.create(first_name='Other', last_name='Licensor', mobile='+919999999993',
+                                           email='other@example.com', address=address)
+        cls.other = create_agreement(licensor=licensor, licensee=cls.agreement.licensee,
+                                     software=cls.agreement.software, status='Expired')
+        cls.user = User.objects.create_user('tester', password='secret')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def read_csv(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertTrue(response['Content-Disposition'].endswith('.csv"'))
+        return list(csv.reader(StringIO(b''.join(response.streaming_content).decode('utf-8'))))
+
+    def test_csv(self):
+        rows = self.read_csv('/license/agreements/export/')
+        header = rows[0]
+        self.assertEqual(header[:3], ['ID', 'Licensor', 'Licensor Name'])
+        by_id = {int(row[0]): dict(zip(header, row)) for row in rows[1:]}
+        self.assertEqual(set(by_id), {self.agreement.id, self.other.id})
+        row = by_id[self.agreement.id]
+        self.assertEqual(row['Licensor Name'], 'Licensor One')
+        self.assertEqual(row['Licensee Name'], 'Licensee One')
+        self.assertEqual(row['Expiry Date'], '2030-01-01')
+        self.assertEqual(row['Valid IP Addresses'], '\'=HYPERLINK("http://example.com")')
+        self.assertEqual(by_id[self.other.id]['Licensor Name'], 'Other Licensor')
+
+    def test_api_filters(self):
+        rows = self.read_csv('/license/api/agreements/export/?status=Expired')
+        self.assertEqual([int(row[0]) for row in rows[1:]], [self.other.id])
+        rows = self.read_csv('/license/api/agreements/export/?licensor=%d' % self.agreement.licensor_id)
+        self.assertEqual([int(row[0]) for row in rows[1:]], [self.agreement.id])
+        self.assertEqual(self.client.get('/license/api/agreements/export/?file_format=pdf').status_code, 400)
+
+    def test_xlsx(self):
+        response = self.client.get('/license/api/agreements/export/?file_format=xlsx&status=Active')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertTrue(response['Content-Disposition'].endswith('.xlsx"'))
+        archive = zipfile.ZipFile(BytesIO(b''.join(response.streaming_content)))
+        self.assertIsNone(archive.testzip())
+        namespace = {'main': 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'}
+        sheet = ElementTree.fromstring(archive.read('xl/worksheets/sheet1.xml'))
+        rows = [[cell.findtext('main:v', namespaces=namespace) or cell.findtext('main:is/main:t', namespaces=namespace)
+                 for cell in row] for row in sheet.iterfind('main:sheetData/main:row', namespace)]
+        self.assertEqual(len(rows), 2)
+        row = dict(zip(rows[0], rows[1]))
+        self.assertEqual(row['ID'], str(self.agreement.id))
+        self.assertEqual(row['Licensor Name'], 'Licensor One')
+        # inline strings are never evaluated, so the text is kept as it is
+        self.assertEqual(row['Valid IP Addresses'], '=HYPERLINK("http://example.com")')
+        self.assertEqual(sheet.find('main:sheetData/main:row/main:c[3]', namespace).get('t'), 'inlineStr')
+
+
+class DataTablesTest(TestCase):
+    """
+    The server side processing views page, order and search in the database.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        address = Address.objects.create(city_or_village='Pune', state='Maharashtra', country='India', zip_code=411001)
+        cls.licensors = [Licensor.objects.create(first_name=first_name, last_name=last_name, email=email,
+                                                 mobile='+9199999999%02d' % i, address=address)
+                         for i, (first_name, last_name, email) in enumerate((
+                             ('John', 'Smith', 'john@example.com'),
+                             ('Jane', 'Smith', 'jane@example.com'),
+                             ('John', 'Doe', 'doe@example.com'),
+                             ('<b>Bold</b>', 'Smithson', 'bold@example.com')))]
+        cls.user = User.objects.create_user('tester', password='secret')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def get(self, url, **params):
+        response = self.client.get(url, dict({'draw': 3}, **params))
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_search_words_across_fields(self):
+        data = self.get('/license/licensors/data/', **{'search[value]': ' john  smith '})
+        self.assertEqual(data['recordsTotal'], 4)
+        self.assertEqual(data['recordsFiltered'], 1)
+        self.assertEqual([row[0] for row in data['data']], ['John Smith'])
+        data = self.get('/license/licensors/data/', **{'search[value]': 'smith'})
+        self.assertEqual(data['recordsFiltered'], 3)
+
+    def test_search_agreements_by_party_name(self):
+        agreement = create_agreement()
+        create_agreement(licensor=self.licensors[0], licensee=agreement.licensee, software=agreement.software)
+        data = self.get('/license/agreements/data/', **{'search[value]': 'John Smith'})
+        self.assertEqual(data['recordsTotal'], 2)
+        self.assertEqual([row[0] for row in data['data']], ['John Smith'])
+
+    def test_paging_and_ordering(self):
+        data = self.get('/license/licensors/data/', start=1, length=2, **{'order[0][column]': 0,
+                                                                          'order[0][dir]': 'desc'})
+        self.assertEqual(data['draw'], 3)
+        self.assertEqual(data['recordsFiltered'], 4)
+        self.assertEqual([row[0] for row in data['data']], ['John Doe', 'Jane Smith'])
+        # cells are escaped, the last cell holds the action links
+        data = self.get('/license/licensors/data/', **{'search[value]': 'bold'})
+        self.assertEqual(data['data'][0][0], '&lt;b&gt;Bold&lt;/b&gt; Smithson')
+        self.assertIn('/license/licensor/%d/edit/' % self.licensors[3].id, data['data'][0][-1])
+
+    def test_list_page_leaves_big_tables_to_server(self):
+        response = self.client.get('/license/licensors/')
+        self.assertFalse(response.context['server_side'])
+        self.assertEqual(len(response.context['object_list']), 4)
+        with self.settings(DATATABLES_CLIENT_SIDE_LIMIT=2):
+            response = self.client.get('/license/licensors/')
+        self.assertTrue(response.context['server_side'])
+        self.assertEqual(response.context['data_url'], '/license/licensors/data/')
+        self.assertEqual(len(response.context['object_list']), 0)
+
+
+class PartyImportTest(TestCase):
+    """
+    CSV and JSON lines imports report failing rows by line and keep importing.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        address = Address.objects.create(city_or_village='Pune', state='Maharashtra', country='India', zip_code=411001)
+        cls.existing = Licensor.objects.create(first_name='Taken', last_name='One', mobile='+919999999900',
+                                               email='taken@example.com', address=address)
+        cls.user = User.objects.create_user('tester', password='secret')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def upload(self, name, content, url='/license/api/licensors/import/'):
+        return self.client.post(url, {'file': SimpleUploadedFile(name, content)})
+
+    def test_csv(self):
+        content = '\n'.join([
+            'first_name,last_name,mobile,email,city_or_village,state,country,zip_code',
+            'Ann,Lee,+919999999901,ann@example.com,Pune,Maharashtra,India,411001',
+            'Bad,Email,+919999999902,not-an-email,Pune,Maharashtra,India,411001',
+            'Dup,Row,+919999999903,ann@example.com,Pune,Maharashtra,India,411001',
+            'Old,Row,+919999999904,taken@example.com,Pune,Maharashtra,India,411001',
+            'Bob,Ray,+919999999905,bob@example.com,Mumbai,Maharashtra,India,400001',
+        ]).encode('utf-8-sig')
+        with self.settings(IMPORT_CHUNK_SIZE=2):
+            response = self.upload('licensors.csv', content)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual((data['created'], data['failed']), (2, 3))
+        self.assertEqual([error['line'] for error in data['errors']], [3, 4, 5])
+        self.assertIn('email', data['errors'][0]['errors'])
+        self.assertEqual(Licensor.objects.get(email='bob@example.com').address.city_or_village, 'Mumbai')
+        self.assertEqual(get_dashboard_counts()['licensors_count'], 3)
+
+    def test_jsonl(self):
+        content = '\n'.join([
+            json.dumps({'first_name': 'Ann', 'last_name': 'Lee', 'mobile': '+919999999901', 'email': 'ann@example.com',
+                        'address': {'city_or_village': 'Pune', 'state': 'Maharashtra', 'country': 'India',
+                                    'zip_code': 411001}}),
+            '',
+            '{not json',
+            '[1, 2]',
+            json.dumps({'first_name': 'Bob', 'mobile': '+919999999905', 'email': 'bob@example.com'}),
+        ]).encode('utf-8')
+        data = self.upload('licensees.jsonl', content, '/license/api/licensees/import/').json()
+        self.assertEqual((data['created'], data['failed']), (1, 3))
+        self.assertEqual([error['line'] for error in data['errors']], [3, 4, 5])
+        self.assertEqual(set(data['errors'][2]['errors']), {'last_name', 'address'})
+        self.assertTrue(Licensee.objects.filter(email='ann@example.com', address__state='Maharashtra').exists())
+
+    def test_unreadable_file(self):
+        content = 'first_name,last_name\nJos\xe9,Lee\n'.encode('latin-1')
+        response = self.upload('licensors.csv', content)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['file'], ['The file is not UTF-8 encoded.'])
+        self.assertEqual(self.upload('licensors.txt', b'').status_code, 400)
+
+    def test_chunk_falls_back_to_rows(self):
+        address = {'city_or_village': 'Pune', 'state': 'Maharashtra', 'country': 'India', 'zip_code': 411001}
+        rows = [(line, {'first_name': 'Row', 'last_name': str(line), 'mobile': '+91999999991%d' % line,
+                        'email': email, 'address': dict(address)})
+                for line, email in ((2, 'one@example.com'), (3, 'taken@example.com'), (4, 'two@example.com'))]
+        result = ImportResult()
+        # duplicates are dropped before a chunk is saved, a row conflicting anyway fails the bulk insert
+        save_chunk(Licensor, rows, result)
+        self.assertEqual(result.as_dict(), {'created': 2, 'failed': 1, 'errors_truncated': False, 'errors': [
+            {'line': 3, 'errors': {'non_field_errors': ['Row conflicts with an existing row.']}}]})
+        self.assertEqual(set(Licensor.objects.filter(first_name='Row').values_list('email', flat=True)),
+                         {'one@example.com', 'two@example.com'})
+        self.assertEqual(Address.objects.count(), 3)
+        self.assertEqual(get_dashboard_counts()['licensors_count'], 3)
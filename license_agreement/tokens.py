@@ -0,0 +1,116 @@
+"""
+Issue signed license tokens which clients can verify offline.
+
+Tokens are RS256 signed JWTs. The private keys are configured in
+LICENSE_TOKEN_SIGNING_KEYS, the first key signs new tokens and every key is
+published in the key set so that tokens signed before a key rotation keep
+verifying until they expire. Without keys the token endpoints answer 503 and
+the system check license_agreement.W001 warns about it.
+"""
+import json
+from datetime import datetime as dt, timedelta
+
+import jwt
+from jwt.algorithms import RSAAlgorithm
+
+from django.conf import settings
+from django.core import checks
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import setting_changed
+from django.utils import timezone
+
+from license_agreement.ipallowlist import split_entries
+
+ALGORITHM = 'RS256'
+
+_signing_keys = None
+
+
+class SigningKeysNotConfigured(ImproperlyConfigured):
+    pass
+
+
+def get_signing_keys():
+    """
+    Returns the configured signing keys as (kid, private key) tuples.
+    """
+    global _signing_keys
+    if _signing_keys is None:
+        algorithm = RSAAlgorithm(RSAAlgorithm.SHA256)
+        keys = []
+        for config in settings.LICENSE_TOKEN_SIGNING_KEYS:
+            pem = config.get('private_key')
+            if pem is None:
+                with open(config['private_key_file'], 'rb') as key_file:
+                    pem = key_file.read()
+            keys.append((config['kid'], algorithm.prepare_key(pem)))
+        _signing_keys = keys
+    if not _signing_keys:
+        raise SigningKeysNotConfigured('LICENSE_TOKEN_SIGNING_KEYS must contain at least one key to issue license '
+                                       'tokens.')
+    return _signing_keys
+
+
+def reset_signing_keys(setting, **kwargs):
+    global _signing_keys
+    if setting == 'LICENSE_TOKEN_SIGNING_KEYS':
+        _signing_keys = None
+
+
+setting_changed.connect(reset_signing_keys)
+
+
+def check_signing_keys(app_configs, **kwargs):
+    """
+    Warns when no signing keys are configured and fails when they can not be loaded.
+    """
+    if not settings.LICENSE_TOKEN_SIGNING_KEYS:
+        return [checks.Warning('LICENSE_TOKEN_SIGNING_KEYS is empty, license tokens can not be issued.',
+                               hint='Create a key with `manage.py generate_license_token_key` and add it.',
+                               id='license_agreement.W001')]
+    try:
+        get_signing_keys()
+    except Exception as e:
+        return [checks.Error('The keys of LICENSE_TOKEN_SIGNING_KEYS can not be loaded: {}'.format(e),
+                             id='license_agreement.E001')]
+    return []
+
+
+def get_public_key_set():
+    """
+    Returns the public keys of all signing keys as a JSON Web Key Set.
+    """
+    keys = []
+    for kid, private_key in get_signing_keys():
+        key = json.loads(RSAAlgorithm.to_jwk(private_key.public_key()))
+        key.update({'kid': kid, 'alg': ALGORITHM, 'use': 'sig'})
+        keys.append(key)
+    return {'keys': keys}
+
+
+def issue_license_token(agreement):
+    """
+    Returns a signed token for the agreement and its expiry time.
+
+    The token never outlives the agreement, it expires at midnight on the
+    expiry date at the latest.
+    """
+    kid, private_key = get_signing_keys()[0]
+    now = timezone.now()
+    expires_at = min(now + timedelta(seconds=settings.LICENSE_TOKEN_LIFETIME),
+                     timezone.make_aware(dt.combine(agreement.expiry_date + timedelta(days=1), dt.min.time())))
+    claims = {
+        'iss': settings.LICENSE_TOKEN_ISSUER,
+        'sub': str(agreement.id),
+        'iat': int(now.timestamp()),
+        'exp': int(expires_at.timestamp()),
+        'licensee': agreement.licensee.email,
+        'software': agreement.software.name,
+        'expiry_date': agreement.expiry_date.isoformat(),
+        'no_of_copies': agreement.no_of_copies,
+        'valid_ip_addresses': split_entries(agreement.valid_ip_addresses),
+    }
+    token = jwt.encode(claims, private_key, algorithm=ALGORITHM, headers={'kid': kid})
+    if isinstance(token, bytes):
+        token = token.decode('ascii')
+    return token, expires_at
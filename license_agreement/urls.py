@@ -13,21 +13,26 @@ urlpatterns = [
     path('user/<int:pk>/delete/', DeleteUserView.as_view(), name='delete_user'),
 
     path('licensors/', ListLicensorsView.as_view(), name='list_licensors'),
+    path('licensors/data/', LicensorsDataView.as_view(), name='licensors_data'),
     path('licensor/add/', CreateLicensorView.as_view(), name='add_licensor'),
     path('licensor/<int:pk>/edit/', UpdateLicensorView.as_view(), name='update_licensor'),
     path('licensor/<int:pk>/delete/', DeleteLicensorView.as_view(), name='delete_licensor'),
 
     path('licensees/', ListLicenseesView.as_view(), name='list_licensees'),
+    path('licensees/data/', LicenseesDataView.as_view(), name='licensees_data'),
     path('licensee/add/', CreateLicenseeView.as_view(), name='add_licensee'),
     path('licensee/<int:pk>/edit/', UpdateLicenseeView.as_view(), name='update_licensee'),
     path('licensee/<int:pk>/delete/', DeleteLicenseeView.as_view(), name='delete_licensee'),
 
     path('softwares/', ListSoftwaresView.as_view(), name='list_softwares'),
+    path('softwares/data/', SoftwaresDataView.as_view(), name='softwares_data'),
     path('software/add/', CreateSoftwareView.as_view(), name='add_software'),
     path('software/<int:pk>/edit/', UpdateSoftwareView.as_view(), name='update_software'),
     path('software/<int:pk>/delete/', DeleteSoftwareView.as_view(), name='delete_software'),
 
     path('agreements/', ListSoftwareLicenseAgreementsView.as_view(), name='list_agreements'),
+    path('agreements/data/', SoftwareLicenseAgreementsDataView.as_view(), name='agreements_data'),
+    path('agreements/export/', ExportSoftwareLicenseAgreementsView.as_view(), name='export_agreements'),
     path('agreement/add/', CreateSoftwareLicenseAgreementView.as_view(), name='add_agreement'),
     path('agreement/<int:pk>/edit/', UpdateSoftwareLicenseAgreementView.as_view(), name='update_agreement'),
     path('agreement/<int:pk>/delete/', DeleteSoftwareLicenseAgreementView.as_view(), name='delete_agreement'),
@@ -0,0 +1,89 @@
+"""
+Offline verification of signed license tokens.
+
+This module only depends on PyJWT (with cryptography for RS256) and the
+standard library so that client applications can embed it as is:
+
+    verifier = LicenseTokenVerifier.from_url('https://licensing.example.com/license/api/keys')
+    claims = verifier.verify(token, software='My Software')
+
+Keys are looked up by the ``kid`` header of the token. When a token is signed
+with an unknown key the key set is fetched again, which picks up keys
+published by a rotation on the server. It is fetched at most once every
+``refetch_interval`` seconds, so that tokens with made up key ids can not make
+each verification a request to the server.
+"""
+import json
+import time
+from datetime import date
+from urllib.request import urlopen
+
+import jwt
+from jwt.algorithms import RSAAlgorithm
+
+ALGORITHM = 'RS256'
+DEFAULT_ISSUER = 'SoftwareLicensing'
+
+
+class LicenseTokenError(Exception):
+    """
+    Raised when a license token is not valid.
+    """
+
+
+class LicenseTokenVerifier(object):
+    """
+    Verifies license tokens against a published key set.
+    """
+    def __init__(self, key_set, issuer=DEFAULT_ISSUER, leeway=0, key_set_url=None, timeout=10, refetch_interval=300):
+        self.issuer = issuer
+        self.leeway = leeway
+        self.key_set_url = key_set_url
+        self.timeout = timeout
+        self.refetch_interval = refetch_interval
+        self.keys = self.load_keys(key_set)
+        self.fetched_at = time.monotonic()
+
+    @classmethod
+    def from_url(cls, key_set_url, **kwargs):
+        return cls(fetch_key_set(key_set_url, kwargs.get('timeout', 10)), key_set_url=key_set_url, **kwargs)
+
+    @staticmethod
+    def load_keys(key_set):
+        if isinstance(key_set, (str, bytes)):
+            key_set = json.loads(key_set)
+        return {key['kid']: RSAAlgorithm.from_jwk(json.dumps(key)) for key in key_set['keys']
+                if key.get('alg', ALGORITHM) == ALGORITHM}
+
+    def get_key(self, kid):
+        if kid not in self.keys and self.key_set_url and\
+                time.monotonic() - self.fetched_at >= self.refetch_interval:
+            self.fetched_at = time.monotonic()
+            self.keys = self.load_keys(fetch_key_set(self.key_set_url, self.timeout))
+        try:
+            return self.keys[kid]
+        except KeyError:
+            raise LicenseTokenError('License token is signed with an unknown key.')
+
+    def verify(self, token, software=None, today=None):
+        """
+        Returns the claims of a valid token, raises LicenseTokenError otherwise.
+        """
+        try:
+            header = jwt.get_unverified_header(token)
+            claims = jwt.decode(token, self.get_key(header.get('kid')), algorithms=[ALGORITHM],
+                                issuer=self.issuer, leeway=self.leeway)
+        except jwt.InvalidTokenError as e:
+            raise LicenseTokenError('License token is not valid: {}'.format(e))
+
+        if software is not None and claims.get('software') != software:
+            raise LicenseTokenError('License token is issued for another software.')
+        today = today or date.today()
+        if today.isoformat() > claims['expiry_date']:
+            raise LicenseTokenError('License has expired.')
+        return claims
+
+
+def fetch_key_set(key_set_url, timeout=10):
+    with urlopen(key_set_url, timeout=timeout) as response:
+        return json.loads(response.read().decode('utf-8'))
@@ -6,11 +6,14 @@ from django.views.generic import ListView
 from django.urls import reverse_lazy, reverse
 from django.views.generic.edit import CreateView, UpdateView, DeleteView
 from django.contrib.messages.views import SuccessMessageMixin
-from django.http import HttpResponseRedirect
+from django.http import HttpResponseRedirect, HttpResponseBadRequest
 from django.shortcuts import render, redirect
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib import messages
 
+from license_agreement.counters import get_dashboard_counts
+from license_agreement.datatables import ServerSideListMixin, DataTablesView
+from license_agreement.export import export_agreements, EXPORT_FORMATS
 from license_agreement.models import *
 
 logger = logging.getLogger('licensing_log')
@@ -20,14 +23,13 @@ class DashboardView(LoginRequiredMixin, View):
     """
     Dashboard
     """
+    read_from_replica = True
+
     def get(self, request):
         """
           dashboard
         """
-        data = { "licensors_count" : Licensor.objects.exclude(status='Delete').count(),
-        "licensees_count" : Licensee.objects.exclude(status='Delete').count(),
-        "softwares_count" : Software.objects.exclude(status='Delete').count(),
-        "licenses_count" : SoftwareLicenseAgreement.objects.exclude(status='Delete').count()}
+        data = get_dashboard_counts()
         return render(request, 'dashboard.html', data)
 
 
@@ -88,13 +90,35 @@ class DeleteUserView(LoginRequiredMixin, DeleteView):
     success_url = reverse_lazy('list_users')
 
 
-class ListLicensorsView(LoginRequiredMixin, ListView):
+class ListLicensorsView(LoginRequiredMixin, ServerSideListMixin, ListView):
     """
     List Licensors
     """
     model = Licensor
-    queryset = Licensor.objects.exclude(status='Delete')
+    queryset = Licensor.live.select_related('address')
     template_name = 'licensor_list.html'
+    data_url_name = 'licensors_data'
+
+
+class LicensorsDataView(DataTablesView):
+    """
+    Licensors table, server side processing
+    """
+    queryset = Licensor.live.select_related('address')
+    columns = ((('first_name', 'last_name'), ('first_name', 'last_name')),
+               (('designation',), ('designation',)),
+               (('email',), ('email',)),
+               (('mobile',), ('mobile',)),
+               (('organization_name',), ('organization_name',)),
+               (('address__city_or_village', 'address__state', 'address__country'), ('address__city_or_village',)),
+               (('status',), ()))
+    update_url_name = 'update_licensor'
+    delete_url_name = 'delete_licensor'
+
+    def render_row(self, licensor):
+        return [licensor.full_name, licensor.designation, licensor.email, licensor.mobile, licensor.organization_name,
+                '%s, %s, %s' % (licensor.address.city_or_village, licensor.address.state, licensor.address.country)\
+                if licensor.address else '', licensor.status]
 
 
 class CreateLicensorView(LoginRequiredMixin, SuccessMessageMixin, CreateView):
@@ -207,13 +231,23 @@ class DeleteLicensorView(LoginRequiredMixin, DeleteView):
     success_url = reverse_lazy('list_licensors')
 
 
-class ListLicenseesView(LoginRequiredMixin, ListView):
+class ListLicenseesView(LoginRequiredMixin, ServerSideListMixin, ListView):
     """
     List Licensees
     """
     model = Licensee
-    queryset = Licensee.objects.exclude(status='Delete')
+    queryset = Licensee.live.select_related('address')
     template_name = 'licensee_list.html'
+    data_url_name = 'licensees_data'
+
+
+class LicenseesDataView(LicensorsDataView):
+    """
+    Licensees table, server side processing
+    """
+    queryset = Licensee.live.select_related('address')
+    update_url_name = 'update_licensee'
+    delete_url_name = 'delete_licensee'
 
 
 class CreateLicenseeView(LoginRequiredMixin, SuccessMessageMixin, CreateView):
@@ -326,13 +360,28 @@ class DeleteLicenseeView(LoginRequiredMixin, DeleteView):
     success_url = reverse_lazy('list_licensees')
 
 
-class ListSoftwaresView(LoginRequiredMixin, ListView):
+class ListSoftwaresView(LoginRequiredMixin, ServerSideListMixin, ListView):
     """
     List softwares
     """
     model = Software
-    queryset = Software.objects.exclude(status='Delete')
+    queryset = Software.live.all()
     template_name = 'software_list.html'
+    data_url_name = 'softwares_data'
+
+
+class SoftwaresDataView(DataTablesView):
+    """
+    Softwares table, server side processing
+    """
+    queryset = Software.live.only('id', 'name', 'status')
+    columns = ((('name',), ('name',)),
+               (('status',), ()))
+    update_url_name = 'update_software'
+    delete_url_name = 'delete_software'
+
+    def render_row(self, software):
+        return [software.name, software.status]
 
 
 class CreateSoftwareView(LoginRequiredMixin, SuccessMessageMixin, CreateView):
@@ -366,13 +415,51 @@ class DeleteSoftwareView(LoginRequiredMixin, DeleteView):
     success_url = reverse_lazy('list_softwares')
 
 
-class ListSoftwareLicenseAgreementsView(LoginRequiredMixin, ListView):
+class ListSoftwareLicenseAgreementsView(LoginRequiredMixin, ServerSideListMixin, ListView):
     """
     List license agreements
     """
     model = SoftwareLicenseAgreement
-    queryset = SoftwareLicenseAgreement.objects.exclude(status='Delete')
+    queryset = SoftwareLicenseAgreement.live.select_related('licensor', 'licensee', 'software')
     template_name = 'agreement_list.html'
+    data_url_name = 'agreements_data'
+
+
+class SoftwareLicenseAgreementsDataView(DataTablesView):
+    """
+    License agreements table, server side processing
+    """
+    queryset = SoftwareLicenseAgreement.live.select_related('licensor', 'licensee', 'software')\
+        .only('id', 'effective_date', 'expiry_date', 'price', 'no_of_copies', 'delivery_date', 'status',
+              'licensor__first_name', 'licensor__last_name', 'licensee__first_name', 'licensee__last_name',
+              'software__name')
+    columns = ((('licensor__first_name', 'licensor__last_name'), ('licensor__first_name', 'licensor__last_name')),
+               (('licensee__first_name', 'licensee__last_name'), ('licensee__first_name', 'licensee__last_name')),
+               (('software__name',), ('software__name',)),
+               (('effective_date',), ()),
+               (('expiry_date',), ()),
+               (('price',), ()),
+               (('no_of_copies',), ()),
+               (('delivery_date',), ()),
+               (('status',), ()))
+    update_url_name = 'update_agreement'
+    delete_url_name = 'delete_agreement'
+
+    def render_row(self, agreement):
+        return [agreement.licensor.full_name, agreement.licensee.full_name, agreement.software.name,
+                agreement.effective_date, agreement.expiry_date, agreement.price, agreement.no_of_copies,
+                agreement.delivery_date, agreement.status]
+
+
+class ExportSoftwareLicenseAgreementsView(LoginRequiredMixin, View):
+    """
+    Download license agreements as CSV or XLSX
+    """
+    def get(self, request):
+        file_format = request.GET.get('file_format', 'csv')
+        if file_format not in EXPORT_FORMATS:
+            return HttpResponseBadRequest('Expected one of %s.' % ', '.join(EXPORT_FORMATS))
+        return export_agreements(SoftwareLicenseAgreement.live.all(), file_format=file_format)
 
 
 class CreateSoftwareLicenseAgreementView(LoginRequiredMixin, SuccessMessageMixin, CreateView):